@@ -5,6 +5,21 @@ import sys
 from QOpenScienceFramework.compat import *
 dirname = safe_decode(os.path.dirname(__file__), enc=sys.getfilesystemencoding())
 
-import QOpenScienceFramework.manager
 import QOpenScienceFramework.connection
-import QOpenScienceFramework.widgets
+
+# The ConnectionManager and the widgets require Qt, including QtWebEngine for
+# the login window. Without a usable Qt (e.g. on servers without a display,
+# where the libraries of QtWebEngine may be missing), the connection module and
+# the clients in QOpenScienceFramework.asyncclient and QOpenScienceFramework.bulk
+# can still be used. Importing the manager or the widgets directly then shows
+# why they are not available.
+try:
+    import qtpy
+except Exception:  # qtpy raises its own error if no Qt binding is installed
+    qtpy = None
+if not qtpy is None:
+    try:
+        import QOpenScienceFramework.manager
+        import QOpenScienceFramework.widgets
+    except ImportError:
+        pass
@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+"""
+A headless client for the OSF, based on asyncio.
+
+The ConnectionManager needs a Qt event loop, and the transfers it performs
+report to widgets. The OSFClient in this module needs neither Qt nor a display,
+and is meant for scripts and batch pipelines that run on servers. It builds
+its urls with connection.api_call, uses the settings of the connection module,
+and authenticates with the OAuth2 token of connection.session (or a token that
+is passed to it). Requests are performed concurrently on the asyncio event
+loop, up to a maximum number at a time::
+
+    async def main():
+        async with OSFClient() as client:
+            projects = await client.get_user_projects()
+            for project in projects:
+                print(project['attributes']['title'])
+            await client.download(url, 'data.csv')
+
+    asyncio.run(main())
+
+Besides the OSF itself, the client can be pointed at the stand-in server in
+QOpenScienceFramework.fakeserver, by passing urls on that server.
+
+This module requires Python 3.6 or newer and the aiohttp package, which can be
+installed together with this package with ``pip install python-qosf[async]``.
+"""
+
+# Python3 compatibility
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from QOpenScienceFramework.clientbase import CHUNK_SIZE, ITEMS_PER_PAGE, \
+    ClientBase, OSFRequestError, next_page_url, page_url, split_listing
+import QOpenScienceFramework.connection as osf
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+logger = logging.getLogger()
+
+
+class OSFClient(ClientBase):
+    """ Performs requests to the OSF on an asyncio event loop. The client
+    should be used as an asynchronous context manager, or be closed with
+    close() when it is no longer needed. The convenience API functions
+    (get_user_projects() etc.) return coroutines. """
+
+    def __init__(self, token=None, concurrency=8, timeout=60,
+                 max_retries=3, backoff=1.0, max_retry_after=300.0,
+                 chunk_size=CHUNK_SIZE, session=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        token : str (default: None)
+                The OAuth2 access token to authenticate with. If None, the
+                token of connection.session is used, as the ConnectionManager
+                does.
+        concurrency : int (default: 8)
+                The maximum number of requests that are performed at once.
+        timeout : float (default: 60)
+                The maximum number of seconds to wait for data from the server
+                before a request is considered to have failed. Transfers may
+                take longer in total, as long as data keeps flowing.
+        max_retries : int (default: 3)
+                The maximum number of times a request that failed because of a
+                temporary problem is repeated.
+        backoff : float (default: 1.0)
+                The delay in seconds before the first retry. The delay is
+                doubled for each next retry, and randomized.
+        max_retry_after : float (default: 300.0)
+                The maximum number of seconds to honor a Retry-After header for.
+        chunk_size : int (default: CHUNK_SIZE)
+                The number of bytes that is read or written at once during a
+                transfer.
+        session : aiohttp.ClientSession (default: None)
+                The session to perform the requests with. If None, the client
+                creates (and closes) one of its own.
+        """
+        if aiohttp is None:
+            raise ImportError('The OSFClient requires the aiohttp package')
+        self.token = token
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
+        self.chunk_size = chunk_size
+        self.session = session
+        self._own_session = session is None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def open(self):
+        """ Creates the HTTP session, if the client was not given one. Called
+        automatically by the first request. """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=self.timeout, sock_read=self.timeout),
+                connector=aiohttp.TCPConnector(limit=self.concurrency))
+            self._own_session = True
+
+    async def close(self):
+        """ Closes the HTTP session, if the client created it. """
+        if self._own_session and not self.session is None:
+            await self.session.close()
+            self.session = None
+
+    # Private functions
+
+    def __headers(self, headers=None):
+        """ Returns the headers of a request, with the OAuth2 token. """
+        headers = dict(headers or {})
+        token = self.token
+        if token is None and not osf.session is None and osf.token_valid():
+            token = osf.session.access_token
+        if token:
+            headers['Authorization'] = 'Bearer {}'.format(token)
+        return headers
+
+    async def __perform(self, method, url, handler, data=None, headers=None,
+                        **kwargs):
+        """ Performs a request and passes the response to handler, which is a
+        coroutine function. The request is repeated if it failed because of a
+        temporary problem, and if the method allows this. data may be a
+        callable, which is then called for each attempt to obtain the body of
+        the request (e.g. a newly opened file). """
+        if self.session is None or self._semaphore is None:
+            await self.open()
+        attempt = 0
+        while True:
+            body = data() if callable(data) else data
+            response = None
+            try:
+                async with self._semaphore:
+                    async with self.session.request(
+                            method, url, data=body,
+                            headers=self.__headers(headers),
+                            **kwargs) as response:
+                        if not response.status in self.RETRY_STATUSES:
+                            self._check_status(method, str(response.url),
+                                               response.status,
+                                               response.reason)
+                            return await handler(response)
+                        error = OSFRequestError(
+                            '{} {} failed with status {}'.format(
+                                method, url, response.status),
+                            status=response.status, url=url)
+            except (aiohttp.ClientConnectionError,
+                    aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                error = e
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+
+            delay = self._retry_delay(
+                method, attempt, self.max_retries,
+                None if response is None else
+                response.headers.get('Retry-After'))
+            if delay is None:
+                raise error
+            logger.info('Repeating {} {} in {:.1f} s: {}'.format(
+                method, url, delay, error))
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    # Public functions
+
+    async def request(self, method, url, data=None, headers=None, **kwargs):
+        """ Performs a request, and returns the body of the response.
+
+        Parameters
+        ----------
+        method : str
+                The HTTP method, e.g. 'GET'.
+        url : str
+                The url to request.
+        data : bytes, file or callable (default: None)
+                The body of the request. A callable is called for each attempt
+                to obtain the body.
+        headers : dict (default: None)
+                Extra headers to send.
+        **kwargs
+                Passed on to aiohttp.ClientSession.request().
+
+        Returns
+        -------
+        bytes
+                The body of the response
+
+        Raises
+        ------
+        OSFRequestError
+                If the server responded with an error status.
+        connection.TokenExpiredError
+                If the OAuth2 token was rejected.
+        aiohttp.ClientError, asyncio.TimeoutError
+                If the request could not be performed.
+        """
+        async def read(response):
+            return await response.read()
+        return await self.__perform(method, url, read, data, headers, **kwargs)
+
+    async def get_json(self, url, **kwargs):
+        """ Retrieves a JSON document, e.g. from the OSF API.
+
+        Parameters
+        ----------
+        url : str
+                The url to retrieve.
+
+        Returns
+        -------
+        dict
+                The decoded document
+        """
+        return json.loads(
+            (await self.request('GET', url, **kwargs)).decode('utf-8'))
+
+    async def iter_pages(self, url, page_size=ITEMS_PER_PAGE):
+        """ Iterates over the items of a listing of the OSF API, following the
+        links to its next pages. Each page is requested when the items of the
+        previous one have been consumed::
+
+            async for item in client.iter_pages(url):
+                ...
+
+        Parameters
+        ----------
+        url : str
+                The url of the listing.
+        page_size : int (default: ITEMS_PER_PAGE)
+                The number of items to request per page.
+        """
+        url = page_url(url, page_size)
+        while url:
+            page = await self.get_json(url)
+            for item in page.get('data', []):
+                yield item
+            url = next_page_url(page)
+
+    async def list_all(self, url, page_size=ITEMS_PER_PAGE):
+        """ Retrieves all items of a listing of the OSF API.
+
+        Parameters
+        ----------
+        url : str
+                The url of the listing.
+        page_size : int (default: ITEMS_PER_PAGE)
+                The number of items to request per page.
+
+        Returns
+        -------
+        list
+                The 'data' entries of all pages
+        """
+        return [item async for item in self.iter_pages(url, page_size)]
+
+    async def walk(self, url, path=''):
+        """ Lists the files in a folder and all of its subfolders. The
+        subfolders are listed concurrently.
+
+        Parameters
+        ----------
+        url : str
+                The url of the listing of the folder, e.g. the 'related' link of
+                the 'files' relationship of a folder or storage provider.
+        path : str (default: '')
+                The path to prefix the names of the files with.
+
+        Returns
+        -------
+        list
+                Tuples of the relative path and the data of each file
+        """
+        files, folders = split_listing(await self.list_all(url), path)
+        for result in await asyncio.gather(
+                *[self.walk(*folder) for folder in folders]):
+            files.extend(result)
+        return files
+
+    # Transfers
+
+    async def download(self, url, destination, expected_hashes=None,
+                       progress=None):
+        """ Downloads a file. The data is written to <destination>.part, which
+        is renamed to destination when the download is complete (and, if
+        expected_hashes is specified, verified). An interrupted download is
+        started over when it is repeated.
+
+        Parameters
+        ----------
+        url : str
+                The url of the file, e.g. the 'download' link of the file's
+                data.
+        destination : str
+                The path to save the file to.
+        expected_hashes : dict (default: None)
+                The hex digests the file should have by algorithm name, as in
+                extra.hashes of the file's data.
+        progress : callable (default: None)
+                Called with the number of received bytes and the total number
+                (or None if unknown) whenever data has arrived.
+
+        Returns
+        -------
+        int
+                The size of the file
+
+        Raises
+        ------
+        OSFRequestError
+                If the data does not match the expected hash.
+        """
+        part = destination + '.part'
+        algorithm, expected = self._verifier(expected_hashes)
+        digest = None
+
+        async def save(response):
+            nonlocal digest
+            # A repeated request starts over, and so does the hash
+            if not algorithm is None:
+                digest = hashlib.new(algorithm)
+            received = 0
+            total = response.content_length
+            with open(part, 'wb') as fp:
+                async for data in response.content.iter_chunked(
+                        self.chunk_size):
+                    fp.write(data)
+                    if not digest is None:
+                        digest.update(data)
+                    received += len(data)
+                    if not progress is None:
+                        progress(received, total)
+            return received
+
+        try:
+            size = await self.__perform('GET', url, save)
+        except BaseException:
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+        self._finish_download(url, part, destination, algorithm, expected,
+                              digest)
+        return size
+
+    async def upload(self, url, source, name=None, overwrite=False):
+        """ Uploads a file to a folder or storage provider, or as a new version
+        of an existing file. The file is read from disk while it is sent.
+
+        Parameters
+        ----------
+        url : str
+                The 'upload' link of the folder, storage provider or file.
+        source : str
+                The path of the file to upload.
+        name : str (default: None)
+                The name of the new file. If None, the name of source is used.
+                Ignored if overwrite is True.
+        overwrite : bool (default: False)
+                Upload a new version of the file at url, instead of a new file
+                in the folder at url.
+
+        Returns
+        -------
+        dict
+                The data of the uploaded file that WaterButler returns
+        """
+        params, headers = self._upload_arguments(source, name, overwrite)
+
+        async def read(response):
+            return json.loads((await response.read()).decode('utf-8') or '{}')
+        return await self.__perform(
+            'PUT', url, read, lambda: open(source, 'rb'), headers,
+            params=params)
+
+    async def download_many(self, items, return_exceptions=False):
+        """ Downloads files concurrently.
+
+        Parameters
+        ----------
+        items : list
+                Tuples of the url and the destination of each file, optionally
+                followed by the expected hashes.
+        return_exceptions : bool (default: False)
+                Return the error of each failed download instead of the size,
+                rather than raising the first error.
+
+        Returns
+        -------
+        list
+                The sizes of the files, in the order of items
+        """
+        return await asyncio.gather(
+            *[self.download(*item) for item in items],
+            return_exceptions=return_exceptions)
+
+    async def upload_many(self, items, return_exceptions=False):
+        """ Uploads files concurrently.
+
+        Parameters
+        ----------
+        items : list
+                Tuples of the upload url and the source of each file,
+                optionally followed by the name.
+        return_exceptions : bool (default: False)
+                Return the error of each failed upload instead of its result,
+                rather than raising the first error.
+
+        Returns
+        -------
+        list
+                The data of the uploaded files, in the order of items
+        """
+        return await asyncio.gather(
+            *[self.upload(*item) for item in items],
+            return_exceptions=return_exceptions)
+
+    async def download_folder(self, url, destination):
+        """ Downloads all files in a folder and its subfolders concurrently,
+        recreating the structure of the folder in destination.
+
+        Parameters
+        ----------
+        url : str
+                The url of the listing of the folder (see walk()).
+        destination : str
+                The local folder to save the files in.
+
+        Returns
+        -------
+        list
+                The relative paths of the downloaded files
+        """
+        items, paths = self._folder_downloads(await self.walk(url),
+                                              destination)
+        await self.download_many(items)
+        return paths
@@ -0,0 +1,479 @@
+# -*- coding: utf-8 -*-
+"""
+A synchronous client for moving many files to and from the OSF.
+
+The BulkClient performs its requests with the OAuth2 session of the connection
+module (connection.session, a requests_oauthlib.OAuth2Session), and does not
+need Qt. Its batch functions run the transfers on a pool of threads, with a
+connection pool that is large enough to keep a connection open for each of
+them. This makes it suitable for scripts and Jupyter notebooks::
+
+    import QOpenScienceFramework.connection as osf
+    from QOpenScienceFramework.bulk import BulkClient
+
+    osf.create_session()
+    osf.session.token = token
+    with BulkClient(workers=16) as client:
+        files = client.list_tree(folder_url)
+        client.map_download(
+            [(data['links']['download'], path) for path, data in files])
+
+Under Python 2, the futures package is required for the thread pool.
+"""
+
+# Python3 compatibility
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from QOpenScienceFramework.compat import *
+from QOpenScienceFramework.clientbase import CHUNK_SIZE, ITEMS_PER_PAGE, \
+    ClientBase, OSFRequestError, next_page_url, page_url, split_listing
+import QOpenScienceFramework.connection as osf
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+logger = logging.getLogger()
+
+
+class BulkClient(ClientBase):
+    """ Performs requests to the OSF with connection.session, and runs batches
+    of transfers on a thread pool. The client should be used as a context
+    manager, or be closed with close() when it is no longer needed. """
+
+    def __init__(self, session=None, workers=8, max_retries=3, backoff=1.0,
+                 max_retry_after=300.0, timeout=(10, 60),
+                 chunk_size=CHUNK_SIZE):
+        """ Constructor
+
+        Parameters
+        ----------
+        session : requests.Session (default: None)
+                The session to perform the requests with. If None,
+                connection.session is used, which should have been created
+                (and given a token) already. The connection pools of the
+                session are enlarged to fit the number of workers.
+        workers : int (default: 8)
+                The number of threads that perform the transfers of a batch.
+        max_retries : int (default: 3)
+                The maximum number of times a request that failed because of a
+                temporary problem is repeated. Can be changed per call with the
+                retries argument.
+        backoff : float (default: 1.0)
+                The delay in seconds before the first retry. The delay is
+                doubled for each next retry, and randomized.
+        max_retry_after : float (default: 300.0)
+                The maximum number of seconds to honor a Retry-After header for.
+        timeout : float or tuple (default: (10, 60))
+                The connect and read timeouts of requests, in seconds (see the
+                requests documentation). Transfers may take longer in total, as
+                long as data keeps flowing.
+        chunk_size : int (default: CHUNK_SIZE)
+                The number of bytes that is read at once during a download.
+        """
+        if session is None:
+            osf.check_for_active_session()
+            session = osf.session
+        self.session = session
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        # One pooled connection per worker (and a few for the calling thread)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers + 2)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Stops the threads of the pool, after their transfers are done. """
+        with self._lock:
+            if not self._executor is None:
+                self._executor.shutdown()
+                self._executor = None
+
+    # Private functions
+
+    @property
+    def executor(self):
+        """ The thread pool, which is created when it is first needed. """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers)
+            return self._executor
+
+    def __perform(self, method, url, handler, data=None, retries=None,
+                  **kwargs):
+        """ Performs a request and returns the result of passing the response to
+        handler. The request is repeated if it failed because of a temporary
+        problem, and if the method allows this. data may be a callable, which is
+        then called for each attempt to obtain the body of the request (e.g. a
+        newly opened file). """
+        if retries is None:
+            retries = self.max_retries
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            body = data() if callable(data) else data
+            response = None
+            try:
+                response = self.session.request(method, url, data=body,
+                                                **kwargs)
+                try:
+                    if not response.status_code in self.RETRY_STATUSES:
+                        self._check_status(method, response.url,
+                                           response.status_code,
+                                           response.reason)
+                        return handler(response)
+                finally:
+                    response.close()
+                error = OSFRequestError(
+                    '{} {} failed with status {}'.format(
+                        method, url, response.status_code),
+                    status=response.status_code, url=url)
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                error = e
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+
+            delay = self._retry_delay(
+                method, attempt, retries,
+                None if response is None else
+                response.headers.get('Retry-After'))
+            if delay is None:
+                raise error
+            logger.info('Repeating {} {} in {:.1f} s: {}'.format(
+                method, url, delay, error))
+            time.sleep(delay)
+            attempt += 1
+
+    def __map(self, function, items, callback, return_exceptions):
+        """ Calls function with the arguments in each of items on the thread
+        pool, and returns the results in the order of items. """
+        futures = [self.executor.submit(function, *item) for item in items]
+        if not callback is None:
+            for item, future in zip(items, futures):
+                future.add_done_callback(
+                    lambda future, item=item: callback(item, future))
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                if not return_exceptions:
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+                results.append(e)
+        return results
+
+    # Public functions
+
+    def request(self, method, url, data=None, retries=None, **kwargs):
+        """ Performs a request, and returns the body of the response.
+
+        Parameters
+        ----------
+        method : str
+                The HTTP method, e.g. 'GET'.
+        url : str
+                The url to request.
+        data : bytes, file or callable (default: None)
+                The body of the request. A callable is called for each attempt
+                to obtain the body.
+        retries : int (default: None)
+                The maximum number of times to repeat the request. If None, the
+                max_retries of the client is used.
+        **kwargs
+                Passed on to requests.Session.request().
+
+        Returns
+        -------
+        bytes
+                The body of the response
+
+        Raises
+        ------
+        OSFRequestError
+                If the server responded with an error status.
+        connection.TokenExpiredError
+                If the OAuth2 token was rejected.
+        requests.RequestException
+                If the request could not be performed.
+        """
+        return self.__perform(method, url, lambda response: response.content,
+                              data, retries, **kwargs)
+
+    def get_json(self, url, retries=None, **kwargs):
+        """ Retrieves a JSON document, e.g. from the OSF API.
+
+        Parameters
+        ----------
+        url : str
+                The url to retrieve.
+        retries : int (default: None)
+                The maximum number of times to repeat the request.
+
+        Returns
+        -------
+        dict
+                The decoded document
+        """
+        return json.loads(safe_decode(
+            self.request('GET', url, retries=retries, **kwargs)))
+
+    def iter_pages(self, url, page_size=ITEMS_PER_PAGE):
+        """ Iterates over the items of a listing of the OSF API, following the
+        links to its next pages.
+
+        Parameters
+        ----------
+        url : str
+                The url of the listing.
+        page_size : int (default: ITEMS_PER_PAGE)
+                The number of items to request per page.
+        """
+        url = page_url(url, page_size)
+        while url:
+            page = self.get_json(url)
+            for item in page.get('data', []):
+                yield item
+            url = next_page_url(page)
+
+    def list_all(self, url, page_size=ITEMS_PER_PAGE):
+        """ Retrieves all items of a listing of the OSF API.
+
+        Parameters
+        ----------
+        url : str
+                The url of the listing.
+        page_size : int (default: ITEMS_PER_PAGE)
+                The number of items to request per page.
+
+        Returns
+        -------
+        list
+                The 'data' entries of all pages
+        """
+        return list(self.iter_pages(url, page_size))
+
+    def list_tree(self, url, path=''):
+        """ Lists the files in a folder and all of its subfolders. The folders
+        at each level of the tree are listed in parallel on the thread pool.
+
+        Parameters
+        ----------
+        url : str
+                The url of the listing of the folder, e.g. the 'related' link of
+                the 'files' relationship of a folder or storage provider.
+        path : str (default: '')
+                The path to prefix the names of the files with.
+
+        Returns
+        -------
+        list
+                Tuples of the relative path and the data of each file
+        """
+        files = []
+        folders = [(url, path)]
+        while folders:
+            listings = self.__map(self.list_all,
+                                  [(folder_url,) for folder_url, _ in folders],
+                                  None, False)
+            subfolders = []
+            for (_, folder_path), listing in zip(folders, listings):
+                listed_files, listed_folders = split_listing(listing,
+                                                             folder_path)
+                files.extend(listed_files)
+                subfolders.extend(listed_folders)
+            folders = subfolders
+        return files
+
+    # Transfers
+
+    def download(self, url, destination, expected_hashes=None, progress=None,
+                 retries=None):
+        """ Downloads a file. The data is written to <destination>.part, which
+        is renamed to destination when the download is complete (and, if
+        expected_hashes is specified, verified). An interrupted download is
+        started over when it is repeated.
+
+        Parameters
+        ----------
+        url : str
+                The url of the file, e.g. the 'download' link of the file's
+                data.
+        destination : str
+                The path to save the file to.
+        expected_hashes : dict (default: None)
+                The hex digests the file should have by algorithm name, as in
+                extra.hashes of the file's data.
+        progress : callable (default: None)
+                Called with the number of received bytes and the total number
+                (or None if unknown) whenever data has arrived.
+        retries : int (default: None)
+                The maximum number of times to repeat the request.
+
+        Returns
+        -------
+        int
+                The size of the file
+
+        Raises
+        ------
+        OSFRequestError
+                If the data does not match the expected hash.
+        """
+        part = destination + '.part'
+        algorithm, expected = self._verifier(expected_hashes)
+        digest = []
+
+        def save(response):
+            # A repeated request starts over, and so does the hash
+            del digest[:]
+            if not algorithm is None:
+                digest.append(hashlib.new(algorithm))
+            received = 0
+            total = response.headers.get('Content-Length')
+            total = int(total) if total and total.isdigit() else None
+            with open(part, 'wb') as fp:
+                for data in response.iter_content(self.chunk_size):
+                    fp.write(data)
+                    for hash_ in digest:
+                        hash_.update(data)
+                    received += len(data)
+                    if not progress is None:
+                        progress(received, total)
+            return received
+
+        try:
+            size = self.__perform('GET', url, save, retries=retries,
+                                  stream=True)
+        except BaseException:
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+        self._finish_download(url, part, destination, algorithm, expected,
+                              digest[0] if digest else None)
+        return size
+
+    def upload(self, url, source, name=None, overwrite=False, retries=None):
+        """ Uploads a file to a folder or storage provider, or as a new version
+        of an existing file. The file is read from disk while it is sent.
+
+        Parameters
+        ----------
+        url : str
+                The 'upload' link of the folder, storage provider or file.
+        source : str
+                The path of the file to upload.
+        name : str (default: None)
+                The name of the new file. If None, the name of source is used.
+                Ignored if overwrite is True.
+        overwrite : bool (default: False)
+                Upload a new version of the file at url, instead of a new file
+                in the folder at url.
+        retries : int (default: None)
+                The maximum number of times to repeat the request.
+
+        Returns
+        -------
+        dict
+                The data of the uploaded file that WaterButler returns
+        """
+        params, headers = self._upload_arguments(source, name, overwrite)
+        return self.__perform(
+            'PUT', url, lambda response: response.json() if response.content
+            else {}, lambda: open(source, 'rb'), retries=retries,
+            params=params, headers=headers)
+
+    def map_download(self, items, callback=None, return_exceptions=False):
+        """ Downloads files in parallel on the thread pool.
+
+        Parameters
+        ----------
+        items : list
+                Tuples of the url and the destination of each file, optionally
+                followed by the expected hashes.
+        callback : callable (default: None)
+                Called with the tuple of each file and its concurrent.futures
+                Future when its download has finished (or failed). The callback
+                runs in a thread of the pool.
+        return_exceptions : bool (default: False)
+                Return the error of each failed download instead of the size,
+                rather than raising the first error (which cancels the
+                downloads that have not started yet).
+
+        Returns
+        -------
+        list
+                The sizes of the files, in the order of items
+        """
+        return self.__map(self.download, list(items), callback,
+                          return_exceptions)
+
+    def map_upload(self, items, callback=None, return_exceptions=False):
+        """ Uploads files in parallel on the thread pool.
+
+        Parameters
+        ----------
+        items : list
+                Tuples of the upload url and the source of each file,
+                optionally followed by the name.
+        callback : callable (default: None)
+                Called with the tuple of each file and its concurrent.futures
+                Future when its upload has finished (or failed).
+        return_exceptions : bool (default: False)
+                Return the error of each failed upload instead of its result,
+                rather than raising the first error.
+
+        Returns
+        -------
+        list
+                The data of the uploaded files, in the order of items
+        """
+        return self.__map(self.upload, list(items), callback,
+                          return_exceptions)
+
+    def download_folder(self, url, destination, callback=None):
+        """ Downloads all files in a folder and its subfolders in parallel,
+        recreating the structure of the folder in destination.
+
+        Parameters
+        ----------
+        url : str
+                The url of the listing of the folder (see list_tree()).
+        destination : str
+                The local folder to save the files in.
+        callback : callable (default: None)
+                Passed on to map_download().
+
+        Returns
+        -------
+        list
+                The relative paths of the downloaded files
+        """
+        items, paths = self._folder_downloads(self.list_tree(url),
+                                              destination)
+        self.map_download(items, callback)
+        return paths
@@ -0,0 +1,661 @@
+# -*- coding: utf-8 -*-
+"""
+Caches for the responses of the OSF API.
+
+The ConnectionManager can be configured to keep API responses on disk, so that
+listings which have not changed since a previous session do not have to be
+downloaded again. Entries are always revalidated with the server (by using the
+ETag and Last-Modified headers that came with the response), so the cache never
+serves stale data; it only saves the transfer of the response body.
+
+Next to that, the ConnectionManager keeps the results of its convenience
+functions (get_logged_in_user, get_user_projects, etc.) in memory for a short
+while, because the widgets tend to request the same data several times within
+seconds. Cached results are delivered to callbacks as BufferedReply objects,
+which behave like a finished QNetworkReply.
+
+Finally, downloads are redirected from WaterButler to the storage provider.
+The RedirectCache remembers where each version of a file was redirected to, so
+that subsequent requests can go there directly, until the (usually signed)
+storage url expires.
+"""
+
+# Python3 compatibility
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from QOpenScienceFramework.compat import *
+import QOpenScienceFramework.connection as osf
+from qtpy import QtCore, QtNetwork
+
+import os
+import json
+import time
+import calendar
+import logging
+from collections import OrderedDict
+try:
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from urlparse import urlparse, parse_qs
+logger = logging.getLogger()
+
+# HTTP status codes of responses that redirect to another url
+REDIRECT_STATUSES = [301, 302, 303, 307, 308]
+
+def url_tags(url):
+    """ Determines the identifiers of the OSF nodes, folders and files that the
+    passed url concerns. These are used to find the cache entries that need to
+    be invalidated after a node or folder has been modified. Other path
+    segments, such as the names of storage providers or of relationships, are
+    shared by many nodes and are not used.
+
+    Parameters
+    ----------
+    url : QtCore.QUrl or str
+        The url of an OSF API or WaterButler endpoint
+
+    Returns
+    -------
+    set
+        The path segments of the url that are node, folder or file ids
+    """
+    if not isinstance(url, QtCore.QUrl):
+        url = QtCore.QUrl(url)
+    segments = [segment for segment in safe_decode(url.path()).split('/')
+                if segment]
+    tags = set()
+    for i, segment in enumerate(segments[:-1]):
+        if segment in ['nodes', 'resources']:
+            # /v2/nodes/<node>/... and /v1/resources/<node>/...
+            tags.add(segments[i + 1])
+        elif segment == 'files' and i > 0 and segments[i - 1] == 'v2':
+            # /v2/files/<file>/
+            tags.add(segments[i + 1])
+        elif segment in ['files', 'providers']:
+            # /v2/nodes/<node>/files/<provider>/<id>/ and
+            # /v1/resources/<node>/providers/<provider>/<id>
+            tags.update(segments[i + 2:])
+            break
+    return tags
+
+
+def url_expiry(url):
+    """ Determines when a signed url of a storage provider (Amazon S3, Google
+    Cloud Storage or Azure) stops being valid.
+
+    Parameters
+    ----------
+    url : QtCore.QUrl or str
+        The url to check
+
+    Returns
+    -------
+    float or None
+        The expiration time in seconds since the epoch, or None if the url
+        does not specify one.
+    """
+    if isinstance(url, QtCore.QUrl):
+        url = url.toString()
+    query = dict((key.lower(), values[0]) for key, values in
+                 parse_qs(urlparse(safe_decode(url)).query).items())
+    try:
+        # AWS signature version 4, and its equivalent on Google Cloud Storage
+        for prefix in ['x-amz-', 'x-goog-']:
+            if prefix + 'date' in query and prefix + 'expires' in query:
+                signed = calendar.timegm(time.strptime(
+                    query[prefix + 'date'], '%Y%m%dT%H%M%SZ'))
+                return signed + int(query[prefix + 'expires'])
+        # Older signatures contain the expiration time itself
+        if 'expires' in query:
+            return float(query['expires'])
+        # Azure shared access signatures
+        if 'se' in query:
+            return calendar.timegm(time.strptime(query['se'][:19],
+                                                 '%Y-%m-%dT%H:%M:%S'))
+    except ValueError:
+        logger.debug("Could not determine the expiry of {}".format(url))
+    return None
+
+
+def file_version(data):
+    """ Determines a value that identifies the current version of a file, from
+    the file's metadata as returned by the OSF API.
+
+    Parameters
+    ----------
+    data : dict
+        The data of the file (with 'attributes')
+
+    Returns
+    -------
+    str or None
+        The version number of the file if the storage provider keeps versions,
+        otherwise its hash or modification date, or None if none of these is
+        available.
+    """
+    attributes = data.get('attributes', {})
+    if not attributes.get('current_version') is None:
+        return safe_decode(attributes['current_version'])
+    hashes = (attributes.get('extra') or {}).get('hashes') or {}
+    for algorithm in ['sha256', 'md5']:
+        if hashes.get(algorithm):
+            return hashes[algorithm]
+    return attributes.get('date_modified')
+
+
+class BufferedReply(QtCore.QObject):
+    """ Stand-in for a finished QtNetwork.QNetworkReply of which the contents
+    are already available in memory. It implements the part of the
+    QNetworkReply interface that callbacks of the ConnectionManager use. """
+
+    # Error codes, so they can be referenced as reply.NoError etc. just like
+    # with a real QNetworkReply
+    NoError = QtNetwork.QNetworkReply.NoError
+    OperationCanceledError = QtNetwork.QNetworkReply.OperationCanceledError
+    AuthenticationRequiredError = \
+        QtNetwork.QNetworkReply.AuthenticationRequiredError
+    # Buffered replies are never repeated, but the attribute is available for
+    # symmetry with scheduler.ReplyHandle
+    retry_count = 0
+
+    def __init__(self, url, data=b'', status=200, headers=None, parent=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        url : QtCore.QUrl or str
+                The url the contents were retrieved from
+        data : bytes (default: b'')
+                The body of the response
+        status : int (default: 200)
+                The HTTP status code of the response
+        headers : dict (default: None)
+                The raw headers of the response
+        parent : QtCore.QObject (default: None)
+                The parent object of the reply
+        """
+        super(BufferedReply, self).__init__(parent)
+        if not isinstance(url, QtCore.QUrl):
+            url = QtCore.QUrl(url)
+        self._request = QtNetwork.QNetworkRequest(url)
+        self._data = safe_encode(data)
+        self._pos = 0
+        self._status = status
+        self._headers = {}
+        for name, value in (headers or {}).items():
+            self._headers[safe_encode(name).lower()] = safe_encode(value)
+        self._error = self.NoError
+        self._error_string = ''
+
+    def set_contents(self, data, status=200):
+        """ Sets the body and status code of the response.
+
+        Parameters
+        ----------
+        data : bytes
+                The body of the response
+        status : int (default: 200)
+                The HTTP status code of the response
+        """
+        self._data = safe_encode(data or b'')
+        self._pos = 0
+        self._status = status
+
+    def set_error(self, code, message):
+        """ Turns this reply into a failed reply.
+
+        Parameters
+        ----------
+        code : QtNetwork.QNetworkReply.NetworkError
+                The error code
+        message : str
+                A description of the error
+        """
+        self._error = code
+        self._error_string = message
+
+    # QNetworkReply interface
+
+    def request(self):
+        return self._request
+
+    def url(self):
+        return self._request.url()
+
+    def operation(self):
+        return QtNetwork.QNetworkAccessManager.GetOperation
+
+    def error(self):
+        return self._error
+
+    def errorString(self):
+        return self._error_string
+
+    def attribute(self, code):
+        if code == QtNetwork.QNetworkRequest.HttpStatusCodeAttribute:
+            return self._status
+        if code == QtNetwork.QNetworkRequest.SourceIsFromCacheAttribute:
+            return True
+        return None
+
+    def hasRawHeader(self, name):
+        return safe_encode(name).lower() in self._headers
+
+    def rawHeader(self, name):
+        return QtCore.QByteArray(
+            self._headers.get(safe_encode(name).lower(), b''))
+
+    def isFinished(self):
+        return True
+
+    def isRunning(self):
+        return False
+
+    def abort(self):
+        pass
+
+    def bytesAvailable(self):
+        return len(self._data) - self._pos
+
+    def atEnd(self):
+        return self.bytesAvailable() == 0
+
+    def peek(self, maxlen):
+        return QtCore.QByteArray(self._data[self._pos:self._pos+maxlen])
+
+    def read(self, maxlen):
+        data = self.peek(maxlen)
+        self._pos += data.size()
+        return data
+
+    def readAll(self):
+        return self.read(self.bytesAvailable())
+
+
+class MemoryCache(object):
+    """ Keeps API responses in memory for a limited amount of time.
+
+    Every entry is tagged with the ids of the OSF nodes, folders or files it
+    concerns, so that all entries about a node can be evicted at once when the
+    node is modified. """
+
+    def __init__(self, ttl, max_entries):
+        """ Constructor
+
+        Parameters
+        ----------
+        ttl : float
+                The number of seconds an entry remains valid. If 0, nothing is
+                cached.
+        max_entries : int
+                The maximum number of entries. If the cache is full, the least
+                recently used entry is evicted.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Ordered from least to most recently used. The values are tuples of
+        # (expiration time, response body, tags)
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, url):
+        """ Retrieves the response body that is stored for url.
+
+        Parameters
+        ----------
+        url : str
+                The url of the request
+
+        Returns
+        -------
+        bytes or None
+                The cached body, or None if there is no valid entry for url.
+        """
+        entry = self._entries.pop(url, None)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            return None
+        self._entries[url] = entry
+        return entry[1]
+
+    def put(self, url, data, tags=()):
+        """ Stores a response body.
+
+        Parameters
+        ----------
+        url : str
+                The url of the request
+        data : bytes
+                The body of the response
+        tags : iterable (default: ())
+                The ids of the nodes, folders or files the response concerns
+        """
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        self._entries.pop(url, None)
+        self._entries[url] = (time.time() + self.ttl, data, frozenset(tags))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, tags):
+        """ Evicts all entries that are tagged with any of the passed tags.
+
+        Parameters
+        ----------
+        tags : iterable
+                The ids of the nodes, folders or files that were modified.
+        """
+        tags = set(tags)
+        for url, (_, _, entry_tags) in list(self._entries.items()):
+            if entry_tags & tags:
+                del self._entries[url]
+
+    def clear(self):
+        """ Evicts all entries. """
+        self._entries.clear()
+
+
+class RedirectCache(object):
+    """ Remembers the urls that downloads were redirected to.
+
+    Entries are stored by the url that was requested and the version of the
+    file, so that a new version of a file is never retrieved from the location
+    of an old one. An entry expires after the ttl of the cache, or earlier if
+    the url it points to expires. """
+
+    # The number of seconds before the expiration of a signed url at which the
+    # url is no longer used, so that a download does not start just before it.
+    EXPIRY_MARGIN = 30
+
+    def __init__(self, ttl, max_entries):
+        """ Constructor
+
+        Parameters
+        ----------
+        ttl : float
+                The maximum number of seconds an entry remains valid. If 0,
+                nothing is cached.
+        max_entries : int
+                The maximum number of entries. If the cache is full, the least
+                recently used entry is evicted.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Ordered from least to most recently used. The keys are tuples of
+        # (url, version), the values tuples of (expiration time, target url,
+        # tags)
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, url, version):
+        """ Retrieves the url that a request was redirected to.
+
+        Parameters
+        ----------
+        url : str
+                The url that was requested
+        version : str
+                The version of the file
+
+        Returns
+        -------
+        str or None
+                The url to request instead, or None if there is no valid entry.
+        """
+        entry = self._entries.pop((url, version), None)
+        if entry is None or entry[0] < time.time():
+            return None
+        self._entries[(url, version)] = entry
+        return entry[1]
+
+    def put(self, url, version, target):
+        """ Stores the url that a request was redirected to.
+
+        Parameters
+        ----------
+        url : str
+                The url that was requested
+        version : str
+                The version of the file
+        target : str
+                The url that the request was eventually redirected to
+        """
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        expires = time.time() + self.ttl
+        target_expiry = url_expiry(target)
+        if not target_expiry is None:
+            expires = min(expires, target_expiry - self.EXPIRY_MARGIN)
+        if expires <= time.time():
+            return
+        self._entries.pop((url, version), None)
+        self._entries[(url, version)] = (expires, target,
+                                         frozenset(url_tags(url)))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def remove(self, url, version):
+        """ Evicts the entry for a url, for instance because the url it points
+        to is no longer valid. """
+        self._entries.pop((url, version), None)
+
+    def invalidate(self, tags):
+        """ Evicts all entries for urls that concern any of the passed tags.
+
+        Parameters
+        ----------
+        tags : iterable
+                The ids of the nodes, folders or files that were modified.
+        """
+        tags = set(tags)
+        for key, (_, _, entry_tags) in list(self._entries.items()):
+            if entry_tags & tags:
+                del self._entries[key]
+
+    def clear(self):
+        """ Evicts all entries. """
+        self._entries.clear()
+
+
+class APIDiskCache(QtNetwork.QNetworkDiskCache):
+    """ Disk cache for JSON responses of the OSF API.
+
+    The cache is a QNetworkDiskCache with a few modifications:
+
+    - Only responses from the OSF API (at connection.api_base_url) that carry an
+      ETag or Last-Modified header are stored. File downloads, previews and
+      avatars are never written to the cache, and neither are responses that
+      Qt decided should not be saved, such as those marked with Cache-Control
+      no-store or no-cache.
+    - Stored responses are never considered fresh. Qt therefore always
+      revalidates them with If-None-Match/If-Modified-Since headers and serves
+      the stored body if the server replies with 304 Not Modified.
+    - If the cache grows beyond its maximum size, the least recently used
+      entries are evicted first.
+    """
+
+    # Name of the file in the cache directory in which the access times of
+    # the entries are stored.
+    INDEX_FILE = 'lru-index.json'
+    # Fraction of the maximum cache size to shrink to when entries are evicted
+    EVICTION_TARGET = 0.8
+
+    def __init__(self, cache_dir, max_size, parent=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        cache_dir : str
+                The folder in which to store the cached responses.
+        max_size : int
+                The maximum size of the cache in bytes.
+        parent : QtCore.QObject (default: None)
+                The parent object of the cache.
+        """
+        super(APIDiskCache, self).__init__(parent)
+
+        # Dictionary with the url of each entry as key, and a list containing
+        # the last access time and the size of the entry as value.
+        self._index_file = os.path.join(cache_dir, self.INDEX_FILE)
+        self._index = self.__load_index()
+        # Devices handed out by prepare(), by which the url of a response that
+        # is inserted into the cache can be found again
+        self._prepared = {}
+
+        # Writing the index to disk for every access is wasteful, so changes
+        # are collected and written at most once per second.
+        self._save_timer = QtCore.QTimer(self)
+        self._save_timer.setSingleShot(True)
+        self._save_timer.setInterval(1000)
+        self._save_timer.timeout.connect(self.save_index)
+
+        # Set last, because Qt calls expire() if the maximum size is lowered
+        self.setCacheDirectory(cache_dir)
+        self.setMaximumCacheSize(max_size)
+
+    # Private functions
+
+    def __load_index(self):
+        """ Reads the access times of the entries from disk. """
+        if not os.path.isfile(self._index_file):
+            return {}
+        try:
+            with open(self._index_file) as fp:
+                return json.load(fp)
+        except (IOError, ValueError) as e:
+            logger.warning("Could not read cache index: {}".format(e))
+            return {}
+
+    def __touch(self, url, size=None):
+        """ Marks the entry for url as most recently used. """
+        entry = self._index.setdefault(url, [0, 0])
+        entry[0] = time.time()
+        if not size is None:
+            entry[1] = size
+        self._save_timer.start()
+
+    # Public functions
+
+    def is_cacheable(self, url):
+        """ Checks if responses from the passed url may be stored.
+
+        Parameters
+        ----------
+        url : QtCore.QUrl or str
+                The url to check
+
+        Returns
+        -------
+        bool
+                True if the url is an OSF API endpoint, False otherwise
+        """
+        if isinstance(url, QtCore.QUrl):
+            url = url.toString()
+        return url.startswith(osf.api_base_url)
+
+    def save_index(self):
+        """ Writes the access times of the entries to disk. """
+        try:
+            with open(self._index_file, 'w') as fp:
+                json.dump(self._index, fp)
+        except IOError as e:
+            logger.warning("Could not write cache index: {}".format(e))
+
+    # Reimplemented QNetworkDiskCache functions
+
+    def metaData(self, url):
+        """ Reimplementation of QNetworkDiskCache.metaData().
+
+        Marks every stored entry as expired, so that Qt always revalidates it
+        with the server before it is used. """
+        meta = super(APIDiskCache, self).metaData(url)
+        if meta.isValid():
+            meta.setExpirationDate(
+                QtCore.QDateTime.currentDateTimeUtc().addSecs(-1))
+        return meta
+
+    def data(self, url):
+        """ Reimplementation of QNetworkDiskCache.data().
+
+        Updates the access time of the entry that is served. """
+        device = super(APIDiskCache, self).data(url)
+        if not device is None:
+            self.__touch(url.toString())
+        return device
+
+    def prepare(self, metaData):
+        """ Reimplementation of QNetworkDiskCache.prepare().
+
+        Only accepts API responses that can be revalidated later, and that Qt
+        allows to be saved. Qt does not allow this for responses that are
+        marked with Cache-Control no-store or no-cache (or Pragma no-cache),
+        for requests other than GET, and for requests of which the
+        CacheSaveControlAttribute is False. """
+        if not self.is_cacheable(metaData.url()) or \
+                not metaData.saveToDisk():
+            return None
+
+        has_validator = metaData.lastModified().isValid()
+        for name, value in metaData.rawHeaders():
+            if safe_decode(name.data()).lower() == 'etag':
+                has_validator = True
+        if not has_validator:
+            return None
+
+        device = super(APIDiskCache, self).prepare(metaData)
+        if not device is None:
+            self._prepared[device] = metaData.url().toString()
+        return device
+
+    def insert(self, device):
+        """ Reimplementation of QNetworkDiskCache.insert().
+
+        Registers the size and access time of the new entry. """
+        url = self._prepared.pop(device, None)
+        size = device.size()
+        super(APIDiskCache, self).insert(device)
+        if not url is None:
+            self.__touch(url, size)
+
+    def remove(self, url):
+        """ Reimplementation of QNetworkDiskCache.remove(). """
+        url_str = url.toString()
+        for device, prepared_url in list(self._prepared.items()):
+            if prepared_url == url_str:
+                self._prepared.pop(device, None)
+        if self._index.pop(url_str, None) is not None:
+            self._save_timer.start()
+        return super(APIDiskCache, self).remove(url)
+
+    def clear(self):
+        """ Reimplementation of QNetworkDiskCache.clear(). """
+        super(APIDiskCache, self).clear()
+        self._prepared = {}
+        self._index = {}
+        self.save_index()
+
+    def expire(self):
+        """ Reimplementation of QNetworkDiskCache.expire().
+
+        Evicts the least recently used entries until the cache is below its
+        maximum size. Qt's own implementation, which evicts the oldest files,
+        is only used as a fallback for entries that are not in the index. """
+        total = sum(size for _, size in self._index.values())
+        if total > self.maximumCacheSize():
+            target = self.maximumCacheSize() * self.EVICTION_TARGET
+            by_access_time = sorted(self._index.items(),
+                                    key=lambda item: item[1][0])
+            for url, (_, size) in by_access_time:
+                if total <= target:
+                    break
+                self.remove(QtCore.QUrl(url))
+                total -= size
+        return super(APIDiskCache, self).expire()
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+The parts of the headless clients (asyncclient.OSFClient and bulk.BulkClient)
+that do not depend on how their requests are performed: the errors they raise,
+when and after how long they repeat a request, how they verify downloads, and
+how they page through and walk listings of the OSF API. Like the clients, this
+module does not need Qt. The Retry-After parser is also used by
+retry.RetryPolicy.
+"""
+
+# Python3 compatibility
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import QOpenScienceFramework.connection as osf
+from QOpenScienceFramework.compat import replace_file
+
+from email.utils import mktime_tz, parsedate_tz
+import os
+import random
+import time
+try:
+    from urllib.parse import urlparse, parse_qsl
+except ImportError:
+    from urlparse import urlparse, parse_qsl
+
+# The number of bytes that is read or written at once during a transfer
+CHUNK_SIZE = 1024**2
+# The maximum number of items that the OSF returns per page of a listing
+ITEMS_PER_PAGE = 100
+
+
+class OSFRequestError(Exception):
+    """ Raised when a request to the OSF fails. """
+
+    def __init__(self, message, status=None, url=None):
+        super(OSFRequestError, self).__init__(message)
+        self.status = status
+        self.url = url
+
+
+def parse_retry_after(value):
+    """ Returns the number of seconds in a Retry-After header, which contains
+    either a number of seconds or a date.
+
+    Parameters
+    ----------
+    value : str
+            The value of the header, or None if there is no header
+
+    Returns
+    -------
+    float : The number of seconds to wait, or None if the header is missing or
+            not valid.
+    """
+    value = (value or '').strip()
+    if value.isdigit():
+        return float(value)
+    date = parsedate_tz(value) if value else None
+    if date is None:
+        return None
+    return max(0.0, mktime_tz(date) - time.time())
+
+
+def page_url(url, page_size=ITEMS_PER_PAGE):
+    """ Adds the number of items per page to the url of a listing, unless the
+    url already specifies it.
+
+    Parameters
+    ----------
+    url : str
+            The url of the listing
+    page_size : int (default: ITEMS_PER_PAGE)
+            The number of items to request per page. If None, the url is left
+            as it is.
+
+    Returns
+    -------
+    str : The url of the first page
+    """
+    query = parse_qsl(urlparse(url).query, keep_blank_values=True)
+    if not page_size or 'page[size]' in [key for key, value in query]:
+        return url
+    return url + '{}page[size]={}'.format('&' if '?' in url else '?',
+                                          page_size)
+
+
+def next_page_url(page):
+    """ Returns the url of the next page of a listing, or None if page is the
+    last one. """
+    return (page.get('links') or {}).get('next')
+
+
+def split_listing(items, path=''):
+    """ Sorts the items of a folder listing into files and subfolders.
+
+    Parameters
+    ----------
+    items : list
+            The 'data' entries of the listing
+    path : str (default: '')
+            The path of the folder, to prefix the names of the items with
+
+    Returns
+    -------
+    tuple : A list of tuples of the relative path and the data of each file, and
+            a list of tuples of the listing url and the relative path of each
+            subfolder.
+    """
+    files = []
+    folders = []
+    for item in items:
+        item_path = '/'.join(filter(None, [path, item['attributes']['name']]))
+        if item['attributes']['kind'] == 'folder':
+            folders.append((
+                item['relationships']['files']['links']['related']['href'],
+                item_path))
+        else:
+            files.append((item_path, item))
+    return files, folders
+
+
+class ClientBase(object):
+    """ Base class of the headless clients. Subclasses implement get_json()
+    and list_all(); the convenience API functions return what those return,
+    which for the OSFClient are coroutines. Subclasses should set the backoff
+    and max_retry_after attributes. """
+
+    # HTTP status codes that indicate a temporary problem at the server
+    RETRY_STATUSES = [429, 500, 502, 503, 504]
+    # Methods that have the same effect when they are performed twice. POST
+    # requests are never repeated.
+    IDEMPOTENT_METHODS = ['HEAD', 'GET', 'PUT', 'DELETE']
+    # The algorithms to verify downloads with, in order of preference
+    PREFERRED_ALGORITHMS = ['sha256', 'sha512', 'sha1', 'md5']
+
+    backoff = 1.0
+    max_retry_after = 300.0
+
+    # Functions for the subclasses
+
+    def _retry_delay(self, method, attempt, retries, retry_after=None):
+        """ Returns the number of seconds to wait before a request is repeated,
+        or None if it should not be repeated.
+
+        Parameters
+        ----------
+        method : str
+                The HTTP method of the request
+        attempt : int
+                The number of times the request has been repeated already
+        retries : int
+                The maximum number of times to repeat the request
+        retry_after : str (default: None)
+                The Retry-After header of the response, if any
+        """
+        if not method in self.IDEMPOTENT_METHODS or attempt >= retries:
+            return None
+        seconds = parse_retry_after(retry_after)
+        if not seconds is None:
+            return seconds if seconds <= self.max_retry_after else None
+        delay = self.backoff * 2 ** attempt
+        return random.uniform(delay / 2, delay)
+
+    def _check_status(self, method, url, status, reason):
+        """ Raises an error for a response status that indicates a failure. """
+        if status == 401:
+            raise osf.TokenExpiredError(
+                'The OAuth2 token was rejected by the OSF')
+        if status >= 400:
+            raise OSFRequestError(
+                '{} {} failed with status {} {}'.format(
+                    method, url, status, reason), status=status, url=url)
+
+    def _verifier(self, expected_hashes):
+        """ Returns the algorithm and the expected hex digest to verify a
+        download with, or Nones if none of the hashes can be checked. """
+        for algorithm in self.PREFERRED_ALGORITHMS:
+            if (expected_hashes or {}).get(algorithm):
+                return algorithm, expected_hashes[algorithm].lower()
+        return None, None
+
+    def _finish_download(self, url, part, destination, algorithm=None,
+                         expected=None, digest=None):
+        """ Moves a downloaded part file to its destination, after checking the
+        hash of its data if one is expected.
+
+        Raises
+        ------
+        OSFRequestError
+                If the data does not match the expected hash. The part file
+                is removed.
+        """
+        if not digest is None and digest.hexdigest() != expected:
+            os.remove(part)
+            raise OSFRequestError(
+                'Download of {} is corrupt: expected {} {}, got {}'.format(
+                    url, algorithm, expected, digest.hexdigest()), url=url)
+        replace_file(part, destination)
+
+    def _upload_arguments(self, source, name=None, overwrite=False):
+        """ Returns the query parameters and headers of an upload (see
+        upload()). """
+        params = {'kind': 'file'}
+        if not overwrite:
+            params['name'] = name or os.path.basename(source)
+        headers = {'Content-Length': str(os.path.getsize(source))}
+        return params, headers
+
+    def _folder_downloads(self, files, destination):
+        """ Creates the local folders for the files of a folder that was walked,
+        and returns the arguments of their downloads and their relative
+        paths. """
+        items = []
+        paths = []
+        for path, data in files:
+            local_path = os.path.join(destination, *path.split('/'))
+            folder = os.path.dirname(local_path)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            hashes = (data['attributes'].get('extra') or {}).get('hashes')
+            items.append((data['links']['download'], local_path, hashes))
+            paths.append(path)
+        return items, paths
+
+    # Convenience API functions, as in the ConnectionManager
+
+    def get_logged_in_user(self, fields=None):
+        """ Retrieves the data of the user the token belongs to. """
+        return self.get_json(osf.api_call('logged_in_user', fields=fields))
+
+    def get_user_projects(self, fields=None):
+        """ Retrieves all nodes of the user the token belongs to. """
+        return self.list_all(osf.api_call('projects', fields=fields))
+
+    def get_project_repos(self, project_id, fields=None):
+        """ Retrieves the storage providers of a project. """
+        return self.list_all(
+            osf.api_call('project_repos', project_id, fields=fields))
+
+    def get_repo_files(self, project_id, repo_name, fields=None):
+        """ Retrieves the files and folders in the root of a storage provider
+        of a project. """
+        return self.list_all(
+            osf.api_call('repo_files', project_id, repo_name, fields=fields))
+
+    def get_file_info(self, file_id, fields=None):
+        """ Retrieves the data of a file. """
+        return self.get_json(osf.api_call('file_info', file_id, fields=fields))
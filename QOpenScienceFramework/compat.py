@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import os
 import sys
-from qtpy import QtCore
 
 if sys.version_info >= (3,0,0):
 	py3 = True
@@ -43,18 +43,47 @@ def safe_encode(s, enc='utf-8', errors='strict'):
 def get_QUrl(url):
 	""" Qt4 doesn url handling a bit different than Qt5, so check for that
 	here."""
+	# Imported here, so that the parts of the package that do not use Qt (such
+	# as the connection module) can be used without it
+	from qtpy import QtCore
 	if QtCore.PYQT_VERSION_STR < '5':
 		return QtCore.QUrl.fromEncoded(url)
 	else:
 		return QtCore.QUrl(url)
 
+def replace_file(source, destination):
+	""" Moves a file to its destination, replacing any file that already
+	exists there. If both are on the same file system, the replacement is
+	atomic (except on Windows under Python 2): the destination never contains
+	a partially written file.
+
+	Parameters
+	----------
+	source : string
+		The file to move
+	destination : string
+		The path to move the file to
+
+	Raises
+	------
+	OSError :
+		If the file could not be moved
+	"""
+	if hasattr(os, 'replace'):
+		os.replace(source, destination)
+		return
+	# Python 2: rename() only replaces existing files on POSIX systems
+	if os.name == 'nt' and os.path.exists(destination):
+		os.remove(destination)
+	os.rename(source, destination)
+
 if py3:
 	safe_str = safe_decode
 else:
 	safe_str = safe_encode
 
 __all__ = ['py3', 'safe_decode', 'safe_encode', 'safe_str',
-	'universal_newline_mode','get_QUrl']
+	'universal_newline_mode','get_QUrl', 'replace_file']
 if not py3:
 	__all__ += ['str', 'bytes']
 else:
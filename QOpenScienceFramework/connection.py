@@ -35,6 +35,10 @@ import requests_oauthlib
 from oauthlib.oauth2 import MobileApplicationClient
 # Easier function decorating
 from functools import wraps
+try:
+    from urllib.parse import urlparse, parse_qsl
+except ImportError:
+    from urlparse import urlparse, parse_qsl
 
 
 # Load settings file containing required OAuth2 parameters
@@ -42,9 +46,14 @@ with open(os.path.join(dirname, 'settings.json')) as fp:
     settings = json.load(fp)
 base_url = settings['base_url']
 api_base_url = settings['api_base_url']
+# The WaterButler server, which handles the file operations
+files_url = settings.get('files_url', 'https://files.osf.io/')
 scope = settings['scope']
 website_url = settings['website_url']
 
+# The settings that contain the urls of the servers of the OSF
+SERVER_URLS = ['base_url', 'api_base_url', 'files_url', 'website_url']
+
 # Convenience reference
 TokenExpiredError = requests_oauthlib.oauth2_session.TokenExpiredError
 
@@ -97,7 +106,116 @@ api_calls = {
 }
 
 
-def api_call(command, *args):
+def set_server_urls(**urls):
+    """ Points the module at other servers than the ones in settings.json, e.g.
+    the test servers of the OSF or the stand-in server in
+    QOpenScienceFramework.fakeserver. The settings dictionary, the url
+    variables of this module and the OAuth2 urls are updated. Should be called
+    before the ConnectionManager is created, as it reads some of the urls when
+    it is constructed.
+
+    Parameters
+    ----------
+    **urls : str
+            The new urls, by name: base_url (the accounts server), api_base_url,
+            files_url (WaterButler) and website_url. Urls that are not
+            specified are left as they are.
+
+    Returns
+    -------
+    dict : The previous urls, which can be passed to this function to restore
+            them.
+
+    Raises
+    ------
+    TypeError
+            When an unknown url is specified.
+    """
+    global base_url, api_base_url, files_url, website_url
+    global auth_url, token_url, logout_url
+
+    for name in urls:
+        if not name in SERVER_URLS:
+            raise TypeError("Unknown server url: {}".format(name))
+    previous = {
+        'base_url': base_url,
+        'api_base_url': api_base_url,
+        'files_url': files_url,
+        'website_url': website_url,
+    }
+    settings.update(urls)
+    base_url = settings['base_url']
+    api_base_url = settings['api_base_url']
+    files_url = settings.get('files_url', files_url)
+    website_url = settings['website_url']
+    auth_url = base_url + "oauth2/authorize"
+    token_url = base_url + "oauth2/token"
+    logout_url = base_url + "oauth2/revoke"
+    return previous
+
+
+def add_fields(url, fields):
+    """ Adds JSON:API sparse fieldset parameters to an API url, so that the
+    response only contains the listed attributes and relationships of each type
+    of object. Types for which the url already specifies the fields (such as
+    the links to next pages, which repeat the parameters of the first page) are
+    left as they are.
+
+    Parameters
+    ----------
+    url : str
+            The url of the API endpoint
+    fields : dict
+            The names of the attributes and relationships to return, by object
+            type, e.g. ``{'nodes': ['title', 'category', 'files']}``
+
+    Returns
+    -------
+    string : The url with the fields[<type>] parameters.
+    """
+    # The links that the API returns contain the parameters percent-encoded
+    # (fields%5Bnodes%5D), so they are compared after decoding them.
+    existing = set(key for key, value in _query_params(url))
+    for kind, names in sorted((fields or {}).items()):
+        param = 'fields[{}]'.format(kind)
+        if param in existing:
+            continue
+        url += ('&' if '?' in url else '?') + param + '=' + ','.join(names)
+    return url
+
+
+def add_embeds(url, embeds):
+    """ Adds JSON:API embed parameters to an API url, so that the objects of
+    the listed relationships are included in the response (the first page of
+    them, for relationships to several objects). Relationships that the url
+    already embeds are not added again.
+
+    Parameters
+    ----------
+    url : str
+            The url of the API endpoint
+    embeds : list
+            The names of the relationships to embed, e.g. ``['children']``
+
+    Returns
+    -------
+    string : The url with the embed parameters.
+    """
+    existing = _query_params(url)
+    for relationship in embeds or []:
+        if ('embed', relationship) in existing:
+            continue
+        url += ('&' if '?' in url else '?') + 'embed={}'.format(relationship)
+    return url
+
+
+def _query_params(url):
+    """ Returns the decoded parameters of the query string of a url, as a list
+    of (name, value) tuples. """
+    return parse_qsl(urlparse(url).query, keep_blank_values=True)
+
+
+def api_call(command, *args, **kwargs):
     """ generates and api endpoint. If arguments are required to build the endpoint
     , they can be specified as extra arguments.
 
@@ -123,13 +241,17 @@ def api_call(command, *args):
             Optional extra data which is needed to construct the correct api endpoint uri.
             Check the OSF API documentation for a list of variables that each type of
             call expects.
+    fields : dict (optional)
+            The attributes and relationships to return per object type (see
+            add_fields()). If not specified, the complete objects are returned.
 
     Returns
     -------
     string : The complete uri for the api endpoint.
     """
 
-    return api_base_url + api_calls[command].format(*args)
+    return add_fields(api_base_url + api_calls[command].format(*args),
+                      kwargs.get('fields'))
 
 
 def check_for_active_session():
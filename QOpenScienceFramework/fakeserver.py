@@ -0,0 +1,1437 @@
+# -*- coding: utf-8 -*-
+"""
+A local stand-in for the OSF, for testing and benchmarking without network
+access.
+
+The server implements the endpoints of the OSF API (v2) and of WaterButler
+(the file server of the OSF) that the ConnectionManager, the ProjectTree and
+the OSFExplorer use:
+
+- the logged in user, and the listings of its nodes, of the components, linked
+  nodes and storage providers of a node, and of the contents of folders, with
+  pagination, sparse fieldsets (fields[<type>]) and embeds
+- the metadata of files
+- downloads, with Range requests, and optionally a redirect to a signed
+  storage url, as many storage providers do
+- uploads of new files and of new versions, also with the resumable upload
+  protocol that is used by transfers.ChunkedUpload
+- creating folders and deleting files and folders
+- the OAuth2 authorization page, which immediately redirects with a token,
+  and the revocation of tokens
+
+The projects, folders and files are kept in memory, in a FakeOSF object. If a
+token is set, requests without it are refused with 401 Unauthorized. Latency,
+a bandwidth limit, a rate limit (429 Too Many Requests) and failures can be
+injected to test how the client handles them.
+
+Besides the OSF endpoints, any path can be used to upload files to (with PUT)
+and download them from, and JSON documents, paginated listings and redirects
+can be served at any path with add_document(), add_listing() and
+add_redirect().
+
+The server can be started from the command line with::
+
+    python -m QOpenScienceFramework.fakeserver --port 8000 --demo
+
+or from Python::
+
+    server = FakeServer(port=0, token='secret')
+    project = server.osf.add_project('Experiment')
+    server.osf.add_file(project, 'data.csv', b'1,2,3')
+    with server:  # starts it and points the connection module at it
+        ...
+
+The server is meant for tests and benchmarks only. While its settings are
+applied, requests_oauthlib accepts plain http for all sessions in the process
+(see FakeServer.apply_settings()).
+"""
+
+# Python3 compatibility
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import collections
+import datetime
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from email.utils import formatdate
+
+try:
+    from urllib.parse import parse_qs
+except ImportError:
+    from urlparse import parse_qs
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import logging
+logger = logging.getLogger()
+
+SESSION_PREFIX = '/upload-sessions/'
+# The paths of the parts of the OSF on the server
+API_PREFIX = '/v2/'
+WATERBUTLER_PREFIX = '/v1/resources/'
+STORAGE_PREFIX = '/storage/'
+ACCOUNTS_PREFIX = '/accounts/'
+WEBSITE_PREFIX = '/web/'
+AVATAR_PATH = WEBSITE_PREFIX + 'avatar.png'
+
+# The number of items per page of a listing if page[size] is not specified,
+# and the maximum, as on the OSF
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+# The relationships of nodes that can be embedded
+EMBEDDABLE = ['files', 'children', 'linked_nodes']
+# The number of seconds that the signed urls of downloads are valid
+SIGNED_URL_TTL = 3600
+# The number of bytes that is written or read at once when the bandwidth is
+# limited
+THROTTLE_CHUNK_SIZE = 16*1024
+# The environment variable that allows requests_oauthlib to use plain http
+INSECURE_TRANSPORT = 'OAUTHLIB_INSECURE_TRANSPORT'
+# A transparent 1x1 PNG image, served as the avatar of the user
+AVATAR = (b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00'
+          b'\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\rIDATx\x9cc'
+          b'\xf8\x0f\x00\x00\x01\x01\x00\x05\x18\xd8N\x00\x00\x00\x00IEND\xaeB'
+          b'`\x82')
+
+
+class FakeServerError(Exception):
+    """ An error response of the stand-in server. """
+
+    def __init__(self, status, detail):
+        super(FakeServerError, self).__init__(detail)
+        self.status = status
+
+
+def _now():
+    """ Returns the current time, as the OSF formats it. """
+    return datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+
+def _related(href):
+    """ Returns a relationship that links to href. """
+    return {'links': {'related': {'href': href, 'meta': {}}}}
+
+
+class FakeOSF(object):
+    """ The user, projects, folders and files that the stand-in server serves,
+    and their representations in the OSF API and WaterButler. Each node has a
+    single storage provider, osfstorage. The contents can be changed while the
+    server is running; all access goes through the lock. """
+
+    PROVIDER = 'osfstorage'
+
+    def __init__(self, base_url):
+        """ Constructor
+
+        Parameters
+        ----------
+        base_url : str
+                The url of the server, without a trailing slash.
+        """
+        self.base_url = base_url
+        self.api_url = base_url + API_PREFIX
+        self.lock = threading.RLock()
+        self.user = {
+            'id': 'fakeuser',
+            'full_name': 'Fake User',
+            'given_name': 'Fake',
+            'family_name': 'User',
+        }
+        self.nodes = collections.OrderedDict()
+        self.entries = {}
+
+    # Building the contents
+
+    def add_project(self, title, category='project', public=False,
+                    parent=None):
+        """ Adds a project, or a component of another node.
+
+        Parameters
+        ----------
+        title : str
+                The title of the node.
+        category : str (default: 'project')
+                The category of the node, e.g. 'project' or 'data'.
+        public : bool (default: False)
+                Whether the node is public.
+        parent : str (default: None)
+                The id of the node to add the node to as a component.
+
+        Returns
+        -------
+        str
+                The id of the new node
+        """
+        with self.lock:
+            node_id = uuid.uuid4().hex[:5]
+            root_id = uuid.uuid4().hex[:24]
+            self.nodes[node_id] = {
+                'id': node_id,
+                'title': title,
+                'category': category,
+                'public': public,
+                'parent': parent,
+                'children': [],
+                'linked_nodes': [],
+                'created': _now(),
+                'modified': _now(),
+                'root': root_id,
+            }
+            self.entries[root_id] = {
+                'id': root_id,
+                'node': node_id,
+                'kind': 'folder',
+                'name': '',
+                'parent': None,
+                'children': [],
+            }
+            if not parent is None:
+                self.nodes[parent]['children'].append(node_id)
+            return node_id
+
+    def link_nodes(self, node_id, linked_id):
+        """ Adds a node to the linked nodes of another. """
+        with self.lock:
+            self.nodes[node_id]['linked_nodes'].append(linked_id)
+
+    def __add_entry(self, node_id, name, kind, parent):
+        """ Adds a file or folder, or returns the existing one of the same
+        kind. """
+        parent = parent or self.nodes[node_id]['root']
+        for child in self.entries[parent]['children']:
+            entry = self.entries[child]
+            if entry['name'] == name:
+                if entry['kind'] != kind:
+                    raise FakeServerError(
+                        409, 'A {} named {} already exists'.format(
+                            entry['kind'], name))
+                return entry
+        entry = {
+            'id': uuid.uuid4().hex[:24],
+            'node': node_id,
+            'kind': kind,
+            'name': name,
+            'parent': parent,
+            'children': [],
+            'data': b'',
+            'version': 0,
+            'created': _now(),
+            'modified': _now(),
+            'modified_time': time.time(),
+        }
+        self.entries[entry['id']] = entry
+        self.entries[parent]['children'].append(entry['id'])
+        return entry
+
+    def add_folder(self, node_id, name, parent=None):
+        """ Adds a folder to the storage of a node.
+
+        Parameters
+        ----------
+        node_id : str
+                The id of the node.
+        name : str
+                The name of the folder.
+        parent : str (default: None)
+                The id of the folder to add the folder to. If None, the folder
+                is added to the root of the storage.
+
+        Returns
+        -------
+        str
+                The id of the folder
+        """
+        with self.lock:
+            return self.__add_entry(node_id, name, 'folder', parent)['id']
+
+    def add_file(self, node_id, name, data=b'', parent=None):
+        """ Adds a file to the storage of a node. If the file already exists,
+        the data is stored as its new version.
+
+        Parameters
+        ----------
+        node_id : str
+                The id of the node.
+        name : str
+                The name of the file.
+        data : bytes (default: b'')
+                The contents of the file.
+        parent : str (default: None)
+                The id of the folder to add the file to. If None, the file is
+                added to the root of the storage.
+
+        Returns
+        -------
+        str
+                The id of the file
+        """
+        with self.lock:
+            entry = self.__add_entry(node_id, name, 'file', parent)
+            self.write(entry['id'], data)
+            return entry['id']
+
+    def write(self, entry_id, data):
+        """ Stores data as the new version of a file. """
+        with self.lock:
+            entry = self.entries[entry_id]
+            entry['data'] = bytes(data)
+            entry['version'] += 1
+            entry['modified'] = _now()
+            entry['modified_time'] = time.time()
+
+    def remove(self, entry_id):
+        """ Removes a file or folder (with its contents). """
+        with self.lock:
+            entry = self.entries.pop(entry_id)
+            for child in list(entry['children']):
+                self.remove(child)
+            if not entry['parent'] is None and \
+                    entry['parent'] in self.entries:
+                self.entries[entry['parent']]['children'].remove(entry_id)
+
+    def find(self, node_id, path):
+        """ Returns the id of the file or folder at a path in the storage of a
+        node, e.g. '/data/results.csv', or None if it does not exist. """
+        with self.lock:
+            entry_id = self.nodes[node_id]['root']
+            for name in [name for name in path.split('/') if name]:
+                for child in self.entries[entry_id]['children']:
+                    if self.entries[child]['name'] == name:
+                        entry_id = child
+                        break
+                else:
+                    return None
+            return entry_id
+
+    def file_data(self, entry_id):
+        """ Returns the contents of a file. """
+        with self.lock:
+            return self.entries[entry_id]['data']
+
+    # Representations
+
+    def hashes(self, entry_id):
+        """ Returns the hashes of a file, as the OSF reports them. """
+        data = self.entries[entry_id]['data']
+        return {'md5': hashlib.md5(data).hexdigest(),
+                'sha256': hashlib.sha256(data).hexdigest()}
+
+    def materialized_path(self, entry_id):
+        """ Returns the path of a file or folder by the names of its parents. """
+        names = []
+        entry = self.entries[entry_id]
+        while not entry['parent'] is None:
+            names.insert(0, entry['name'])
+            entry = self.entries[entry['parent']]
+        path = '/' + '/'.join(names)
+        if self.entries[entry_id]['kind'] == 'folder' and names:
+            path += '/'
+        return path
+
+    def path(self, entry_id):
+        """ Returns the path of a file or folder in osfstorage, which is based
+        on its id. """
+        entry = self.entries[entry_id]
+        if entry['parent'] is None:
+            return '/'
+        return '/' + entry_id + ('/' if entry['kind'] == 'folder' else '')
+
+    def waterbutler_url(self, entry_id):
+        """ Returns the url of a file or folder on WaterButler. """
+        entry = self.entries[entry_id]
+        return '{}{}{}/providers/{}{}'.format(
+            self.base_url, WATERBUTLER_PREFIX, entry['node'], self.PROVIDER,
+            self.path(entry_id))
+
+    def user_json(self):
+        return {
+            'id': self.user['id'],
+            'type': 'users',
+            'attributes': dict((key, value) for key, value in
+                               self.user.items() if key != 'id'),
+            'relationships': {
+                'nodes': _related(self.api_url + 'users/me/nodes/'),
+            },
+            'links': {
+                'self': self.api_url + 'users/me/',
+                'html': self.base_url + WEBSITE_PREFIX + self.user['id'] + '/',
+                'profile_image': self.base_url + AVATAR_PATH,
+            },
+        }
+
+    def node_json(self, node_id):
+        node = self.nodes[node_id]
+        node_url = '{}nodes/{}/'.format(self.api_url, node_id)
+        relationships = dict((name, _related(node_url + name + '/'))
+                             for name in EMBEDDABLE)
+        if not node['parent'] is None:
+            relationships['parent'] = _related(
+                '{}nodes/{}/'.format(self.api_url, node['parent']))
+        return {
+            'id': node_id,
+            'type': 'nodes',
+            'attributes': {
+                'title': node['title'],
+                'description': '',
+                'category': node['category'],
+                'public': node['public'],
+                'date_created': node['created'],
+                'date_modified': node['modified'],
+                'current_user_permissions': ['read', 'write', 'admin'],
+            },
+            'relationships': relationships,
+            'links': {
+                'self': node_url,
+                'html': self.base_url + WEBSITE_PREFIX + node_id + '/',
+            },
+        }
+
+    def provider_json(self, node_id):
+        root_id = self.nodes[node_id]['root']
+        url = self.waterbutler_url(root_id)
+        return {
+            'id': '{}:{}'.format(node_id, self.PROVIDER),
+            'type': 'files',
+            'attributes': {
+                'name': self.PROVIDER,
+                'kind': 'folder',
+                'path': '/',
+                'node': node_id,
+                'provider': self.PROVIDER,
+            },
+            'relationships': {
+                'files': _related('{}nodes/{}/files/{}/'.format(
+                    self.api_url, node_id, self.PROVIDER)),
+            },
+            'links': {
+                'upload': url,
+                'new_folder': url + '?kind=folder',
+            },
+        }
+
+    def __links(self, entry_id):
+        """ Returns the WaterButler links of a file or folder. """
+        url = self.waterbutler_url(entry_id)
+        links = {'upload': url, 'delete': url, 'move': url}
+        if self.entries[entry_id]['kind'] == 'folder':
+            links['new_folder'] = url + '?kind=folder'
+        else:
+            links['download'] = url
+        return links
+
+    def file_json(self, entry_id):
+        """ Returns the representation of a file or folder in the API. """
+        entry = self.entries[entry_id]
+        attributes = {
+            'name': entry['name'],
+            'kind': entry['kind'],
+            'path': self.path(entry_id),
+            'materialized_path': self.materialized_path(entry_id),
+            'provider': self.PROVIDER,
+            'date_created': entry['created'],
+            'date_modified': entry['modified'],
+            'guid': None,
+        }
+        relationships = {'node': _related(
+            '{}nodes/{}/'.format(self.api_url, entry['node']))}
+        if entry['kind'] == 'file':
+            attributes.update({
+                'size': len(entry['data']),
+                'current_version': entry['version'],
+                'extra': {'hashes': self.hashes(entry_id), 'downloads': 0},
+            })
+        else:
+            attributes.update({'size': None, 'extra': {}})
+            relationships['files'] = _related('{}nodes/{}/files/{}/{}/'.format(
+                self.api_url, entry['node'], self.PROVIDER, entry_id))
+        links = self.__links(entry_id)
+        links['info'] = links['self'] = '{}files/{}/'.format(
+            self.api_url, entry_id)
+        return {
+            'id': entry_id,
+            'type': 'files',
+            'attributes': attributes,
+            'relationships': relationships,
+            'links': links,
+        }
+
+    def waterbutler_json(self, entry_id):
+        """ Returns the representation of a file or folder in WaterButler. """
+        entry = self.entries[entry_id]
+        attributes = {
+            'name': entry['name'],
+            'kind': entry['kind'],
+            'path': self.path(entry_id),
+            'materialized': self.materialized_path(entry_id),
+            'provider': self.PROVIDER,
+            'resource': entry['node'],
+            'extra': {},
+        }
+        if entry['kind'] == 'file':
+            attributes.update({
+                'size': len(entry['data']),
+                'modified': entry['modified'],
+                'modified_utc': entry['modified'],
+                'created_utc': entry['created'],
+                'etag': self.etag(entry_id),
+                'extra': {'version': entry['version'],
+                          'hashes': self.hashes(entry_id)},
+            })
+        return {
+            'id': '{}{}'.format(self.PROVIDER, self.path(entry_id)),
+            'type': 'files',
+            'attributes': attributes,
+            'links': self.__links(entry_id),
+        }
+
+    def etag(self, entry_id):
+        """ Returns the ETag of the current version of a file. """
+        return '"{}-{}"'.format(self.hashes(entry_id)['sha256'][:16],
+                                self.entries[entry_id]['version'])
+
+    def relationship(self, node_id, name):
+        """ Returns the items of a relationship of a node: 'files' (the storage
+        providers), 'children' or 'linked_nodes'. """
+        if name == 'files':
+            return [self.provider_json(node_id)]
+        return [self.node_json(related)
+                for related in self.nodes[node_id][name]]
+
+    def user_nodes(self, category=None):
+        """ Returns the nodes of the user, optionally of a single category. """
+        return [self.node_json(node_id) for node_id, node in self.nodes.items()
+                if category is None or node['category'] == category]
+
+    def folder_items(self, entry_id):
+        """ Returns the files and folders in a folder. """
+        return [self.file_json(child)
+                for child in self.entries[entry_id]['children']]
+
+    # WaterButler operations
+
+    def put(self, node_id, entry_id, params, data):
+        """ Performs a WaterButler upload or folder creation.
+
+        Parameters
+        ----------
+        node_id : str
+                The id of the node.
+        entry_id : str
+                The id of the folder or file that was put to.
+        params : dict
+                The parameters of the request (kind and name).
+        data : bytes
+                The body of the request.
+
+        Returns
+        -------
+        tuple
+                The status and the WaterButler representation of the file or
+                folder
+        """
+        kind = params.get('kind', ['file'])[0]
+        name = params.get('name', [None])[0]
+        with self.lock:
+            entry = self.entries[entry_id]
+            if entry['node'] != node_id:
+                raise KeyError(entry_id)
+            if entry['kind'] == 'file':
+                # A new version of an existing file
+                self.write(entry_id, data)
+                return 200, {'data': self.waterbutler_json(entry_id)}
+            if not name:
+                raise FakeServerError(400, 'Missing name')
+            existing = self.find(node_id, self.materialized_path(entry_id) +
+                                 '/' + name)
+            if not existing is None:
+                raise FakeServerError(
+                    409, 'Cannot complete action: file or folder "{}" already '
+                    'exists in this location'.format(name))
+            if kind == 'folder':
+                new_id = self.add_folder(node_id, name, entry_id)
+            else:
+                new_id = self.add_file(node_id, name, data, entry_id)
+            return 201, {'data': self.waterbutler_json(new_id)}
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+    """ Handles the requests to the FakeServer. """
+
+    protocol_version = 'HTTP/1.1'
+
+    # Helper functions
+
+    def log_message(self, format, *args):
+        logger.debug("fakeserver: " + format % args)
+
+    def __write(self, data):
+        """ Sends data, no faster than the bandwidth limit allows. """
+        bandwidth = self.server.fake.bandwidth
+        if not bandwidth:
+            self.wfile.write(data)
+            return
+        for start in range(0, len(data), THROTTLE_CHUNK_SIZE):
+            chunk = data[start:start + THROTTLE_CHUNK_SIZE]
+            self.wfile.write(chunk)
+            self.wfile.flush()
+            time.sleep(len(chunk) / float(bandwidth))
+
+    def __respond(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.__write(body)
+
+    def __respond_json(self, status, data, headers=None):
+        headers = dict(headers or {})
+        headers['Content-Type'] = 'application/vnd.api+json'
+        body = json.dumps(data).encode('utf-8')
+        if status == 200 and self.command in ['GET', 'HEAD']:
+            # Allows clients to revalidate their cached copies
+            headers['ETag'] = '"{}"'.format(hashlib.md5(body).hexdigest())
+            if self.headers.get('If-None-Match') == headers['ETag']:
+                self.__respond(304, headers={'ETag': headers['ETag']})
+                return
+        self.__respond(status, body, headers)
+
+    def __error(self, status, detail, headers=None):
+        self.__respond_json(status, {'errors': [{'detail': detail}]}, headers)
+
+    def __read_body(self, throttle=True):
+        if self.__body_read:
+            return b''
+        self.__body_read = True
+        length = int(self.headers.get('Content-Length') or 0)
+        bandwidth = self.server.fake.bandwidth
+        if not length:
+            return b''
+        if not throttle or not bandwidth:
+            return self.rfile.read(length)
+        data = []
+        while length > 0:
+            chunk = self.rfile.read(min(length, THROTTLE_CHUNK_SIZE))
+            if not chunk:
+                break
+            data.append(chunk)
+            length -= len(chunk)
+            time.sleep(len(chunk) / float(bandwidth))
+        return b''.join(data)
+
+    def __file_response(self, path):
+        """ Returns a representation of a stored file that resembles the one
+        WaterButler returns after an upload. """
+        name = path.rstrip('/').split('/')[-1]
+        return {'data': {
+            'id': path,
+            'type': 'files',
+            'attributes': {
+                'name': name,
+                'path': path,
+                'kind': 'file',
+                'provider': 'osfstorage',
+                'size': len(self.server.files[path]),
+            }
+        }}
+
+    def __send_data(self, data, headers=None):
+        """ Sends the contents of a file, or the part of it that was asked for
+        with a Range header. """
+        headers = dict(headers or {})
+        headers.setdefault('Content-Type', 'application/octet-stream')
+        headers['Accept-Ranges'] = 'bytes'
+        requested = (self.headers.get('Range') or '').strip()
+        if_range = self.headers.get('If-Range')
+        if requested and (if_range is None or
+                          if_range == headers.get('ETag')):
+            total = len(data)
+            match = re.match(r'bytes=(\d*)-(\d*)$', requested)
+            if match and match.group(1):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else total - 1
+            elif match and match.group(2):
+                start = max(0, total - int(match.group(2)))
+                end = total - 1
+            else:
+                start, end = total, 0
+            if start >= total or end < start:
+                self.__respond(416, headers={
+                    'Content-Range': 'bytes */{}'.format(total)})
+                return
+            end = min(end, total - 1)
+            headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, end,
+                                                              total)
+            self.__respond(206, data[start:end + 1], headers)
+            return
+        self.__respond(200, data, headers)
+
+    def __page(self, items, path, params):
+        """ Returns a page of a listing, with a link to the next page. """
+        try:
+            page = max(1, int(params.get('page', ['1'])[0]))
+            size = int(params.get('page[size]',
+                                  [self.server.fake.page_size])[0])
+            size = max(1, min(size, MAX_PAGE_SIZE))
+        except ValueError:
+            raise FakeServerError(400, 'Invalid page')
+        start = (page - 1) * size
+        next_url = None
+        if start + size < len(items):
+            next_params = dict(params)
+            next_params['page'] = [str(page + 1)]
+            next_url = '{}{}?{}'.format(
+                self.server.fake.base_url, path,
+                '&'.join('{}={}'.format(key, value) for key, values
+                         in sorted(next_params.items()) for value in values))
+        return {
+            'data': items[start:start + size],
+            'links': {'next': next_url, 'prev': None,
+                      'meta': {'total': len(items), 'per_page': size}},
+            'meta': {'total': len(items), 'per_page': size},
+        }
+
+    def __shape(self, item, params):
+        """ Adds the embeds to an item of the API, and removes the attributes
+        and relationships that were not asked for. """
+        embeds = params.get('embed', [])
+        for name in embeds:
+            if not name in EMBEDDABLE:
+                raise FakeServerError(
+                    400, 'The embed {} is not supported'.format(name))
+        if item['type'] == 'nodes' and embeds:
+            osf = self.server.fake.osf
+            item['embeds'] = {}
+            for name in embeds:
+                url = '{}nodes/{}/{}/'.format(API_PREFIX, item['id'], name)
+                item['embeds'][name] = self.__page(
+                    [self.__shape(related, {'fields[nodes]': params.get(
+                        'fields[nodes]', []), 'fields[files]': params.get(
+                        'fields[files]', [])})
+                     for related in osf.relationship(item['id'], name)],
+                    url, {})
+        fields = params.get('fields[{}]'.format(item['type']))
+        if fields:
+            names = ','.join(fields).split(',')
+            for section in ['attributes', 'relationships']:
+                item[section] = dict((key, value) for key, value in
+                                     item.get(section, {}).items()
+                                     if key in names)
+        return item
+
+    # Request handling
+
+    def do_GET(self):
+        self.__handle()
+
+    def do_HEAD(self):
+        self.__handle()
+
+    def do_PUT(self):
+        self.__handle()
+
+    def do_POST(self):
+        self.__handle()
+
+    def do_DELETE(self):
+        self.__handle()
+
+    def __authorized(self, path):
+        """ Checks the token of a request to the API or WaterButler, if the
+        server requires one. """
+        token = self.server.fake.token
+        if token is None or not (path.startswith(API_PREFIX) or
+                                 path.startswith(WATERBUTLER_PREFIX)):
+            return True
+        return self.headers.get('Authorization') == 'Bearer {}'.format(token)
+
+    def __handle(self):
+        self.__body_read = False
+        path, _, query = self.path.partition('?')
+        path = re.sub('/+', '/', path)
+        params = parse_qs(query, keep_blank_values=True)
+        fake = self.server.fake
+        fake._record(self.command, self.path)
+        if fake.latency:
+            time.sleep(fake.latency)
+
+        failure = fake._failure(path)
+        if not failure is None:
+            status, retry_after = failure
+            self.__read_body(throttle=False)
+            if status is None:
+                # Drop the connection without a response
+                self.close_connection = True
+                return
+            headers = {}
+            if not retry_after is None:
+                headers['Retry-After'] = str(retry_after)
+            self.__error(status, 'Injected failure', headers)
+            return
+
+        if not self.__authorized(path):
+            self.__read_body(throttle=False)
+            self.__error(401, 'Authentication credentials were not provided.')
+            return
+
+        try:
+            if path.startswith(API_PREFIX):
+                self.__api(path, params)
+            elif path.startswith(WATERBUTLER_PREFIX):
+                self.__waterbutler(path, params)
+            elif path.startswith(STORAGE_PREFIX):
+                self.__storage(path, params)
+            elif path.startswith(ACCOUNTS_PREFIX):
+                self.__accounts(path, params)
+            elif path == AVATAR_PATH:
+                self.__respond(200, AVATAR, {'Content-Type': 'image/png'})
+            else:
+                self.__plain(path, query)
+        except KeyError:
+            self.__read_body(throttle=False)
+            self.__error(404, 'Not found')
+        except FakeServerError as e:
+            self.__read_body(throttle=False)
+            self.__error(e.status, str(e))
+
+    def __api(self, path, params):
+        """ Handles a request to the OSF API. """
+        if not self.command in ['GET', 'HEAD']:
+            self.__read_body(throttle=False)
+            raise FakeServerError(405, 'Method not allowed')
+        osf = self.server.fake.osf
+        parts = path[len(API_PREFIX):].strip('/').split('/')
+        with osf.lock:
+            if parts == ['users', 'me']:
+                result = osf.user_json()
+            elif parts == ['users', 'me', 'nodes']:
+                category = (params.get('filter[category][eq]') or
+                            params.get('filter[category]') or [None])[0]
+                result = osf.user_nodes(category)
+            elif parts[0] == 'nodes' and len(parts) == 2:
+                result = osf.node_json(parts[1])
+            elif parts[0] == 'nodes' and len(parts) == 3 and \
+                    parts[2] in EMBEDDABLE:
+                result = osf.relationship(parts[1], parts[2])
+            elif parts[0] == 'nodes' and len(parts) in [4, 5] and \
+                    parts[2] == 'files' and parts[3] == osf.PROVIDER:
+                entry_id = parts[4] if len(parts) == 5 else \
+                    osf.nodes[parts[1]]['root']
+                if osf.entries[entry_id]['node'] != parts[1]:
+                    raise KeyError(entry_id)
+                if osf.entries[entry_id]['kind'] == 'folder':
+                    result = osf.folder_items(entry_id)
+                else:
+                    result = osf.file_json(entry_id)
+            elif parts[0] == 'files' and len(parts) == 2:
+                result = osf.file_json(parts[1])
+            else:
+                raise KeyError(path)
+
+            if isinstance(result, list):
+                document = self.__page(result, path, params)
+                document['data'] = [self.__shape(item, params)
+                                    for item in document['data']]
+            else:
+                document = {'data': self.__shape(result, params)}
+        self.__respond_json(200, document)
+
+    def __waterbutler(self, path, params):
+        """ Handles a request to WaterButler:
+        /v1/resources/<node>/providers/osfstorage/<path> """
+        osf = self.server.fake.osf
+        parts = path[len(WATERBUTLER_PREFIX):].split('/', 3)
+        if len(parts) < 3 or parts[1] != 'providers' or \
+                parts[2] != osf.PROVIDER:
+            raise KeyError(path)
+        node_id = parts[0]
+        with osf.lock:
+            entry_id = (parts[3] if len(parts) == 4 else '').strip('/') or \
+                osf.nodes[node_id]['root']
+            entry = osf.entries[entry_id]
+            if entry['node'] != node_id:
+                raise KeyError(entry_id)
+
+        if self.command in ['GET', 'HEAD'] and entry['kind'] == 'folder':
+            with osf.lock:
+                items = [osf.waterbutler_json(child)
+                         for child in entry['children']]
+            self.__respond_json(200, {'data': items})
+        elif self.command in ['GET', 'HEAD']:
+            self.__download(entry_id)
+        elif self.command == 'PUT' and \
+                not self.headers.get('X-Upload-Content-Length') is None:
+            self.__start_session(self.path)
+        elif self.command == 'PUT':
+            status, document = osf.put(node_id, entry_id, params,
+                                       self.__read_body())
+            self.__respond_json(status, document)
+        elif self.command == 'DELETE':
+            if entry['parent'] is None:
+                raise FakeServerError(400, 'The root can not be deleted')
+            osf.remove(entry_id)
+            self.__respond(204)
+        else:
+            self.__read_body(throttle=False)
+            raise FakeServerError(405, 'Method not allowed')
+
+    def __download(self, entry_id):
+        """ Sends a file, or redirects to its signed storage url. """
+        fake = self.server.fake
+        with fake.osf.lock:
+            data = fake.osf.file_data(entry_id)
+            entry = fake.osf.entries[entry_id]
+            headers = {
+                'ETag': fake.osf.etag(entry_id),
+                'Last-Modified': formatdate(entry['modified_time'],
+                                            usegmt=True),
+                'Content-Disposition': 'attachment; filename="{}"'.format(
+                    entry['name']),
+            }
+            version = entry['version']
+        if fake.redirect_downloads:
+            location = '{}{}{}?version={}&Expires={}&Signature={}'.format(
+                fake.base_url, STORAGE_PREFIX, entry_id, version,
+                int(time.time()) + SIGNED_URL_TTL, uuid.uuid4().hex)
+            self.__respond(302, headers={'Location': location})
+            return
+        self.__send_data(data, headers)
+
+    def __storage(self, path, params):
+        """ Serves a file at its signed storage url. """
+        if not self.command in ['GET', 'HEAD']:
+            self.__read_body(throttle=False)
+            raise FakeServerError(405, 'Method not allowed')
+        try:
+            expires = int(params.get('Expires', ['0'])[0])
+        except ValueError:
+            expires = 0
+        if expires < time.time():
+            raise FakeServerError(403, 'Request has expired')
+        osf = self.server.fake.osf
+        entry_id = path[len(STORAGE_PREFIX):].strip('/')
+        with osf.lock:
+            data = osf.file_data(entry_id)
+            etag = osf.etag(entry_id)
+        self.__send_data(data, {'ETag': etag})
+
+    def __accounts(self, path, params):
+        """ Handles the OAuth2 endpoints. The authorization page redirects
+        right away, with the token of the server. """
+        self.__read_body(throttle=False)
+        if path == ACCOUNTS_PREFIX + 'oauth2/authorize':
+            redirect_uri = params.get('redirect_uri', [''])[0]
+            if not redirect_uri:
+                raise FakeServerError(400, 'Missing redirect_uri')
+            fragment = 'access_token={}&token_type=Bearer&expires_in={}' \
+                '&scope={}&state={}'.format(
+                    self.server.fake.token or 'fake-token', SIGNED_URL_TTL,
+                    '+'.join(params.get('scope', [''])[0].split()),
+                    params.get('state', [''])[0])
+            self.__respond(302, headers={
+                'Location': redirect_uri + '#' + fragment})
+        elif path == ACCOUNTS_PREFIX + 'oauth2/revoke':
+            self.__respond(204)
+        else:
+            raise KeyError(path)
+
+    def __plain(self, path, query):
+        """ Handles a request for any other path: the documents, listings and
+        redirects that were added, and plain uploads and downloads. """
+        if path in self.server.redirects:
+            self.__read_body(throttle=False)
+            status, location = self.server.redirects[path]
+            self.__respond(status, headers={'Location': location})
+        elif self.command in ['GET', 'HEAD']:
+            if path in self.server.documents:
+                self.__respond_json(200, self.server.documents[path])
+            elif path in self.server.listings:
+                items, page_size = self.server.listings[path]
+                params = parse_qs(query, keep_blank_values=True)
+                params.setdefault('page[size]', [str(page_size)])
+                self.__respond_json(200, self.__page(items, path, params))
+            elif path in self.server.files:
+                self.__send_data(self.server.files[path])
+            else:
+                raise KeyError(path)
+        elif self.command == 'PUT' and path.startswith(SESSION_PREFIX):
+            self.__put_chunk(path[len(SESSION_PREFIX):])
+        elif self.command == 'PUT' and \
+                not self.headers.get('X-Upload-Content-Length') is None:
+            self.__start_session(path)
+        elif self.command == 'PUT':
+            with self.server.lock:
+                self.server.files[path] = self.__read_body()
+            self.__respond_json(201, self.__file_response(path))
+        elif self.command == 'DELETE':
+            with self.server.lock:
+                del self.server.files[path]
+            self.__respond(204)
+        else:
+            self.__read_body(throttle=False)
+            raise FakeServerError(405, 'Method not allowed')
+
+    # Resumable uploads
+
+    def __start_session(self, target):
+        """ Starts a resumable upload session for the file at target, which is
+        the path of a plain upload, or the WaterButler url of an upload with
+        its parameters. """
+        self.__read_body()
+        session_id = uuid.uuid4().hex
+        with self.server.lock:
+            self.server.sessions[session_id] = {
+                'path': target,
+                'size': int(self.headers.get('X-Upload-Content-Length')),
+                'data': bytearray(),
+            }
+        location = '{}{}{}'.format(self.server.fake.base_url, SESSION_PREFIX,
+                                   session_id)
+        self.__respond(200, headers={'Location': location})
+
+    def __store_upload(self, target, data):
+        """ Stores the data of a completed upload session. Returns the status
+        and the document to respond with. """
+        path, _, query = target.partition('?')
+        if not path.startswith(WATERBUTLER_PREFIX):
+            self.server.files[path] = data
+            return 201, self.__file_response(path)
+        parts = path[len(WATERBUTLER_PREFIX):].split('/', 3)
+        osf = self.server.fake.osf
+        with osf.lock:
+            entry_id = (parts[3] if len(parts) == 4 else '').strip('/') or \
+                osf.nodes[parts[0]]['root']
+        return osf.put(parts[0], entry_id, parse_qs(query), data)
+
+    def __put_chunk(self, session_id):
+        """ Receives a chunk for, or the status request of, an upload session. """
+        body = self.__read_body()
+        session = self.server.sessions.get(session_id)
+        if session is None:
+            self.__respond_json(404, {'errors': [{'detail':
+                                                  'Unknown upload session'}]})
+            return
+
+        content_range = self.headers.get('Content-Range') or ''
+        match = re.match(r'bytes (\d+)-(\d+)/(\d+)', content_range)
+        with self.server.lock:
+            if match:
+                first, last, total = [int(v) for v in match.groups()]
+                received = len(session['data'])
+                if total != session['size'] or first > received or \
+                        last - first + 1 != len(body):
+                    self.__respond_json(400, {'errors': [{'detail':
+                                                          'Invalid chunk'}]})
+                    return
+                # Chunks that overlap with data that was already received are
+                # accepted, which makes retries of a chunk harmless.
+                session['data'][first:] = body
+            elif not content_range.startswith('bytes */'):
+                self.__respond_json(400, {'errors': [{'detail':
+                                                      'Missing Content-Range'}]})
+                return
+
+            # A status request for an empty file completes it, because there
+            # are no bytes to send (see transfers.ChunkedUpload)
+            received = len(session['data'])
+            if received >= session['size']:
+                del self.server.sessions[session_id]
+                result = self.__store_upload(session['path'],
+                                             bytes(session['data']))
+            else:
+                result = None
+
+        if not result is None:
+            self.__respond_json(*result)
+        elif received:
+            self.__respond(308, headers={
+                'Range': 'bytes=0-{}'.format(received - 1)})
+        else:
+            self.__respond(308)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeServer(object):
+    """ Runs the stand-in server in a background thread. The attributes that
+    control its behavior (token, latency, bandwidth, failure_rate,
+    failure_status, rate_limit, redirect_downloads and page_size) can be
+    changed while it is running. """
+
+    def __init__(self, host='127.0.0.1', port=0, token=None, latency=0.0,
+                 bandwidth=None, failure_rate=0.0, failure_status=503,
+                 rate_limit=None, redirect_downloads=False,
+                 page_size=DEFAULT_PAGE_SIZE):
+        """ Constructor
+
+        Parameters
+        ----------
+        host : str (default: '127.0.0.1')
+                The address to listen on.
+        port : int (default: 0)
+                The port to listen on. If 0, a free port is picked.
+        token : str (default: None)
+                The OAuth2 token that requests should carry. If None, no token
+                is required.
+        latency : float (default: 0.0)
+                The number of seconds to wait before handling each request.
+        bandwidth : int (default: None)
+                The maximum number of bytes per second that is sent or received
+                per connection. If None, there is no limit.
+        failure_rate : float (default: 0.0)
+                The fraction of requests that fails with failure_status.
+        failure_status : int (default: 503)
+                The status of the failures of failure_rate. If None, the
+                connection is closed without a response.
+        rate_limit : int (default: None)
+                The maximum number of requests per second. Requests above it
+                are refused with 429 Too Many Requests and a Retry-After
+                header. If None, there is no limit.
+        redirect_downloads : bool (default: False)
+                Redirect downloads from WaterButler to a signed storage url
+                that expires, as many storage providers do.
+        page_size : int (default: 10)
+                The number of items per page of a listing if page[size] is not
+                specified.
+        """
+        self.httpd = ThreadingHTTPServer((host, port), FakeRequestHandler)
+        self.httpd.fake = self
+        self.httpd.files = {}
+        self.httpd.sessions = {}
+        self.httpd.documents = {}
+        self.httpd.listings = {}
+        self.httpd.redirects = {}
+        self.httpd.lock = threading.RLock()
+        self.thread = None
+        self.osf = FakeOSF(self.base_url)
+        self.token = token
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.rate_limit = rate_limit
+        self.redirect_downloads = redirect_downloads
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._failures = []
+        self._recent = collections.deque()
+        self._log = []
+        self._previous_settings = None
+
+    def __enter__(self):
+        """ Starts the server and applies its settings (see
+        apply_settings()). """
+        self.start()
+        self._previous_settings = self.apply_settings()
+        return self
+
+    def __exit__(self, *exc_info):
+        """ Restores the settings and stops the server, also if an exception
+        occurred. """
+        try:
+            self.restore_settings(self._previous_settings)
+            self._previous_settings = None
+        finally:
+            self.stop()
+        return False
+
+    # Used by the request handler
+
+    def _record(self, method, path):
+        """ Adds a request to the log. """
+        with self._lock:
+            self._log.append((method, path))
+
+    def _failure(self, path):
+        """ Returns the status and Retry-After of the failure to inject for a
+        request to path, or None if it should be handled normally. """
+        with self._lock:
+            for failure in self._failures:
+                if failure['match'] is None or \
+                        re.search(failure['match'], path):
+                    failure['count'] -= 1
+                    if failure['count'] <= 0:
+                        self._failures.remove(failure)
+                    return failure['status'], failure['retry_after']
+            if self.rate_limit:
+                now = time.time()
+                while self._recent and self._recent[0] < now - 1:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rate_limit:
+                    return 429, 1
+                self._recent.append(now)
+        if self.failure_rate and random.random() < self.failure_rate:
+            return self.failure_status, None
+        return None
+
+    # Public functions
+
+    @property
+    def files(self):
+        """ The files that were uploaded to paths outside the OSF endpoints, as
+        a dict of path: contents. """
+        return self.httpd.files
+
+    @property
+    def requests(self):
+        """ The requests that were received, as (method, path) tuples. """
+        with self._lock:
+            return list(self._log)
+
+    def clear_requests(self):
+        """ Empties the log of received requests. """
+        with self._lock:
+            del self._log[:]
+
+    def fail_next(self, count=1, status=503, retry_after=None, match=None):
+        """ Makes the next requests fail, regardless of failure_rate.
+
+        Parameters
+        ----------
+        count : int (default: 1)
+                The number of requests to fail.
+        status : int (default: 503)
+                The status to respond with, e.g. 401, 429 or 500. If None, the
+                connection is closed without a response.
+        retry_after : int (default: None)
+                The value of the Retry-After header, in seconds.
+        match : str (default: None)
+                A regular expression; only requests whose path matches it fail.
+        """
+        with self._lock:
+            self._failures.append({'count': count, 'status': status,
+                                   'retry_after': retry_after, 'match': match})
+
+    @property
+    def base_url(self):
+        """ The url of the server. """
+        host, port = self.httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def url(self, path):
+        """ Returns the url for a path on the server. """
+        return self.base_url + '/' + path.lstrip('/')
+
+    def settings(self):
+        """ Returns the urls of the server, in the format of the settings of
+        the connection module. """
+        return {
+            'base_url': self.base_url + ACCOUNTS_PREFIX,
+            'api_base_url': self.base_url + API_PREFIX,
+            'files_url': self.base_url + '/',
+            'website_url': self.base_url + WEBSITE_PREFIX.rstrip('/'),
+        }
+
+    def apply_settings(self):
+        """ Points the connection module at the server, so that the
+        ConnectionManager and the widgets use it instead of the OSF. Should be
+        called before the ConnectionManager is created.
+
+        For tests only: the server uses plain http, so this also sets
+        OAUTHLIB_INSECURE_TRANSPORT, which turns off the HTTPS check of
+        requests_oauthlib for every session in the process until
+        restore_settings() is called. Using the server as a context manager
+        makes sure that happens.
+
+        Returns
+        -------
+        dict
+                The previous settings, which can be passed to
+                restore_settings().
+        """
+        import QOpenScienceFramework.connection as osf
+        previous = osf.set_server_urls(**self.settings())
+        # The server uses plain http, for which requests_oauthlib raises an
+        # InsecureTransportError unless this variable is set
+        previous[INSECURE_TRANSPORT] = os.environ.get(INSECURE_TRANSPORT)
+        os.environ[INSECURE_TRANSPORT] = '1'
+        return previous
+
+    def restore_settings(self, previous):
+        """ Points the connection module back at the servers it used before
+        apply_settings() was called.
+
+        Parameters
+        ----------
+        previous : dict
+                The settings that were returned by apply_settings(). If None,
+                only OAUTHLIB_INSECURE_TRANSPORT is removed again.
+        """
+        import QOpenScienceFramework.connection as osf
+        previous = dict(previous or {})
+        # Undone first, so that it does not stay in effect if the urls can
+        # not be restored
+        insecure_transport = previous.pop(INSECURE_TRANSPORT, None)
+        if insecure_transport is None:
+            os.environ.pop(INSECURE_TRANSPORT, None)
+        else:
+            os.environ[INSECURE_TRANSPORT] = insecure_transport
+        if previous:
+            osf.set_server_urls(**previous)
+
+    def populate_demo(self, projects=2, folders=2, files=5, size=1024):
+        """ Adds projects with components, linked nodes, folders and files.
+
+        Parameters
+        ----------
+        projects : int (default: 2)
+                The number of projects. Each has a component, and each project
+                after the first links to the first.
+        folders : int (default: 2)
+                The number of folders in each project.
+        files : int (default: 5)
+                The number of files in the root of each project and in each of
+                its folders.
+        size : int (default: 1024)
+                The size of the files in bytes.
+        """
+        osf = self.osf
+        first = None
+        for p in range(projects):
+            project = osf.add_project('Project {}'.format(p + 1),
+                                      public=p % 2 == 0)
+            component = osf.add_project('Data of project {}'.format(p + 1),
+                                        category='data', parent=project)
+            osf.add_file(component, 'readme.txt', b'Component data\n')
+            if first is None:
+                first = project
+            else:
+                osf.link_nodes(project, first)
+            parents = [None] + [osf.add_folder(project, 'folder{}'.format(f))
+                                for f in range(folders)]
+            for parent in parents:
+                for f in range(files):
+                    osf.add_file(project, 'file{}.bin'.format(f),
+                                 bytes(bytearray(random.getrandbits(8)
+                                                 for _ in range(size))),
+                                 parent)
+
+    def add_document(self, path, data):
+        """ Serves a JSON document at a path, e.g. the data of a user.
+
+        Parameters
+        ----------
+        path : str
+                The path to serve the document at.
+        data : dict
+                The document.
+        """
+        self.httpd.documents['/' + path.lstrip('/')] = data
+
+    def add_listing(self, path, items, page_size=10):
+        """ Serves a paginated listing at a path, like the listings of the OSF
+        API: each page contains the items under 'data', and the url of the next
+        page in 'links'. The page[size] and page parameters are supported.
+
+        Parameters
+        ----------
+        path : str
+                The path to serve the listing at.
+        items : list
+                The items of the listing.
+        page_size : int (default: 10)
+                The number of items per page if page[size] is not specified.
+        """
+        self.httpd.listings['/' + path.lstrip('/')] = (list(items), page_size)
+
+    def add_redirect(self, path, location, status=302):
+        """ Redirects requests for a path, with any method, to another url.
+
+        Parameters
+        ----------
+        path : str
+                The path to redirect.
+        location : str
+                The url or path to redirect to. A path is made absolute with the
+                url of the server.
+        status : int (default: 302)
+                The status of the redirect, e.g. 301, 303, 307 or 308.
+        """
+        if location.startswith('/'):
+            location = self.url(location)
+        self.httpd.redirects['/' + path.lstrip('/')] = (status, location)
+
+    def start(self):
+        """ Starts serving in a background thread. """
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """ Stops the server. """
+        # shutdown() waits for serve_forever() to return, so it would block if
+        # the server was never started
+        if not self.thread is None:
+            self.httpd.shutdown()
+            self.thread.join()
+            self.thread = None
+        self.httpd.server_close()
+
+    def serve_forever(self):
+        """ Serves in the current thread until interrupted. """
+        try:
+            self.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Local stand-in server for the OSF')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--token', default=None,
+                        help='The OAuth2 token that requests should carry')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds to wait before handling each request')
+    parser.add_argument('--bandwidth', type=int, default=None,
+                        help='Bytes per second per connection')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='Fraction of requests that fail')
+    parser.add_argument('--failure-status', type=int, default=503)
+    parser.add_argument('--rate-limit', type=int, default=None,
+                        help='Requests per second before responding with 429')
+    parser.add_argument('--redirect-downloads', action='store_true',
+                        help='Redirect downloads to signed storage urls')
+    parser.add_argument('--demo', action='store_true',
+                        help='Add projects, folders and files to serve')
+    args = parser.parse_args()
+    server = FakeServer(args.host, args.port, token=args.token,
+                        latency=args.latency, bandwidth=args.bandwidth,
+                        failure_rate=args.failure_rate,
+                        failure_status=args.failure_status,
+                        rate_limit=args.rate_limit,
+                        redirect_downloads=args.redirect_downloads)
+    if args.demo:
+        server.populate_demo()
+    print('Serving on {}'.format(server.base_url))
+    print('Settings: {}'.format(json.dumps(server.settings(), indent=1)))
+    # Clients in another process need this for OAuth2 over plain http (see
+    # FakeServer.apply_settings())
+    print('Clients need {}=1 in their environment'.format(INSECURE_TRANSPORT))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -6,13 +6,26 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 from QOpenScienceFramework.widgets import LoginWindow
 from QOpenScienceFramework.compat import *
 from QOpenScienceFramework import events
+from QOpenScienceFramework.cache import APIDiskCache, BufferedReply, MemoryCache, \
+    RedirectCache, url_tags, REDIRECT_STATUSES
+from QOpenScienceFramework.retry import RetryPolicy
+from QOpenScienceFramework.scheduler import ReplyHandle, ReplyWatchdog, \
+    RequestScheduler, request_priorities, INTERACTIVE, BULK
+from QOpenScienceFramework.throttle import ThrottledDevice, \
+    ThrottledReader, TokenBucket
+from QOpenScienceFramework.transfers import ChunkedUpload, HashVerifier, \
+    FolderDownload, FolderUpload, LocalHashCache, PartialDownload, \
+    SegmentedDownload, TransferRate, WriteBuffer
 import QOpenScienceFramework.connection as osf
 from qtpy import QtCore, QtGui, QtNetwork, QtWidgets
 
+import hashlib
+import humanize
 import json
 # Import basics
 import logging
 import os
+import tempfile
 import time
 # UUID generation
 import uuid
@@ -38,6 +51,44 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
 
     # The maximum number of allowed redirects
     MAX_REDIRECTS = 5
+    # The default maximum size of the disk cache for API responses in bytes
+    DISK_CACHE_SIZE = 50*1024**2
+    # The default number of seconds the results of the convenience functions
+    # (get_user_projects, etc.) are kept in memory, and the default maximum
+    # number of results to keep.
+    MEMORY_CACHE_TTL = 30
+    MEMORY_CACHE_ENTRIES = 256
+    # The default maximum number of seconds the url that a download was
+    # redirected to is reused (see cache.RedirectCache), and the maximum
+    # number of urls to remember
+    REDIRECT_CACHE_TTL = 600
+    REDIRECT_CACHE_ENTRIES = 1024
+    # The priority class of requests for which none is specified
+    DEFAULT_PRIORITY = INTERACTIVE
+    # The default number of connections per host that are opened before they
+    # are needed, and the number of seconds after which they are opened again
+    # while the user is logged in. Qt closes connections that have been idle
+    # for two minutes.
+    PREWARM_CONNECTIONS = 4
+    KEEP_WARM_INTERVAL = 90
+    # The default maximum number of bytes a reply of a streamed download keeps
+    # in memory. Qt stops reading from the network when this amount of data
+    # is waiting to be written.
+    READ_BUFFER_SIZE = 1024**2
+    # The minimum number of seconds between updates of the transfer rate shown
+    # in a progress dialog
+    RATE_LABEL_INTERVAL = 0.5
+    # The default number of seconds a request to the OSF API may take as a
+    # whole. Other requests, such as downloads and previews of files, have no
+    # deadline by default, as their duration depends on their size; they are
+    # aborted by the idle timeout if they stall.
+    REQUEST_TIMEOUT = 60
+    # The default number of seconds during which no data is sent or received,
+    # after which a request is aborted
+    IDLE_TIMEOUT = 30
+    # The default number of seconds to wait for a response after the body of
+    # an upload has been sent, during which the server stores the file
+    PROCESSING_TIMEOUT = 300
     error_message = QtCore.Signal('QString', 'QString')
     """PyQt signal to send an error message."""
     warning_message = QtCore.Signal('QString', 'QString')
@@ -64,14 +115,132 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
 
                 If ``None`` is passed, then a events.Notifier object is
                 created which simply displays all messages in QDialog boxes
+        cache_dir : str (default: None)
+                The folder in which responses of the OSF API are cached between
+                sessions. Cached responses are revalidated with the OSF on every
+                request, and their contents are only reused if they have not
+                changed. If ``None`` is passed, no responses are cached.
+        cache_size : int (default: ConnectionManager.DISK_CACHE_SIZE)
+                The maximum size of the disk cache in bytes. If the cache grows
+                beyond this size, the least recently used responses are removed.
+        memory_cache_ttl : float (default: ConnectionManager.MEMORY_CACHE_TTL)
+                The number of seconds the results of get_logged_in_user,
+                get_user_projects, get_project_repos, get_repo_files and
+                get_file_info are kept in memory. Results for a node or folder
+                are removed earlier if a PUT, POST or DELETE request is made
+                for it. Pass 0 to disable this cache.
+        memory_cache_entries : int (default: ConnectionManager.MEMORY_CACHE_ENTRIES)
+                The maximum number of results kept in memory.
+        redirect_cache_ttl : float (default: ConnectionManager.REDIRECT_CACHE_TTL)
+                The maximum number of seconds that the url a file was redirected
+                to is requested directly, for GET requests that specify the
+                fileVersion keyword. Signed urls are not used beyond their
+                expiry. Pass 0 to always request the original url.
+        request_limits : dict (default: None)
+                The maximum number of simultaneous requests per priority class
+                ('interactive', 'tree', 'prefetch' and 'bulk'). Classes that
+                are not specified use the limits in
+                scheduler.RequestScheduler.DEFAULT_LIMITS.
+        host_connection_limit : int (default: None)
+                The maximum number of simultaneous requests, and thus
+                connections, per host. If ``None`` is passed,
+                scheduler.RequestScheduler.DEFAULT_HOST_LIMIT is used. Qt
+                opens no more than six connections per host.
+        prewarm_hosts : list (default: None)
+                The urls of the hosts to which connections are opened (including
+                the TLS handshake) as soon as a user logs in, so that the first
+                requests do not have to wait for them. If ``None`` is passed,
+                the OSF API and WaterButler are used. Call prewarm() to open the
+                connections earlier.
+        prewarm_connections : int (default: ConnectionManager.PREWARM_CONNECTIONS)
+                The number of connections to open to each of these hosts. Pass
+                0 to not open connections ahead of time.
+        keep_warm_interval : float (default: ConnectionManager.KEEP_WARM_INTERVAL)
+                The number of seconds after which the connections are opened
+                again while a user is logged in, in case they were closed for
+                being idle. If ``None`` is passed, this is not done.
+        read_buffer_size : int (default: ConnectionManager.READ_BUFFER_SIZE)
+                The maximum number of bytes that are buffered in memory for a
+                download that is streamed to a file.
+        upload_state_dir : str (default: None)
+                The folder in which the state of chunked uploads is stored, so
+                they can be resumed after an interruption. If ``None`` is passed,
+                a folder in the application data folder of the user is used
+                (see QtCore.QStandardPaths.AppDataLocation).
+        download_limit : float (default: None)
+                The maximum number of bytes per second that all downloads
+                together may receive. If ``None`` is passed, downloads are not
+                limited. See set_bandwidth_limit() for more specific limits.
+        upload_limit : float (default: None)
+                The maximum number of bytes per second that all uploads together
+                may send. If ``None`` is passed, uploads are not limited.
+        retry_policy : retry.RetryPolicy (default: RetryPolicy())
+                Determines which failed requests are repeated, how often, and
+                after which delay. If ``None`` is passed, requests are not
+                repeated. Can be overridden per request with the retryPolicy
+                keyword of get(), put(), post() and delete().
+        request_timeout : float (default: ConnectionManager.REQUEST_TIMEOUT)
+                The number of seconds after which a request to the OSF API that
+                has not finished is aborted. Does not apply to other requests,
+                such as downloads and uploads of files. If ``None`` is passed,
+                requests have no deadline. Can be overridden per request with
+                the timeout keyword of get(), put(), post() and delete().
+        idle_timeout : float (default: ConnectionManager.IDLE_TIMEOUT)
+                The number of seconds after which a request during which no
+                data was sent or received is aborted. If ``None`` is passed,
+                requests have no idle timeout. Can be overridden per request
+                with the idleTimeout keyword.
+        processing_timeout : float (default: ConnectionManager.PROCESSING_TIMEOUT)
+                The number of seconds to wait for the response to an upload
+                after all of its data has been sent.
+        hash_cache_file : str (default: None)
+                The JSON file in which the hashes of local files are kept, so
+                that download_file(..., skip_identical=True) does not need to
+                hash files that did not change since the previous check. If
+                ``None`` is passed, the file is stored in cache_dir, or in the
+                application data folder of the user if no cache_dir is
+                specified.
         """
         # See if tokenfile and notifier are specified as keyword args
         tokenfile = kwargs.pop("tokenfile", "token.json")
         notifier = kwargs.pop("notifier", None)
+        cache_dir = kwargs.pop("cache_dir", None)
+        cache_size = kwargs.pop("cache_size", self.DISK_CACHE_SIZE)
+        memory_cache_ttl = kwargs.pop("memory_cache_ttl", self.MEMORY_CACHE_TTL)
+        memory_cache_entries = kwargs.pop("memory_cache_entries",
+                                          self.MEMORY_CACHE_ENTRIES)
+        redirect_cache_ttl = kwargs.pop("redirect_cache_ttl",
+                                        self.REDIRECT_CACHE_TTL)
+        request_limits = kwargs.pop("request_limits", None)
+        host_connection_limit = kwargs.pop("host_connection_limit", None)
+        prewarm_hosts = kwargs.pop("prewarm_hosts", None)
+        prewarm_connections = kwargs.pop("prewarm_connections",
+                                         self.PREWARM_CONNECTIONS)
+        keep_warm_interval = kwargs.pop("keep_warm_interval",
+                                        self.KEEP_WARM_INTERVAL)
+        upload_state_dir = kwargs.pop("upload_state_dir", None)
+        read_buffer_size = kwargs.pop("read_buffer_size", self.READ_BUFFER_SIZE)
+        hash_cache_file = kwargs.pop("hash_cache_file", None)
+        download_limit = kwargs.pop("download_limit", None)
+        upload_limit = kwargs.pop("upload_limit", None)
+        retry_policy = kwargs.pop("retry_policy", RetryPolicy())
+        request_timeout = kwargs.pop("request_timeout", self.REQUEST_TIMEOUT)
+        idle_timeout = kwargs.pop("idle_timeout", self.IDLE_TIMEOUT)
+        processing_timeout = kwargs.pop("processing_timeout",
+                                        self.PROCESSING_TIMEOUT)
 
         # Call parent's constructor
         super(ConnectionManager, self).__init__(*args, **kwargs)
         self.tokenfile = tokenfile
+        if upload_state_dir is None:
+            upload_state_dir = os.path.join(self.__user_data_dir(),
+                                            'QOpenScienceFramework', 'uploads')
+        self.upload_state_dir = upload_state_dir
+        self.read_buffer_size = read_buffer_size
+        self.retry_policy = retry_policy
+        self.request_timeout = request_timeout
+        self.idle_timeout = idle_timeout
+        self.processing_timeout = processing_timeout
         self.dispatcher = events.EventDispatcher()
 
         # Notifications
@@ -120,6 +289,64 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         # mid-request it is discovered that the OAuth2 token is no longer valid.
         self.pending_requests = {}
 
+        # GET requests that are underway, by (priority class, url). Each value
+        # is the list of callers that asked for the same url while the request
+        # was in progress, and which receive a copy of its result.
+        self._inflight = {}
+
+        # Optional disk cache for the responses of the OSF API
+        self.disk_cache = None
+        if cache_dir:
+            self.disk_cache = APIDiskCache(cache_dir, cache_size, self)
+            self.setCache(self.disk_cache)
+
+        # Short-lived cache for the results of the convenience functions
+        self.memory_cache = MemoryCache(memory_cache_ttl, memory_cache_entries)
+
+        # The storage locations that downloads were redirected to
+        self.redirect_cache = RedirectCache(redirect_cache_ttl,
+                                            self.REDIRECT_CACHE_ENTRIES)
+
+        # Limits the number of simultaneous requests per priority class
+        self.scheduler = RequestScheduler(request_limits,
+                                          host_connection_limit, self)
+
+        # Connections that are opened before they are needed
+        if prewarm_hosts is None:
+            prewarm_hosts = [osf.api_base_url, osf.files_url]
+        self.prewarm_hosts = prewarm_hosts
+        self.prewarm_connections = prewarm_connections
+        self.keep_warm_timer = QtCore.QTimer(self)
+        self.keep_warm_timer.timeout.connect(self.prewarm)
+        if keep_warm_interval:
+            self.keep_warm_timer.setInterval(int(keep_warm_interval * 1000))
+
+        # The number of requests per host, and how many of them needed a new
+        # (encrypted) connection. Replies for which Qt performed a TLS
+        # handshake emit the encrypted signal.
+        self.connection_stats = {}
+        if hasattr(self, 'encrypted'):
+            self.encrypted.connect(self.__connection_encrypted)
+
+        # The hashes of local files, to detect files that do not need to be
+        # downloaded again
+        if hash_cache_file is None:
+            if cache_dir:
+                hash_cache_file = os.path.join(
+                    cache_dir, 'QOpenScienceFramework-hashes.json')
+            else:
+                hash_cache_file = os.path.join(
+                    self.__user_data_dir(), 'QOpenScienceFramework',
+                    'hashes.json')
+        self.hash_cache = LocalHashCache(hash_cache_file, self)
+
+        # The token buckets that limit the bandwidth of transfers, by
+        # (direction, priority class). The buckets for a priority of None apply
+        # to all transfers.
+        self.bandwidth_limits = {}
+        self.set_bandwidth_limit('download', download_limit)
+        self.set_bandwidth_limit('upload', upload_limit)
+
     # properties
     @property
     def progress_icon(self):
@@ -134,6 +361,14 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
 
     # Private functions
 
+    def __user_data_dir(self):
+        """ Returns the folder in which state that should survive a restart of
+        the application is kept by default. Unlike the temporary directory, it
+        is not shared with the other users of the system. """
+        location = QtCore.QStandardPaths.writableLocation(
+            QtCore.QStandardPaths.AppDataLocation)
+        return location or tempfile.gettempdir()
+
     def __logout_succeeded(self, data, *args):
         """ Callback for logout().
         Called when logout has succeeded. This function
@@ -243,6 +478,86 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
             return func(inst, *args, **kwargs)
         return func_wrapper
 
+    def cancel_requests(self, priority=None):
+        """ Cancels the requests of a priority class. Requests that are
+        still waiting to be sent are removed from the queue, and requests that
+        are underway are aborted. In both cases the error callback of the
+        request is called.
+
+        Parameters
+        ----------
+        priority : str (default: None)
+                The priority class to cancel ('interactive', 'tree', 'prefetch'
+                or 'bulk'). If None, all requests are cancelled.
+        """
+        self.scheduler.cancel(priority)
+
+    def prewarm(self, hosts=None, connections=None):
+        """ Opens connections to hosts before any requests are made to them, so
+        that later requests do not need to wait for the DNS lookup, the TCP
+        connection and the TLS handshake. Connections that are already open
+        are reused. Does nothing with Qt versions that do not support this
+        (before 5.2).
+
+        Parameters
+        ----------
+        hosts : list (default: None)
+                The urls of the hosts. If None, the prewarm_hosts that were
+                passed to the constructor are used.
+        connections : int (default: None)
+                The number of connections to open per host. If None, the
+                prewarm_connections that were passed to the constructor are
+                used. Never more than the per-host limit of the scheduler.
+        """
+        if not hasattr(self, 'connectToHostEncrypted'):
+            return
+        if hosts is None:
+            hosts = self.prewarm_hosts
+        if connections is None:
+            connections = self.prewarm_connections
+        connections = min(connections, self.scheduler.host_limit)
+        for host_url in hosts:
+            url = QtCore.QUrl(host_url)
+            if not url.host():
+                continue
+            stats = self.__host_stats(url.host())
+            for _ in range(connections):
+                if url.scheme() == 'https':
+                    self.connectToHostEncrypted(url.host(), url.port(443))
+                else:
+                    self.connectToHost(url.host(), url.port(80))
+                stats['prewarmed'] += 1
+        logger.debug("Prewarmed {} connection(s) to {}".format(
+            connections, ', '.join(hosts)))
+
+    def set_bandwidth_limit(self, direction, limit, priority=None):
+        """ Sets the maximum bandwidth for downloads or uploads. A transfer is
+        subject to the limit for all transfers, the limit for its priority
+        class, and the limit for the transfer itself (see the bandwidth_limit
+        keyword of download_file() and upload_file()), whichever is the
+        lowest. Downloads are only limited if their data is streamed, as is
+        the case for download_file().
+
+        Parameters
+        ----------
+        direction : {'download', 'upload'}
+                The direction of the transfers to limit
+        limit : float
+                The maximum number of bytes per second. Pass ``None`` or 0 to
+                remove the limit.
+        priority : str (default: None)
+                The priority class to limit, e.g. 'bulk'. If ``None``, the
+                limit applies to all transfers together.
+        """
+        if not direction in ['download', 'upload']:
+            raise ValueError("direction should be 'download' or 'upload'")
+        if not priority is None and not priority in self.scheduler.limits:
+            raise ValueError("Unknown priority class '{}'".format(priority))
+        if limit:
+            self.bandwidth_limits[(direction, priority)] = TokenBucket(limit)
+        else:
+            self.bandwidth_limits.pop((direction, priority), None)
+
     def clear_pending_requests(self):
         """ Resets the pending network requests that still need to be executed.
         Network requests
@@ -270,6 +585,54 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         else:
             return False
 
+    def __token_known_valid(self):
+        """ Checks if a transfer can be started right away, without first
+        checking the validity of the OAuth2 token with the OSF. This is the case
+        if the data of the logged in user is known, and the token has not
+        expired yet.
+
+        Returns
+        -------
+        bool
+                True if the user is known and the token has not expired
+        """
+        return bool(self.logged_in_user) and osf.token_valid()
+
+    def __stash_transfer_kwargs(self, kwargs):
+        """ Moves the keyword arguments for the requests of a transfer out of
+        the way of the get_logged_in_user() call that precedes it if the
+        OAuth2 token is not known to be valid. That request would otherwise use
+        them for itself, and remove them before its callback starts the
+        transfer. The errorCallback is also left in place, so that it is
+        called if the user data can not be retrieved.
+
+        Parameters
+        ----------
+        kwargs : dict
+                The keyword arguments of the transfer
+
+        Returns
+        -------
+        dict
+                kwargs, with the keyword arguments of the requests stored under
+                _transfer_kwargs
+        """
+        stash = {}
+        for key in ['errorCallback', 'abortSignal', 'downloadProgress',
+                    'uploadProgress', 'readyRead', 'rawHeaders', 'fileVersion',
+                    'retryPolicy', 'timeout', 'idleTimeout']:
+            if key in kwargs:
+                stash[key] = kwargs.pop(key)
+        kwargs['_transfer_kwargs'] = stash
+        if 'errorCallback' in stash:
+            kwargs['errorCallback'] = stash['errorCallback']
+        return kwargs
+
+    def __restore_transfer_kwargs(self, kwargs):
+        """ Puts back the keyword arguments that were set aside by
+        __stash_transfer_kwargs(). """
+        kwargs.update(kwargs.pop('_transfer_kwargs', None) or {})
+
     # Basic HTTP Functions
     def __check_request_parameters(self, url, callback):
         """ Check if the supplied url is of the correct type and if the callback
@@ -301,6 +664,288 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
             raise TypeError("callback should be a function or callable.")
         return url
 
+    def __add_raw_headers(self, request, kwargs):
+        """ Adds the headers in the rawHeaders keyword argument (if any) to a
+        request. """
+        for name, value in (kwargs.get('rawHeaders') or {}).items():
+            request.setRawHeader(safe_encode(name), safe_encode(value))
+
+    def __pop_request_kwargs(self, kwargs):
+        """ Removes the keyword arguments that are only used internally for
+        performing a request, before the remaining ones are passed on to a
+        callback. """
+        kwargs.pop('redirect_count', None)
+        kwargs.pop('downloadProgress', None)
+        kwargs.pop('uploadProgress', None)
+        kwargs.pop('readyRead', None)
+        kwargs.pop('errorCallback', None)
+        kwargs.pop('abortSignal', None)
+        kwargs.pop('_cache_key', None)
+        kwargs.pop('_coalesce_key', None)
+        kwargs.pop('_followers', None)
+        kwargs.pop('_reply_handle', None)
+        kwargs.pop('priority', None)
+        kwargs.pop('rawHeaders', None)
+        kwargs.pop('_bucket', None)
+        kwargs.pop('retryPolicy', None)
+        kwargs.pop('_resubmit', None)
+        kwargs.pop('_retry_count', None)
+        kwargs.pop('timeout', None)
+        kwargs.pop('idleTimeout', None)
+        kwargs.pop('fileVersion', None)
+        kwargs.pop('_redirect', None)
+        kwargs.pop('_redirect_key', None)
+        kwargs.pop('_redirect_cached', None)
+        kwargs.pop('notify', None)
+
+    def __host_stats(self, host):
+        """ Returns the connection statistics of a host (see
+        connection_stats). """
+        return self.connection_stats.setdefault(host, {
+            'requests': 0,
+            'new_connections': 0,
+            'reused_connections': 0,
+            'prewarmed': 0,
+        })
+
+    def __connection_encrypted(self, reply):
+        """ Marks a reply for which a new encrypted connection was set up. """
+        reply.setProperty('newConnection', True)
+
+    def __record_connection(self, reply):
+        """ Counts a finished request in the connection statistics of its host,
+        as either using a new or a reused connection. """
+        url = reply.url()
+        if url.scheme() != 'https':
+            return
+        stats = self.__host_stats(url.host())
+        stats['requests'] += 1
+        if reply.property('newConnection'):
+            stats['new_connections'] += 1
+            logger.debug("{} used a new connection".format(
+                safe_decode(url.toString())))
+        else:
+            stats['reused_connections'] += 1
+
+    def __invalidate(self, url):
+        """ Evicts the cached information about the nodes, folders or files
+        that a url concerns, because it is about to be modified. """
+        tags = url_tags(url)
+        self.memory_cache.invalidate(tags)
+        self.redirect_cache.invalidate(tags)
+
+    def __buckets(self, direction, kwargs):
+        """ Returns the token buckets that limit the bandwidth of a request. """
+        buckets = []
+        for priority in [None, kwargs.get('priority')]:
+            bucket = self.bandwidth_limits.get((direction, priority))
+            if not bucket is None:
+                buckets.append(bucket)
+        if not kwargs.get('_bucket') is None:
+            buckets.append(kwargs['_bucket'])
+        return buckets
+
+    def __can_coalesce(self, kwargs):
+        """ Checks if a GET request with the passed keyword arguments can share
+        its result with other requests for the same url. This is not the case
+        for requests whose progress is tracked, which stream their data
+        somewhere, or which can be aborted. """
+        for key in ['downloadProgress', 'readyRead', 'progressDialog',
+                    'abortSignal', 'rawHeaders']:
+            if not kwargs.get(key) is None:
+                return False
+        # Redirects are part of a request that is already underway
+        return not kwargs.get('redirect_count')
+
+    def __finish_followers(self, reply, followers, data=None, error=None):
+        """ Delivers the result of a GET request to the callers that requested
+        the same url while the request was in progress.
+
+        Parameters
+        ----------
+        reply : QtNetwork.QNetworkReply or scheduler.ReplyHandle
+                The finished reply
+        followers : list
+                Tuples of (BufferedReply, callback, args, kwargs) with the reply
+                object that was returned to each caller, and the callback to
+                deliver it to.
+        data : bytes (default: None)
+                The body of the response, if it was successful.
+        error : tuple (default: None)
+                The error code and message to pass on, if the request failed
+                for another reason than the error of the reply itself.
+        """
+        if error is None and reply.error() != reply.NoError:
+            error = (reply.error(), reply.errorString())
+        for follower, callback, args, kwargs in followers:
+            request_id = kwargs.pop('_request_id', None)
+            if not error is None:
+                follower.set_error(*error)
+                # Requests that failed because the user needs to log in again
+                # are repeated after the login.
+                if error[0] != reply.AuthenticationRequiredError:
+                    self.pending_requests.pop(request_id, None)
+                errorCallback = kwargs.get('errorCallback', None)
+                if callable(errorCallback):
+                    self.__pop_request_kwargs(kwargs)
+                    errorCallback(follower, *args, **kwargs)
+            else:
+                self.pending_requests.pop(request_id, None)
+                follower.set_contents(data, reply.attribute(
+                    QtNetwork.QNetworkRequest.HttpStatusCodeAttribute))
+                self.__pop_request_kwargs(kwargs)
+                callback(follower, *args, **kwargs)
+            follower.deleteLater()
+
+    def __stop_coalescing(self, kwargs):
+        """ Prevents new GET requests from joining a request (see get()) that
+        is about to finish. """
+        coalesce_key = kwargs.pop('_coalesce_key', None)
+        if not coalesce_key is None:
+            self._inflight.pop(coalesce_key, None)
+
+    def __schedule(self, request, operation, send, callback, args, kwargs):
+        """ Hands a request over to the scheduler, which sends it as soon as
+        the limit of its priority class allows.
+
+        Parameters
+        ----------
+        request : QtNetwork.QNetworkRequest
+                The request to perform
+        operation : QtNetwork.QNetworkAccessManager.Operation
+                The HTTP operation of the request
+        send : callable
+                Function that sends the request and returns its QNetworkReply
+        callback : callable
+                The callback of the request
+        args : tuple
+                The positional arguments for the callback
+        kwargs : dict
+                The keyword arguments of the request. The handle of the request
+                is stored in it, so that it is reused for redirects.
+
+        Returns
+        -------
+        scheduler.ReplyHandle
+                The handle that represents the request
+        """
+        priority = kwargs.setdefault('priority', self.DEFAULT_PRIORITY)
+        request.setPriority(request_priorities.get(priority,
+                                                   request.NormalPriority))
+
+        handle = kwargs.get('_reply_handle')
+        if handle is None:
+            handle = ReplyHandle(request, operation, self.scheduler)
+            kwargs['_reply_handle'] = handle
+            # If provided, connect the abort signal and the cancel button of
+            # the progress dialog to the handle's abort() slot. The handle
+            # passes it on to the reply that currently handles the request.
+            abortSignal = kwargs.get('abortSignal', None)
+            if not abortSignal is None:
+                abortSignal.connect(handle.abort)
+            progressDialog = kwargs.get('progressDialog', None)
+            if isinstance(progressDialog, QtWidgets.QProgressDialog):
+                progressDialog.canceled.connect(handle.abort)
+
+        def cancel():
+            self.__request_cancelled(handle, callback, *args, **kwargs)
+
+        # Abort the request if it stalls. The timers start once the request
+        # is sent, so time spent waiting in the queue does not count.
+        timeout, idle_timeout = self.__timeouts(request, kwargs)
+
+        def send_watched():
+            reply = send()
+            ReplyWatchdog(reply, timeout, idle_timeout,
+                          self.processing_timeout)
+            return reply
+
+        # Used to repeat the request if it fails (see __retry()). The
+        # callbacks of the request receive a copy of its keyword arguments, so
+        # the ones that were updated for the next attempt are copied back.
+        host = request.url().host()
+
+        def resubmit(delay, updated_kwargs):
+            kwargs.update(updated_kwargs)
+            self.scheduler.submit_later(delay, priority, handle, send_watched,
+                                        cancel, host)
+        kwargs['_resubmit'] = resubmit
+
+        # Redirects continue a request that was already underway, so they
+        # should not have to wait behind requests that were made later.
+        self.scheduler.submit(priority, handle, send_watched, cancel,
+                              urgent=bool(kwargs.get('redirect_count')),
+                              host=host)
+        return handle
+
+    def __timeouts(self, request, kwargs):
+        """ Returns the deadline and the idle timeout in seconds for a request.
+        Only requests to the OSF API, of which the responses are small, have a
+        deadline unless one is passed explicitly. The duration of other
+        requests, such as downloads of files and their previews, depends on
+        the size of the file. """
+        url = safe_decode(request.url().toString())
+        if 'timeout' in kwargs:
+            timeout = kwargs['timeout']
+        elif url.startswith(osf.api_base_url):
+            timeout = self.request_timeout
+        else:
+            timeout = None
+        return timeout, kwargs.get('idleTimeout', self.idle_timeout)
+
+    def __request_cancelled(self, handle, callback, *args, **kwargs):
+        """ Called if a request is cancelled before it was sent. Notifies the
+        error callback just like for a request that was aborted while it was
+        underway. """
+        handle.set_error(handle.OperationCanceledError,
+                         _("Operation canceled"))
+        self.pending_requests.pop(kwargs.pop('_request_id', None), None)
+
+        coalesce_key = kwargs.pop('_coalesce_key', None)
+        if not coalesce_key is None:
+            self._inflight.pop(coalesce_key, None)
+        followers = kwargs.get('_followers') or []
+
+        self.__close_file_handles(*args, **kwargs)
+        errorCallback = kwargs.get('errorCallback', None)
+        if callable(errorCallback):
+            self.__pop_request_kwargs(kwargs)
+            errorCallback(handle, *args, **kwargs)
+        self.__finish_followers(handle, followers)
+
+    def __cached_get(self, url, tags, callback, *args, **kwargs):
+        """ Performs a GET request for url, unless a recent response for it
+        is still available in the memory cache.
+
+        Parameters
+        ----------
+        url : str
+                The API endpoint to retrieve
+        tags : iterable
+                The ids of the nodes, folders or files the response concerns,
+                with which the response is stored in the cache.
+        callback : callable
+                The function to call with the reply
+
+        Returns
+        -------
+        scheduler.ReplyHandle or cache.BufferedReply
+        """
+        data = self.memory_cache.get(url)
+        if data is None:
+            kwargs['_cache_key'] = (url, tags)
+            return self.get(url, callback, *args, **kwargs)
+
+        reply = BufferedReply(url, data)
+        # Deliver the result asynchronously, just like a network reply would
+        # be, so callers can finish their bookkeeping on the returned object.
+        def deliver():
+            self.__pop_request_kwargs(kwargs)
+            callback(reply, *args, **kwargs)
+            reply.deleteLater()
+        QtCore.QTimer.singleShot(0, deliver)
+        return reply
+
     @buffer_network_request
     def get(self, url, callback, *args, **kwargs):
         """ Performs a HTTP GET request.
@@ -334,6 +979,39 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         abortSignal : QtCore.Signal
                 This signal will be attached to the reply objects abort() slot, so that
                 the operation can be aborted from outside if necessary.
+        rawHeaders : dict (default: None)
+                Additional HTTP headers to send with the request (e.g. Range).
+                These are also sent with the requests for any redirects.
+        fileVersion : str (default: None)
+                The version of the file that url points to (see
+                cache.file_version()). If specified, the url that the request
+                is redirected to is remembered, and later requests for the same
+                version of the file go there directly, until that url expires.
+        priority : str (default: ConnectionManager.DEFAULT_PRIORITY)
+                The priority class of the request: 'interactive', 'tree',
+                'prefetch' or 'bulk'. If the maximum number of simultaneous
+                requests of the class has been reached, the request waits until
+                another request of the class has finished.
+        retryPolicy : retry.RetryPolicy (default: ConnectionManager.retry_policy)
+                Determines if the request is repeated if it fails because of a
+                temporary problem. Pass ``None`` to never repeat the request.
+                The number of times the request has been repeated is available
+                as the retry_count attribute of the reply that is passed to the
+                callbacks.
+        timeout : float (default: ConnectionManager.request_timeout)
+                The number of seconds after which the request is aborted if it
+                has not finished. Only requests to the OSF API have a deadline by
+                default; others are only subject to the idle timeout. A request
+                that times out fails with a TimeoutError, and may be repeated
+                by its retry policy.
+        idleTimeout : float (default: ConnectionManager.idle_timeout)
+                The number of seconds after which the request is aborted if no
+                data was received in the meantime.
+        notify : bool (default: True)
+                Show an error message (see the notifier keyword of the
+                constructor) if the request fails. Pass False if the caller
+                reports the error itself, for instance because it repeats
+                failed requests on its own.
         *args (optional)
                 Any other arguments that you want to have passed to the callback
         **kwargs (optional)
@@ -341,15 +1019,51 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
 
         Returns
         -------
-        QtNetwork.QNetworkReply
-                The reply object for the current request. Note that if a 301 or 302
-                redirect has occurred, a new reply object has been made for the redirect
-                and the one returned here is no longer valid.
+        scheduler.ReplyHandle or cache.BufferedReply
+                The handle for the current request, which forwards to the
+                QNetworkReply once the request has been sent. The same handle is
+                passed to the callback, also if one or more redirects have
+                occurred. If a request for the same url, of the same or a higher
+                priority class, was already in progress, no new request is made,
+                and a BufferedReply is returned which receives a copy of the
+                other request's result.
         """
 
         # First check the correctness of the url and callback parameters
         url = self.__check_request_parameters(url, callback)
 
+        # Skip the redirect to the storage provider if it is known where this
+        # version of the file is stored
+        version = kwargs.get('fileVersion')
+        if not version is None and not kwargs.get('redirect_count'):
+            kwargs['_redirect_key'] = (safe_decode(url.toString()),
+                                       safe_decode(version))
+            target = self.redirect_cache.get(*kwargs['_redirect_key'])
+            if not target is None:
+                kwargs['_redirect_cached'] = True
+                url = QtCore.QUrl(target)
+
+        # If the same url is already being retrieved, wait for that request to
+        # finish instead of sending a new one. A request only joins one of the
+        # same or a higher priority class, so that it never waits in the queue
+        # of a class below its own.
+        coalesce_key = None
+        if self.__can_coalesce(kwargs):
+            priority = kwargs.get('priority', self.DEFAULT_PRIORITY)
+            classes = list(self.scheduler.limits)
+            if priority in classes:
+                classes = classes[:classes.index(priority) + 1]
+            else:
+                classes = [priority]
+            for leader_priority in classes:
+                key = (leader_priority, url.toString())
+                if key in self._inflight:
+                    follower = BufferedReply(url)
+                    self._inflight[key].append(
+                        (follower, callback, args, kwargs))
+                    return follower
+            coalesce_key = (priority, url.toString())
+
         # Create network request
         request = QtNetwork.QNetworkRequest(url)
 
@@ -357,46 +1071,63 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         if not self.add_token(request):
             warnings.warn(_(u"Token could not be added to the request"))
 
+        self.__add_raw_headers(request, kwargs)
+
         # Check if this is a redirect and keep a count to prevent endless
         # redirects. If redirect_count is not set, init it to 0
         kwargs['redirect_count'] = kwargs.get('redirect_count', 0)
+        kwargs['_redirect'] = lambda redirect_url, kwargs: self.get(
+            redirect_url, callback, *args, **kwargs)
+
+        # Register the request so identical requests can join it, also while
+        # it is still waiting to be sent
+        if not coalesce_key is None:
+            kwargs['_coalesce_key'] = coalesce_key
+            kwargs['_followers'] = self._inflight[coalesce_key] = []
+
+        def send():
+            reply = super(ConnectionManager, self).get(request)
+
+            # Check if a QProgressDialog has been passed to which the download status
+            # can be reported. If so, add it as a property of the reply object
+            progressDialog = kwargs.get('progressDialog', None)
+            if isinstance(progressDialog, QtWidgets.QProgressDialog):
+                reply.setProperty('progressDialog', progressDialog)
+
+            # Check if a callback has been specified to which the downloadprogress
+            # is to be reported
+            dlpCallback = kwargs.get('downloadProgress', None)
+            if callable(dlpCallback):
+                reply.downloadProgress.connect(dlpCallback)
+
+            # Check if a callback has been specified for reply's readyRead() signal
+            # which emits as soon as data is available on the buffer and doesn't wait
+            # till the whole transfer is finished as the finished() callback does
+            # This is useful when downloading larger files
+            rrCallback = kwargs.get('readyRead', None)
+            buckets = self.__buckets('download', kwargs)
+            if callable(rrCallback) and buckets:
+                # Only read the data as fast as the bandwidth limits allow
+                ThrottledReader(reply, buckets,
+                                lambda: rrCallback(*args, **kwargs),
+                                self.read_buffer_size)
+            elif callable(rrCallback):
+                # Don't let data pile up in memory if it arrives faster than it
+                # can be processed
+                reply.setReadBufferSize(self.read_buffer_size)
+                reply.readyRead.connect(
+                    lambda: rrCallback(*args, **kwargs)
+                )
 
-        reply = super(ConnectionManager, self).get(request)
-
-        # If provided, connect the abort signal to the reply's abort() slot
-        abortSignal = kwargs.get('abortSignal', None)
-        if not abortSignal is None:
-            abortSignal.connect(reply.abort)
-
-        # Check if a QProgressDialog has been passed to which the download status
-        # can be reported. If so, add it as a property of the reply object
-        progressDialog = kwargs.get('progressDialog', None)
-        if isinstance(progressDialog, QtWidgets.QProgressDialog):
-            progressDialog.canceled.connect(reply.abort)
-            reply.setProperty('progressDialog', progressDialog)
-
-        # Check if a callback has been specified to which the downloadprogress
-        # is to be reported
-        dlpCallback = kwargs.get('downloadProgress', None)
-        if callable(dlpCallback):
-            reply.downloadProgress.connect(dlpCallback)
-
-        # Check if a callback has been specified for reply's readyRead() signal
-        # which emits as soon as data is available on the buffer and doesn't wait
-        # till the whole transfer is finished as the finished() callback does
-        # This is useful when downloading larger files
-        rrCallback = kwargs.get('readyRead', None)
-        if callable(rrCallback):
-            reply.readyRead.connect(
-                lambda: rrCallback(*args, **kwargs)
+            reply.finished.connect(
+                lambda: self.__reply_finished(
+                    callback, *args, **kwargs
+                )
             )
+            return reply
 
-        reply.finished.connect(
-            lambda: self.__reply_finished(
-                callback, *args, **kwargs
-            )
-        )
-        return reply
+        return self.__schedule(request, self.GetOperation, send, callback,
+                               args, kwargs)
 
     @buffer_network_request
     def post(self, url, callback, data_to_send, *args, **kwargs):
@@ -416,13 +1147,32 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         data_to_send : dict
                 The data to send with the POST request. keys will be used as variable names
                 and values will be used as the variable values.
+        priority : str (default: ConnectionManager.DEFAULT_PRIORITY)
+                The priority class of the request (see get())
+        retryPolicy : retry.RetryPolicy (default: ConnectionManager.retry_policy)
+                Determines if the request is repeated if it fails (see get())
+        timeout : float (default: ConnectionManager.request_timeout)
+                The number of seconds after which the request is aborted (see
+                get())
+        idleTimeout : float (default: ConnectionManager.idle_timeout)
+                The number of seconds without any data being sent or received
+                after which the request is aborted
+        notify : bool (default: True)
+                Show an error message if the request fails (see get())
         *args (optional)
                 Any other arguments that you want to have passed to callable.
         **kwargs (optional)
                 Any other keywoard arguments that you want to have passed to the callback
+
+        Returns
+        -------
+        scheduler.ReplyHandle
+                The handle for the current request.
         """
         # First check the correctness of the url and callback parameters
         url = self.__check_request_parameters(url, callback)
+        # Cached information about the target is about to become outdated
+        self.__invalidate(url)
 
         if not type(data_to_send) is dict:
             raise TypeError("The POST data should be passed as a dict")
@@ -450,10 +1200,20 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         else:
             final_postdata = safe_encode(
                 postdata.toString(QtCore.QUrl.FullyEncoded))
+        # Redirects are followed with the same data
+        kwargs['redirect_count'] = kwargs.get('redirect_count', 0)
+        kwargs['_redirect'] = lambda redirect_url, kwargs: self.post(
+            redirect_url, callback, data_to_send, *args, **kwargs)
+
         # Fire!
-        reply = super(ConnectionManager, self).post(request, final_postdata)
-        reply.finished.connect(
-            lambda: self.__reply_finished(callback, *args, **kwargs))
+        def send():
+            reply = super(ConnectionManager, self).post(request, final_postdata)
+            reply.finished.connect(
+                lambda: self.__reply_finished(callback, *args, **kwargs))
+            return reply
+
+        return self.__schedule(request, self.PostOperation, send, callback,
+                               args, kwargs)
 
     @buffer_network_request
     def put(self, url, callback, *args, **kwargs):
@@ -488,13 +1248,34 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         abortSignal : QtCore.Signal
                 This signal will be attached to the reply objects abort() slot, so that
                 the operation can be aborted from outside if necessary.
+        rawHeaders : dict (default: None)
+                Additional HTTP headers to send with the request.
+        priority : str (default: ConnectionManager.DEFAULT_PRIORITY)
+                The priority class of the request (see get())
+        retryPolicy : retry.RetryPolicy (default: ConnectionManager.retry_policy)
+                Determines if the request is repeated if it fails (see get())
+        timeout : float (default: ConnectionManager.request_timeout)
+                The number of seconds after which the request is aborted (see
+                get())
+        idleTimeout : float (default: ConnectionManager.idle_timeout)
+                The number of seconds without any data being sent or received
+                after which the request is aborted
+        notify : bool (default: True)
+                Show an error message if the request fails (see get())
         *args (optional)
                 Any other arguments that you want to have passed to the callback
         **kwargs (optional)
                 Any other keywoard arguments that you want to have passed to the callback
+
+        Returns
+        -------
+        scheduler.ReplyHandle
+                The handle for the current request.
         """
         # First check the correctness of the url and callback parameters
         url = self.__check_request_parameters(url, callback)
+        # Cached information about the target is about to become outdated
+        self.__invalidate(url)
         # Don't use pop() here as it will cause a segmentation fault!
         data_to_send = kwargs.get('data_to_send')
 
@@ -509,33 +1290,68 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         if data_to_send is None:
             request.setHeader(request.ContentLengthHeader, '0')
 
+        self.__add_raw_headers(request, kwargs)
+
         # Add OAuth2 token
         if not self.add_token(request):
             warnings.warn(_(u"Token could not be added to the request"))
 
-        reply = super(ConnectionManager, self).put(request, data_to_send)
-        reply.finished.connect(
-            lambda: self.__reply_finished(callback, *args, **kwargs))
-
-        # Check if a QProgressDialog has been passed to which the download status
-        # can be reported. If so, add it as a property of the reply object
         progressDialog = kwargs.get('progressDialog', None)
-        if isinstance(progressDialog, QtWidgets.QProgressDialog):
-            progressDialog.canceled.connect(reply.abort)
-            reply.setProperty('progressDialog', progressDialog)
-        elif not progressDialog is None:
+        if not progressDialog is None and \
+                not isinstance(progressDialog, QtWidgets.QProgressDialog):
             logging.error("progressDialog is not a QtWidgets.QProgressDialog")
 
-        # If provided, connect the abort signal to the reply's abort() slot
-        abortSignal = kwargs.get('abortSignal', None)
-        if not abortSignal is None:
-            abortSignal.connect(reply.abort)
+        # Remember where the data starts, so it can be sent again if the
+        # request is repeated
+        start_pos = None
+        if isinstance(data_to_send, QtCore.QIODevice) and \
+                not data_to_send.isSequential():
+            start_pos = data_to_send.pos()
 
-        # Check if a callback has been specified to which the downloadprogress
-        # is to be reported
-        ulpCallback = kwargs.get('uploadProgress', None)
-        if callable(ulpCallback):
-            reply.uploadProgress.connect(ulpCallback)
+        # Redirects are followed by sending the data again, which is only
+        # possible if it can be rewound
+        kwargs['redirect_count'] = kwargs.get('redirect_count', 0)
+        if data_to_send is None or not start_pos is None:
+            def redirect(redirect_url, kwargs):
+                if not start_pos is None:
+                    data_to_send.seek(start_pos)
+                self.put(redirect_url, callback, *args, **kwargs)
+            kwargs['_redirect'] = redirect
+
+        def send():
+            if not start_pos is None:
+                data_to_send.seek(start_pos)
+            data = data_to_send
+            buckets = self.__buckets('upload', kwargs)
+            if isinstance(data_to_send, QtCore.QIODevice) and buckets:
+                # Only send the data as fast as the bandwidth limits allow. Qt
+                # can not determine the size of the throttled device itself,
+                # and would otherwise read all of it before sending anything.
+                request.setHeader(request.ContentLengthHeader,
+                                  data_to_send.size() - data_to_send.pos())
+                request.setAttribute(request.DoNotBufferUploadDataAttribute,
+                                     True)
+                data = ThrottledDevice(data_to_send, buckets)
+            reply = super(ConnectionManager, self).put(request, data)
+            if not data is data_to_send:
+                data.setParent(reply)
+            reply.finished.connect(
+                lambda: self.__reply_finished(callback, *args, **kwargs))
+
+            # Check if a QProgressDialog has been passed to which the download status
+            # can be reported. If so, add it as a property of the reply object
+            if isinstance(progressDialog, QtWidgets.QProgressDialog):
+                reply.setProperty('progressDialog', progressDialog)
+
+            # Check if a callback has been specified to which the downloadprogress
+            # is to be reported
+            ulpCallback = kwargs.get('uploadProgress', None)
+            if callable(ulpCallback):
+                reply.uploadProgress.connect(ulpCallback)
+            return reply
+
+        return self.__schedule(request, self.PutOperation, send, callback,
+                               args, kwargs)
 
     @buffer_network_request
     def delete(self, url, callback, *args, **kwargs):
@@ -557,13 +1373,32 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         abortSignal : QtCore.Signal
                 This signal will be attached to the reply objects abort() slot, so that
                 the operation can be aborted from outside if necessary.
+        priority : str (default: ConnectionManager.DEFAULT_PRIORITY)
+                The priority class of the request (see get())
+        retryPolicy : retry.RetryPolicy (default: ConnectionManager.retry_policy)
+                Determines if the request is repeated if it fails (see get())
+        timeout : float (default: ConnectionManager.request_timeout)
+                The number of seconds after which the request is aborted (see
+                get())
+        idleTimeout : float (default: ConnectionManager.idle_timeout)
+                The number of seconds without any data being sent or received
+                after which the request is aborted
+        notify : bool (default: True)
+                Show an error message if the request fails (see get())
         *args (optional)
                 Any other arguments that you want to have passed to the callback
         **kwargs (optional)
                 Any other keywoard arguments that you want to have passed to the callback
+
+        Returns
+        -------
+        scheduler.ReplyHandle
+                The handle for the current request.
         """
         # First check the correctness of the url and callback parameters
         url = self.__check_request_parameters(url, callback)
+        # Cached information about the target is about to become outdated
+        self.__invalidate(url)
         request = QtNetwork.QNetworkRequest(url)
 
         # Add OAuth2 token
@@ -573,20 +1408,20 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         # Check if this is a redirect and keep a count to prevent endless
         # redirects. If redirect_count is not set, init it to 0
         kwargs['redirect_count'] = kwargs.get('redirect_count', 0)
-
-        reply = super(ConnectionManager, self).deleteResource(request)
-
-        # If provided, connect the abort signal to the reply's abort() slot
-        abortSignal = kwargs.get('abortSignal', None)
-        if not abortSignal is None:
-            abortSignal.connect(reply.abort)
-
-        reply.finished.connect(
-            lambda: self.__reply_finished(
-                callback, *args, **kwargs
+        kwargs['_redirect'] = lambda redirect_url, kwargs: self.delete(
+            redirect_url, callback, *args, **kwargs)
+
+        def send():
+            reply = super(ConnectionManager, self).deleteResource(request)
+            reply.finished.connect(
+                lambda: self.__reply_finished(
+                    callback, *args, **kwargs
+                )
             )
-        )
-        return reply
+            return reply
+
+        return self.__schedule(request, self.DeleteOperation, send, callback,
+                               args, kwargs)
 
     # Convenience HTTP Functions
 
@@ -599,13 +1434,17 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         callback : function
                 The callback function to which the data should be delivered once the
                 request is finished
+        fields : dict (default: None)
+                The attributes and relationships to return per object type
+                (see connection.add_fields()).
 
         Returns
         -------
-        QtNetwork.QNetworkReply or None if something went wrong
+        scheduler.ReplyHandle or cache.BufferedReply
         """
-        api_call = osf.api_call("logged_in_user")
-        return self.get(api_call, callback, *args, **kwargs)
+        api_call = osf.api_call("logged_in_user",
+                                fields=kwargs.pop("fields", None))
+        return self.__cached_get(api_call, (), callback, *args, **kwargs)
 
     def get_user_projects(self, callback, *args, **kwargs):
         """ Gets current user's projects. Retrieves a list of projects owned by
@@ -616,13 +1455,17 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         callback : function
                 The callback function to which the data should be delivered once the
                 request is finished
+        fields : dict (default: None)
+                The attributes and relationships to return per object type
+                (see connection.add_fields()).
 
         Returns
         -------
-        QtNetwork.QNetworkReply or None if something went wrong
+        scheduler.ReplyHandle or cache.BufferedReply
         """
-        api_call = osf.api_call("projects")
-        return self.get(api_call, callback, *args, **kwargs)
+        api_call = osf.api_call("projects",
+                                fields=kwargs.pop("fields", None))
+        return self.__cached_get(api_call, (), callback, *args, **kwargs)
 
     def get_project_repos(self, project_id, callback, *args, **kwargs):
         """ Get repos for the specified project.
@@ -636,13 +1479,18 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         callback : function
                 The callback function to which the data should be delivered once the
                 request is finished
+        fields : dict (default: None)
+                The attributes and relationships to return per object type
+                (see connection.add_fields()).
 
         Returns
         -------
-        QtNetwork.QNetworkReply or None if something went wrong
+        scheduler.ReplyHandle or cache.BufferedReply
         """
-        api_call = osf.api_call("project_repos", project_id)
-        return self.get(api_call, callback, *args, **kwargs)
+        api_call = osf.api_call("project_repos", project_id,
+                                fields=kwargs.pop("fields", None))
+        return self.__cached_get(api_call, (project_id,), callback,
+                                 *args, **kwargs)
 
     def get_repo_files(self, project_id, repo_name, callback, *args, **kwargs):
         """Retrieves files contained in a repository.
@@ -660,13 +1508,18 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         callback : function
                 The callback function to which the data should be delivered once the
                 request is finished
+        fields : dict (default: None)
+                The attributes and relationships to return per object type
+                (see connection.add_fields()).
 
         Returns
         -------
-        QtNetwork.QNetworkReply or None if something went wrong
+        scheduler.ReplyHandle or cache.BufferedReply
         """
-        api_call = osf.api_call("repo_files", project_id, repo_name)
-        return self.get(api_call, callback, *args, **kwargs)
+        api_call = osf.api_call("repo_files", project_id, repo_name,
+                                fields=kwargs.pop("fields", None))
+        return self.__cached_get(api_call, (project_id,), callback,
+                                 *args, **kwargs)
 
     def get_file_info(self, file_id, callback, *args, **kwargs):
         """ Gets information about the specified file.
@@ -678,14 +1531,19 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         callback : function
                 The callback function to which the data should be delivered once the
                 request is finished.
+        fields : dict (default: None)
+                The attributes and relationships to return per object type
+                (see connection.add_fields()).
 
         Returns
         -------
-        QtNetwork.QNetworkReply or None if something went wrong.
+        scheduler.ReplyHandle or cache.BufferedReply
         """
 
-        api_call = osf.api_call("file_info", file_id)
-        return self.get(api_call, callback, *args, **kwargs)
+        api_call = osf.api_call("file_info", file_id,
+                                fields=kwargs.pop("fields", None))
+        return self.__cached_get(api_call, (file_id,), callback,
+                                 *args, **kwargs)
 
     def download_file(self, url, destination, *args, **kwargs):
         """ Downloads a file by a using HTTP GET request.
@@ -714,6 +1572,45 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
                 should have two entries:
                 filename: The name of the file
                 filesize: the size of the file in bytes
+        priority : str (default: 'bulk')
+                The priority class of the transfer (see get())
+        segments : int (default: 1)
+                The number of parts to split the file into, which are downloaded
+                in parallel with HTTP Range requests. Only used if the size of
+                the file is known, either from the filesize keyword or from
+                progressDialog. Segments that fail are retried separately.
+        filesize : int (default: None)
+                The size of the file in bytes.
+        transferRate : callable (default: None)
+                Function that is called with the current transfer rate in bytes
+                per second whenever data has been received. If a progressDialog
+                is used, the rate is also shown on the dialog.
+        expectedHashes : dict (default: None)
+                The hashes of the file as reported by the OSF (extra.hashes in
+                the file's metadata), e.g. {'md5': '...', 'sha256': '...'}. The
+                hash of the data is computed while it is received. If it does
+                not match, the file is not saved, and errorCallback is called
+                with a reply whose error() is UnknownContentError.
+        resumable : bool (default: False)
+                Save the received data in <destination>.part, which is kept if
+                the download fails or is aborted. If the file is downloaded to
+                the same destination again, the download continues where it
+                stopped, unless the file on the OSF has changed in the meantime.
+                Resumable downloads use a single connection.
+        skip_identical : bool (default: False)
+                Do not download the file if destination already exists and has
+                one of the hashes in expectedHashes. The finishedCallback is
+                still called, with a reply that has the HTTP status code 304
+                (Not Modified). The hashes of local files are cached by their
+                path, size and modification time (see hash_cache_file). A file
+                whose hash is not cached is hashed in a background thread, and
+                the download starts once it is known to be different.
+        bandwidth_limit : float (default: None)
+                The maximum number of bytes per second for this download, on top
+                of the limits set with set_bandwidth_limit().
+        fileVersion : str (default: None)
+                The version of the file (see cache.file_version()), so that the
+                location it was redirected to can be reused (see get()).
         *args (optional)
                 Any other arguments that you want to have passed to the callback
         **kwargs (optional)
@@ -721,22 +1618,151 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         """
 
         # Check if destination is a string
-        if not type(destination) == str:
+        if not isinstance(destination, basestring):
             raise ValueError("destination should be a string")
         # Check if the specified folder exists. However, because a situation is possible in which
         # the user has selected a destination but deletes the folder in some other program in the meantime,
         # show a message box, but do not raise an exception, because we don't want this to completely crash
         # our program.
         if not os.path.isdir(os.path.split(os.path.abspath(destination))[0]):
-            self.error_message.emit(
-                _("{} is not a valid destination").format(destination))
+            kwargs['destination'] = destination
+            kwargs.pop('skip_identical', None)
+            self.__transfer_failed(
+                None, url, _("Error saving file"),
+                _("{} is not a valid destination").format(destination),
+                *args, **kwargs)
             return
+        if kwargs.pop('skip_identical', False) and \
+                kwargs.get('expectedHashes'):
+            # Hashing the destination can take a while, so it is done in the
+            # background, and the download is started once it is known that
+            # the file is different.
+            def checked(identical):
+                if identical:
+                    self.__download_skipped(url, destination, *args, **kwargs)
+                else:
+                    self.__start_download(url, destination, *args, **kwargs)
+            self.hash_cache.matches(destination, kwargs['expectedHashes'],
+                                    checked)
+            return
+        self.__start_download(url, destination, *args, **kwargs)
+
+    def __start_download(self, url, destination, *args, **kwargs):
+        """ Starts a download for download_file(), after checking the OAuth2
+        token if needed. """
         kwargs['destination'] = destination
         kwargs['download_url'] = url
-        # Extra call to get() to make sure OAuth2 token is still valid before download
-        # is initiated. If not, this way the request can be repeated after the user
-        # reauthenticates
-        self.get_logged_in_user(self.__download, *args, **kwargs)
+        # Stored under another name, as the priority of the call to
+        # get_logged_in_user() below is not passed on to its callback
+        kwargs['_transfer_priority'] = kwargs.pop('priority', BULK)
+        if self.__token_known_valid():
+            self.__download(None, *args, **kwargs)
+        else:
+            # Extra call to get() to make sure OAuth2 token is still valid before download
+            # is initiated. If not, this way the request can be repeated after the user
+            # reauthenticates
+            self.get_logged_in_user(self.__download, *args,
+                                    **self.__stash_transfer_kwargs(kwargs))
+
+    def download_folder(self, data, destination, *args, **kwargs):
+        """ Downloads all files in a folder or project, including those in its
+        subfolders. The folder structure is recreated in destination. For a
+        project, the storage providers (osfstorage, dropbox, etc.) become the
+        folders at the top level.
+
+        Parameters
+        ----------
+        data : dict
+                The 'data' segment of the OSF API response for the folder or
+                project to download.
+        destination : str
+                The local folder to save the contents of the folder or project
+                in. It is created if it does not exist yet, but the folder it is
+                in should exist.
+        finishedCallback : function (default: None)
+                The function to call once all files have been processed. It
+                receives the transfers.FolderDownload object, of which the
+                downloaded, skipped and failed attributes list the results.
+        errorCallback : function (default: None)
+                The function to call if the download can not be started
+                because destination is not valid. It receives a reply whose
+                errorString() describes the problem.
+        downloadProgress : function (default: None)
+                Function that is called with the number of bytes received and
+                the total size of the files found so far.
+        progressDialog : dict (default : None)
+                A dictionary containing a 'filename' entry, with the name of
+                the folder or project to show on a progress dialog. The dialog
+                shows the combined progress, the transfer rate, and the
+                estimated remaining time.
+        abortSignal : QtCore.pyqtSignal (default: None)
+                Signal that aborts the download when emitted. Files that have
+                been completed are kept.
+        parallel : int (default: the limit of the 'bulk' priority class)
+                The maximum number of files that are downloaded at the same
+                time.
+        skip_identical : bool (default: False)
+                Do not download files that already exist in destination with
+                the same contents (see download_file()).
+        resumable : bool (default: False)
+                Keep the data of files that could not be downloaded completely,
+                so the next download of the folder continues where it stopped
+                (see download_file()).
+        *args (optional)
+                Any other arguments that you want to have passed to the callback
+        **kwargs (optional)
+                Any other keywoard arguments that you want to have passed to the callback
+
+        Returns
+        -------
+        transfers.FolderDownload
+                The object that performs the download, or None if destination
+                is not valid
+        """
+        if not isinstance(destination, basestring):
+            raise ValueError("destination should be a string")
+        if not os.path.isdir(os.path.split(os.path.abspath(destination))[0]):
+            for key in ['finishedCallback', 'parallel', 'skip_identical',
+                        'resumable']:
+                kwargs.pop(key, None)
+            self.__transfer_failed(
+                None, QtCore.QUrl.fromLocalFile(destination),
+                _("Invalid destination"),
+                _("{} is not a valid destination").format(destination),
+                *args, **kwargs)
+            return
+
+        fcb = kwargs.pop('finishedCallback', None)
+        downloadProgress = kwargs.pop('downloadProgress', None)
+        abortSignal = kwargs.pop('abortSignal', None)
+        parallel = kwargs.pop('parallel', None) or self.scheduler.limits[BULK]
+        download_kwargs = {}
+        for key in ['skip_identical', 'resumable']:
+            if key in kwargs:
+                download_kwargs[key] = kwargs.pop(key)
+
+        progressDialog = kwargs.pop('progressDialog', None)
+        progress_indicator = None
+        if isinstance(progressDialog, dict):
+            try:
+                text = _("Downloading") + " " + progressDialog['filename']
+            except KeyError as e:
+                raise KeyError("progressDialog missing field {}".format(e))
+            progress_indicator = self.__create_progress_dialog(text, 0)
+
+        def finished(download):
+            download.deleteLater()
+            if callable(fcb):
+                fcb(download, *args, **kwargs)
+
+        download = FolderDownload(
+            self, data, destination, finished, parallel,
+            progress=downloadProgress, progressDialog=progress_indicator,
+            download_kwargs=download_kwargs, parent=self)
+        if not abortSignal is None:
+            abortSignal.connect(download.abort)
+        download.start()
+        return download
 
     def upload_file(self, url, source_file, *args, **kwargs):
         """ Uploads a file.
@@ -764,17 +1790,136 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
                 should have two entries:
                 filename: The name of the file
                 filesize: the size of the file in bytes
+        priority : str (default: 'bulk')
+                The priority class of the transfer (see get())
+        transferRate : callable (default: None)
+                Function that is called with the current transfer rate in bytes
+                per second whenever data has been sent. If a progressDialog
+                is used, the rate is also shown on the dialog.
+        chunk_size : int (default: None)
+                If set, the file is uploaded in chunks of this many bytes with
+                the resumable upload protocol described in
+                transfers.ChunkedUpload, which the upload server needs to
+                support. Failed chunks are retried, and an interrupted upload
+                of the same file to the same url continues where it stopped.
+                Requires source_file to be a path.
+        bandwidth_limit : float (default: None)
+                The maximum number of bytes per second for this upload, on top
+                of the limits set with set_bandwidth_limit().
         *args (optional)
                 Any other arguments that you want to have passed to the callback
         **kwargs (optional)
                 Any other keywoard arguments that you want to have passed to the callback
         """
-        # Extra call to get() to make sure OAuth2 token is still valid before download
-        # is initiated. If not, this way the request can be repeated after the user
-        # reauthenticates
         kwargs['upload_url'] = url
         kwargs['source_file'] = source_file
-        self.get_logged_in_user(self.__upload, *args, **kwargs)
+        kwargs['_transfer_priority'] = kwargs.pop('priority', BULK)
+        if self.__token_known_valid():
+            self.__upload(None, *args, **kwargs)
+        else:
+            # Extra call to get() to make sure OAuth2 token is still valid before upload
+            # is initiated. If not, this way the request can be repeated after the user
+            # reauthenticates
+            self.get_logged_in_user(self.__upload, *args,
+                                    **self.__stash_transfer_kwargs(kwargs))
+
+    def upload_folder(self, data, source_folder, *args, **kwargs):
+        """ Uploads a local folder with all its files and subfolders. A folder
+        with the same name as source_folder is created in the OSF folder (or
+        updated, if it already exists). The subfolders are created level by
+        level, and the files are uploaded as soon as their folder exists.
+
+        Parameters
+        ----------
+        data : dict
+                The data of the OSF folder to upload into, as found under the
+                'data' key of an OSF API response. It should contain the 'upload'
+                and 'new_folder' links.
+        source_folder : str
+                The local folder to upload.
+        finishedCallback : function (default: None)
+                The function to call once all files have been processed. It
+                receives the transfers.FolderUpload object, of which the results
+                attribute contains the result of every file.
+        errorCallback : function (default: None)
+                The function to call if the upload can not be started because
+                source_folder is not a folder. It receives a reply whose
+                errorString() describes the problem.
+        uploadProgress : function (default: None)
+                Function that is called with the number of bytes sent and the
+                total size of the files.
+        fileFinished : function (default: None)
+                Function that is called with the result of each file, as a dict
+                with the keys 'path', 'status' ('uploaded' or 'failed') and
+                'error'.
+        progressDialog : dict (default : None)
+                A dictionary containing a 'filename' entry, with the name to show
+                on a progress dialog. The dialog shows the combined progress, the
+                transfer rate, and the estimated remaining time.
+        abortSignal : QtCore.pyqtSignal (default: None)
+                Signal that aborts the upload when emitted. Files that have been
+                uploaded are kept.
+        parallel : int (default: the limit of the 'bulk' priority class)
+                The maximum number of files that are uploaded at the same time.
+        chunk_size : int (default: None)
+                Upload the files in chunks of this size (see upload_file()).
+        *args (optional)
+                Any other arguments that you want to have passed to the callback
+        **kwargs (optional)
+                Any other keywoard arguments that you want to have passed to the callback
+
+        Returns
+        -------
+        transfers.FolderUpload
+                The object that performs the upload, or None if source_folder
+                is not a folder
+        """
+        if not os.path.isdir(source_folder):
+            for key in ['finishedCallback', 'fileFinished', 'parallel',
+                        'chunk_size']:
+                kwargs.pop(key, None)
+            self.__transfer_failed(
+                None, QtCore.QUrl.fromLocalFile(source_folder),
+                _("Invalid source folder"),
+                _("{} is not a valid source folder").format(source_folder),
+                *args, **kwargs)
+            return
+
+        fcb = kwargs.pop('finishedCallback', None)
+        uploadProgress = kwargs.pop('uploadProgress', None)
+        fileFinished = kwargs.pop('fileFinished', None)
+        abortSignal = kwargs.pop('abortSignal', None)
+        parallel = kwargs.pop('parallel', None) or self.scheduler.limits[BULK]
+        upload_kwargs = {}
+        if 'chunk_size' in kwargs:
+            upload_kwargs['chunk_size'] = kwargs.pop('chunk_size')
+
+        progressDialog = kwargs.pop('progressDialog', None)
+        progress_indicator = None
+        if isinstance(progressDialog, dict):
+            try:
+                text = _("Uploading") + " " + progressDialog['filename']
+            except KeyError as e:
+                raise KeyError("progressDialog missing field {}".format(e))
+            progress_indicator = self.__create_progress_dialog(text, 0)
+
+        def finished(upload):
+            upload.deleteLater()
+            if callable(fcb):
+                fcb(upload, *args, **kwargs)
+
+        upload = FolderUpload(
+            self, data, source_folder, finished, parallel,
+            progressDialog=progress_indicator, upload_kwargs=upload_kwargs,
+            parent=self)
+        if callable(uploadProgress):
+            upload.progress_changed.connect(uploadProgress)
+        if callable(fileFinished):
+            upload.file_finished.connect(fileFinished)
+        if not abortSignal is None:
+            abortSignal.connect(upload.abort)
+        upload.start()
+        return upload
 
     # PyQt Slots
 
@@ -782,6 +1927,12 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         """ Callback for any HTTP request """
         reply = self.sender()
         request = reply.request()
+        # Free the slot of this request, so the next request of its priority
+        # class can be sent
+        self.scheduler.finished(reply)
+        self.__record_connection(reply)
+        # The callbacks receive the handle that was returned to the caller
+        handle = kwargs.get('_reply_handle') or reply
         # Get the error callback function, if set
         errorCallback = kwargs.get('errorCallback', None)
         # Get the request id, if set (only for authenticated requests, if a user
@@ -789,11 +1940,50 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         # reauthenticate.
         current_request_id = kwargs.pop('_request_id', None)
 
+        # Evict cached information about the node or folder that was modified
+        if reply.operation() != self.GetOperation:
+            self.__invalidate(request.url())
+
+        # Callers that joined this request receive the result once it is
+        # final (which can be after one or more redirects or retries).
+        followers = kwargs.get('_followers') or []
+
+        # If the storage url that was remembered for a file no longer works,
+        # forget it and request the file from its original url again
+        if kwargs.get('_redirect_cached') and handle.error() not in \
+                [reply.NoError, reply.OperationCanceledError]:
+            origin, version = kwargs['_redirect_key']
+            logger.info("Stored redirect for {} failed ({}); requesting the "
+                        "original url".format(origin, handle.errorString()))
+            self.redirect_cache.remove(origin, version)
+            self.__stop_coalescing(kwargs)
+            kwargs['_redirect_cached'] = False
+            kwargs['redirect_count'] = kwargs.get('redirect_count', 0) + 1
+            self.__rewind_download(kwargs)
+            if not current_request_id is None:
+                self.pending_requests.pop(current_request_id, None)
+            self.get(origin, callback, *args, **kwargs)
+            reply.deleteLater()
+            return
+
+        # Repeat the request if it failed because of a temporary problem.
+        # Errors are taken from the handle, which reports requests that were
+        # aborted because they timed out as such, rather than as cancelled.
+        if handle.error() != reply.NoError and \
+                self.__retry(reply, handle, kwargs):
+            if not current_request_id is None:
+                kwargs['_request_id'] = current_request_id
+            reply.deleteLater()
+            return
+
+        # New requests for this url can no longer join this one
+        self.__stop_coalescing(kwargs)
+
         # If an error occured, just show a simple QMessageBox for now
-        if reply.error() != reply.NoError:
+        if handle.error() != reply.NoError:
             # User not/no longer authenticated to perform this request
             # Show login window again
-            if reply.error() == reply.AuthenticationRequiredError:
+            if handle.error() == reply.AuthenticationRequiredError:
                 # If access is denied, the user's token must have expired
                 # or something like that. Dispatch the logout signal and
                 # show the login window again
@@ -803,11 +1993,13 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
             else:
                 # Don't show error notification if user manually cancelled operation.
                 # This is undesirable most of the time, and when it is required, it
-                # can be implemented by using the errorCallback function
-                if reply.error() != reply.OperationCanceledError:
+                # can be implemented by using the errorCallback function. Callers
+                # that handle failures themselves can also opt out.
+                if handle.error() != reply.OperationCanceledError and \
+                        kwargs.get('notify', True):
                     self.error_message.emit(
                         str(reply.attribute(request.HttpStatusCodeAttribute)),
-                        reply.errorString()
+                        handle.errorString()
                     )
 
                 # Remove this request from pending requests because it should not
@@ -820,8 +2012,9 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
 
             # Call error callback, if set
             if callable(errorCallback):
-                kwargs.pop('errorCallback')
-                errorCallback(reply, *args, **kwargs)
+                self.__pop_request_kwargs(kwargs)
+                errorCallback(handle, *args, **kwargs)
+            self.__finish_followers(handle, followers)
             reply.deleteLater()
             return
 
@@ -830,23 +2023,32 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         if not current_request_id is None:
             self.pending_requests.pop(current_request_id, None)
 
-        # Check if the reply indicates a redirect
-        if reply.attribute(request.HttpStatusCodeAttribute) in [301, 302]:
+        # Check if the reply indicates a redirect. A 308 response without a
+        # location is part of a chunked upload (see transfers.ChunkedUpload);
+        # Qt reports an empty url as its redirection target.
+        status = reply.attribute(request.HttpStatusCodeAttribute)
+        redirect_url = reply.attribute(request.RedirectionTargetAttribute)
+        if status in REDIRECT_STATUSES and not redirect_url is None and \
+                redirect_url.isValid():
             # To prevent endless redirects, make a count of them and only
             # allow a preset maximum
+            kwargs.setdefault('redirect_count', 0)
             if kwargs['redirect_count'] < self.MAX_REDIRECTS:
                 kwargs['redirect_count'] += 1
             else:
-                self.error_message.emit(
-                    _("Whoops, something is going wrong"),
-                    _("Too Many redirects")
-                )
+                if kwargs.get('notify', True):
+                    self.error_message.emit(
+                        _("Whoops, something is going wrong"),
+                        _("Too Many redirects")
+                    )
                 if callable(errorCallback):
-                    kwargs.pop('errorCallback')
-                    errorCallback(reply, *args, **kwargs)
+                    self.__pop_request_kwargs(kwargs)
+                    errorCallback(handle, *args, **kwargs)
                 # Close any remaining file handles that were created for upload
                 # or download
                 self.__close_file_handles(*args, **kwargs)
+                self.__finish_followers(reply, followers, error=(
+                    reply.ProtocolFailure, _("Too Many redirects")))
                 reply.deleteLater()
                 return
 
@@ -855,27 +2057,156 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
             if 'tmp_file' in kwargs and isinstance(kwargs['tmp_file'], QtCore.QTemporaryFile):
                 kwargs['tmp_file'].resize(0)
 
-            # Perform another request with the redirect_url and pass on the callback
-            redirect_url = reply.attribute(request.RedirectionTargetAttribute)
-            # For now, the redirects only work for GET operations (but to my
-            # knowledge, those are the only operations they occur for)
-
-            if reply.operation() == self.GetOperation:
-                self.get(redirect_url, callback, *args, **kwargs)
+            # Perform another request with the redirect_url and pass on the
+            # callback. The location may be relative to the requested url.
+            self.__follow_redirect(reply, reply.url().resolved(redirect_url),
+                                   callback, args, kwargs)
         else:
+            # Remember where the file was found, so the next request for this
+            # version of the file can go there directly
+            redirect_key = kwargs.get('_redirect_key')
+            if not redirect_key is None and kwargs.get('redirect_count') and \
+                    not kwargs.get('_redirect_cached') and \
+                    status in [200, 206]:
+                target = safe_decode(reply.url().toString())
+                if target != redirect_key[0]:
+                    self.redirect_cache.put(redirect_key[0], redirect_key[1],
+                                            target)
+            # Store the response in the memory cache if it was requested by
+            # one of the convenience functions. peek() leaves the data in the
+            # reply's buffer for the callback.
+            cache_key = kwargs.get('_cache_key')
+            data = None
+            if not cache_key is None or followers:
+                data = reply.peek(reply.bytesAvailable()).data()
+            if not cache_key is None and status == 200:
+                url, tags = cache_key
+                self.memory_cache.put(url, data, tags)
             # Remove (potentially) internally used kwargs before passing
             # data on to the callback
-            kwargs.pop('redirect_count', None)
-            kwargs.pop('downloadProgress', None)
-            kwargs.pop('uploadProgress', None)
-            kwargs.pop('readyRead', None)
-            kwargs.pop('errorCallback', None)
-            kwargs.pop('abortSignal', None)
-            callback(reply, *args, **kwargs)
+            self.__pop_request_kwargs(kwargs)
+            callback(handle, *args, **kwargs)
+            # Pass a copy of the result to the callers that requested the same
+            # url in the meantime.
+            self.__finish_followers(reply, followers, data)
 
         # Cleanup, mark the reply object for deletion
         reply.deleteLater()
 
+    def __follow_redirect(self, reply, redirect_url, callback, args, kwargs):
+        """ Performs a request again for the url it was redirected to. Just like
+        browsers do, a 303 response, or a 301 or 302 response to a POST request,
+        is followed with a GET request. Other requests are repeated with the
+        same operation and data.
+
+        Parameters
+        ----------
+        reply : QtNetwork.QNetworkReply
+                The reply with the redirect
+        redirect_url : QtCore.QUrl
+                The url to request instead
+        callback : callable
+                The callback of the request
+        args : tuple
+                The positional arguments for the callback
+        kwargs : dict
+                The keyword arguments of the request
+        """
+        status = reply.attribute(
+            QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        operation = reply.operation()
+        if operation != self.GetOperation and (status == 303 or (
+                status in [301, 302] and operation == self.PostOperation)):
+            kwargs.pop('_redirect', None)
+            self.get(redirect_url, callback, *args, **kwargs)
+            return
+        redirect = kwargs.get('_redirect')
+        if callable(redirect):
+            # Pass on the keyword arguments that were updated for the redirect
+            # (the redirect count, and the callers that joined the request),
+            # rather than the ones the request was originally made with
+            redirect(redirect_url, kwargs)
+            return
+
+        # The data of the request could not be sent again
+        handle = kwargs.get('_reply_handle') or reply
+        if kwargs.get('notify', True):
+            self.error_message.emit(
+                _("Whoops, something is going wrong"),
+                _("The request to {} was redirected, but its data could not "
+                  "be sent again").format(safe_decode(reply.url().toString()))
+            )
+        errorCallback = kwargs.get('errorCallback', None)
+        followers = kwargs.get('_followers') or []
+        if callable(errorCallback):
+            self.__pop_request_kwargs(kwargs)
+            errorCallback(handle, *args, **kwargs)
+        self.__close_file_handles(*args, **kwargs)
+        self.__finish_followers(reply, followers, error=(
+            reply.ProtocolFailure, _("Redirect could not be followed")))
+
+    def __rewind_download(self, kwargs):
+        """ Discards the data that a download has written to its temporary
+        file, before the file is requested again. """
+        if not 'tmp_file' in kwargs:
+            return
+        kwargs['tmp_file'].resize(0)
+        kwargs['tmp_file'].seek(0)
+        if not kwargs.get('write_buffer') is None:
+            kwargs['write_buffer'].clear()
+        if kwargs.get('hash_verifier'):
+            kwargs['hash_verifier'].reset()
+
+    def __retry(self, reply, handle, kwargs):
+        """ Repeats a failed request after a delay, if the retry policy of the
+        request allows it.
+
+        Parameters
+        ----------
+        reply : QtNetwork.QNetworkReply
+                The reply of the failed request
+        handle : scheduler.ReplyHandle
+                The handle of the request, which reports the error of the reply
+        kwargs : dict
+                The keyword arguments of the request
+
+        Returns
+        -------
+        bool
+                True if the request will be repeated, False if not
+        """
+        policy = kwargs.get('retryPolicy', self.retry_policy)
+        resubmit = kwargs.get('_resubmit')
+        attempt = kwargs.get('_retry_count', 0)
+        if policy is None or resubmit is None or \
+                not policy.should_retry(handle, attempt):
+            return False
+        # Data that is streamed elsewhere can not be taken back, so these
+        # requests are only repeated if they ask for it explicitly. Downloads
+        # to a temporary file simply start over.
+        if callable(kwargs.get('readyRead')) and \
+                not 'retryPolicy' in kwargs and not 'tmp_file' in kwargs:
+            return False
+
+        self.__rewind_download(kwargs)
+
+        delay = policy.delay(handle, attempt)
+        kwargs['_retry_count'] = attempt + 1
+        if isinstance(handle, ReplyHandle):
+            handle.retry_count = attempt + 1
+        logger.info("{} {} failed ({}); retrying in {:.1f} s ({}/{})".format(
+            reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute),
+            safe_decode(reply.url().toString()), handle.errorString(), delay,
+            attempt + 1, policy.max_retries))
+        # The failed reply is deleted; until the request is sent again, the
+        # handle behaves like that of a request that is waiting in the queue.
+        # Callers that join the request in the meantime (see get()) are kept
+        # in _followers, which is passed on together with _coalesce_key.
+        if isinstance(handle, ReplyHandle):
+            handle.detach()
+        resubmit(delay, kwargs)
+        return True
+
     def __create_progress_dialog(self, text, filesize):
         """ Creates a progress dialog. Uses manager.progress_icon (if set) to
         determine which icon to display on the dialog.
@@ -901,17 +2232,68 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
             progress_dialog.setWindowTitle(_(u"Transferring"))
         return progress_dialog
 
-    def __transfer_progress(self, transfered, total):
-        """ callback for a reply object. """
-        self.sender().property('progressDialog').setValue(transfered)
+    def __progress_reporter(self, progressDialog=None, text=None,
+                            progress=None, transferRate=None):
+        """ Creates the callback that reports the progress of a transfer.
+
+        Parameters
+        ----------
+        progressDialog : QtWidgets.QProgressDialog (default: None)
+                The dialog to show the progress and the transfer rate on
+        text : str (default: None)
+                The label of the dialog, to which the transfer rate is added
+        progress : callable (default: None)
+                Callback to pass the transferred and total bytes on to
+        transferRate : callable (default: None)
+                Callback to pass the transfer rate in bytes per second to
+
+        Returns
+        -------
+        callable
+                Function that accepts the transferred and total bytes
+        """
+        rate = TransferRate()
+        # The time the label of the dialog was last updated
+        label_updated = [0]
+
+        def report(transferred, total):
+            bytes_per_second = rate.update(transferred)
+            if isinstance(progressDialog, QtWidgets.QProgressDialog):
+                progressDialog.setValue(transferred)
+                now = time.time()
+                if not text is None and \
+                        now - label_updated[0] >= self.RATE_LABEL_INTERVAL:
+                    label_updated[0] = now
+                    progressDialog.setLabelText(u"{} ({}/s)".format(
+                        text, humanize.naturalsize(bytes_per_second)))
+            if callable(progress):
+                progress(transferred, total)
+            if callable(transferRate):
+                transferRate(bytes_per_second)
+        return report
 
     def __download(self, reply, download_url, *args, **kwargs):
         """ The real download function, that is a callback for get_logged_in_user()
-        in download_file() """
-        # Create tempfile
-        tmp_file = QtCore.QTemporaryFile()
-        tmp_file.open(QtCore.QIODevice.WriteOnly)
-        kwargs['tmp_file'] = tmp_file
+        in download_file(). Is called directly (with reply set to None) if the
+        OAuth2 token is known to be valid. """
+        self.__restore_transfer_kwargs(kwargs)
+        segments = kwargs.pop('segments', 1)
+        size = kwargs.pop('filesize', None)
+        resumable = kwargs.pop('resumable', False)
+        transferRate = kwargs.pop('transferRate', None)
+        bandwidth_limit = kwargs.pop('bandwidth_limit', None)
+        if bandwidth_limit:
+            kwargs['_bucket'] = TokenBucket(bandwidth_limit)
+
+        expectedHashes = kwargs.pop('expectedHashes', None)
+        if expectedHashes:
+            verifier = HashVerifier(expectedHashes)
+            if verifier:
+                kwargs['hash_verifier'] = verifier
+        # The error callback is no longer passed on once the data has been
+        # received, but is needed if the hash does not match or the file can
+        # not be saved.
+        kwargs['_download_error_callback'] = kwargs.get('errorCallback')
 
         progressDialog = kwargs.get('progressDialog', None)
         if isinstance(progressDialog, dict):
@@ -922,22 +2304,182 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
                 raise KeyError("progressDialog missing field {}".format(e))
             progress_indicator = self.__create_progress_dialog(text, size)
             kwargs['progressDialog'] = progress_indicator
-            kwargs['downloadProgress'] = self.__transfer_progress
+            kwargs['downloadProgress'] = self.__progress_reporter(
+                progress_indicator, text, kwargs.get('downloadProgress'),
+                transferRate)
+        elif callable(transferRate):
+            kwargs['downloadProgress'] = self.__progress_reporter(
+                progress=kwargs.get('downloadProgress'),
+                transferRate=transferRate)
+
+        kwargs['priority'] = kwargs.pop('_transfer_priority', BULK)
+        if resumable:
+            self.__download_resumable(download_url, *args, **kwargs)
+            return
+
+        # Create the temporary file in the destination folder, so that it can
+        # be renamed to the destination without copying its contents.
+        folder, filename = os.path.split(os.path.abspath(kwargs['destination']))
+        tmp_file = QtCore.QTemporaryFile(
+            os.path.join(folder, u'.{}.XXXXXX'.format(filename)))
+        if not tmp_file.open(QtCore.QIODevice.ReadWrite):
+            self.__transfer_failed(
+                None, download_url, _("Error saving file"),
+                _("Could not write to {}").format(folder), *args, **kwargs)
+            return
+        kwargs['tmp_file'] = tmp_file
 
+        if segments > 1 and size:
+            self.__download_segmented(download_url, size, segments,
+                                      *args, **kwargs)
+            return
+
+        # Collects the received data, so it is written to disk in large blocks
+        kwargs['write_buffer'] = WriteBuffer(tmp_file)
         # Callback function for when bytes are received
         kwargs['readyRead'] = self.__download_readyRead
         # Download the file with a get request
         self.get(download_url, self.__download_finished, *args, **kwargs)
 
+    def __download_resumable(self, download_url, *args, **kwargs):
+        """ Downloads a file to <destination>.part, continuing where an earlier
+        attempt stopped if possible. Called by __download() if resumable is
+        set. """
+        partial = PartialDownload(kwargs['destination'], download_url,
+                                  kwargs.get('hash_verifier'))
+        if not partial.open():
+            self.__transfer_failed(
+                None, download_url, _("Error saving file"),
+                _("Could not write to {}").format(partial.path),
+                *args, **kwargs)
+            return
+        kwargs['partial_download'] = partial
+
+        # The progress also needs to count the data that was received earlier,
+        # so it is reported when the data is written.
+        kwargs['partProgress'] = kwargs.pop('downloadProgress', None)
+
+        headers = dict(kwargs.get('rawHeaders') or {})
+        headers.update(partial.request_headers())
+        kwargs['rawHeaders'] = headers
+        kwargs['readyRead'] = self.__download_part_readyRead
+        self.get(download_url, self.__download_part_finished, *args, **kwargs)
+
+    def __download_part_readyRead(self, *args, **kwargs):
+        """ readyRead callback for resumable downloads. Writes the received data
+        to the part file. """
+        # Throttled downloads are read from a timer, so use the handle of the
+        # request rather than the sender
+        reply = kwargs.get('_reply_handle') or self.sender()
+        status = reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        # Skip the body of redirect and error responses
+        if status in REDIRECT_STATUSES or (status or 0) >= 400:
+            reply.readAll()
+            return
+        partial = kwargs['partial_download']
+        if not partial.write(reply):
+            self.error_message.emit(
+                _("Error saving file"),
+                _("Could not write to {}").format(partial.path)
+            )
+            reply.abort()
+            return
+        partProgress = kwargs.get('partProgress', None)
+        if callable(partProgress):
+            partProgress(partial.received, partial.total)
+
+    def __download_part_finished(self, reply, *args, **kwargs):
+        """ Callback for a resumable download that has received all data. Moves
+        the part file to the destination. """
+        progressDialog = kwargs.pop('progressDialog', None)
+        if isinstance(progressDialog, QtWidgets.QWidget):
+            progressDialog.deleteLater()
+        kwargs.pop('partProgress', None)
+        partial = kwargs.pop('partial_download')
+        if not partial.buffer.flush():
+            partial.keep()
+            self.__transfer_failed(
+                reply, reply.url(), _("Error saving file"),
+                _("Could not write to {}").format(partial.path),
+                *args, **kwargs)
+            return
+        if not self.__verify_download(reply, *args, **kwargs):
+            # The data can not be used to resume the download either
+            partial.discard()
+            return
+        if not partial.complete():
+            self.__transfer_failed(
+                reply, reply.url(), _("Error saving file"),
+                _("Could not save file to {}").format(kwargs['destination']),
+                *args, **kwargs)
+            return
+
+        self.__remember_hash(kwargs['destination'], kwargs.pop('hash_verifier',
+                                                               None))
+        kwargs.pop('_download_error_callback', None)
+        fcb = kwargs.pop('finishedCallback', None)
+        if callable(fcb):
+            fcb(reply, *args, **kwargs)
+
+    def __download_segmented(self, download_url, size, segments, *args,
+                             **kwargs):
+        """ Downloads a file in several parts at once. Called by __download()
+        if more than one segment is requested. """
+        progressDialog = kwargs.get('progressDialog', None)
+        downloadProgress = kwargs.get('downloadProgress', None)
+        errorCallback = kwargs.get('errorCallback', None)
+        abortSignal = kwargs.get('abortSignal', None)
+        priority = kwargs.get('priority')
+        bucket = kwargs.get('_bucket')
+        version = kwargs.get('fileVersion')
+        self.__pop_request_kwargs(kwargs)
+
+        def finished(reply):
+            download.deleteLater()
+            self.__download_finished(reply, *args, **kwargs)
+
+        def failed(reply):
+            download.deleteLater()
+            progressDialog = kwargs.pop('progressDialog', None)
+            if isinstance(progressDialog, QtWidgets.QWidget):
+                progressDialog.deleteLater()
+            self.__close_file_handles(*args, **kwargs)
+            self.__notify_failure(reply)
+            if callable(errorCallback):
+                errorCallback(reply, *args, **kwargs)
+
+        download = SegmentedDownload(
+            self, download_url, kwargs['tmp_file'], size, segments,
+            finished, failed, progress=downloadProgress,
+            progressDialog=progressDialog, priority=priority,
+            hash_verifier=kwargs.get('hash_verifier'), bucket=bucket,
+            version=version, parent=self)
+        if not abortSignal is None:
+            abortSignal.connect(download.abort)
+        download.start()
+
     def __download_readyRead(self, *args, **kwargs):
         """ callback for a reply object to indicate that data is ready to be
         written to a buffer. """
 
-        reply = self.sender()
+        # Throttled downloads are read from a timer, so use the handle of the
+        # request rather than the sender
+        reply = kwargs.get('_reply_handle') or self.sender()
         data = reply.readAll()
+        # Skip the body of redirect and error responses
+        status = reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        if status in REDIRECT_STATUSES or (status or 0) >= 400:
+            return
         if not 'tmp_file' in kwargs or not isinstance(kwargs['tmp_file'], QtCore.QTemporaryFile):
             raise AttributeError('Missing file handle to write to')
-        kwargs['tmp_file'].write(data)
+        if 'hash_verifier' in kwargs:
+            kwargs['hash_verifier'].update(data)
+        if not kwargs['write_buffer'].write(data):
+            self.error_message.emit(
+                _("Error saving file"),
+                _("Could not write to {}").format(kwargs['tmp_file'].fileName())
+            )
+            reply.abort()
 
     def __download_finished(self, reply, *args, **kwargs):
         """ Callback for a reply object of a GET request, indicating that all
@@ -953,33 +2495,164 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
             raise AttributeError(
                 "No valid reference to temp file where data was saved")
 
-        kwargs['tmp_file'].close()
-        # If a file with the same name already exists at the location, try to
-        # delete it.
-        if QtCore.QFile.exists(kwargs['destination']):
-            if not QtCore.QFile.remove(kwargs['destination']):
-                # If the destination file could not be deleted, notify the user
-                # of this and stop the operation
-                self.error_message.emit(
-                    _("Error saving file"),
-                    _("Could not replace {}").format(kwargs['destination'])
-                )
-                return
-        # Copy the temp file to its destination
-        if not kwargs['tmp_file'].copy(kwargs['destination']):
-            self.error_message.emit(
-                _("Error saving file"),
-                _("Could not save file to {}").format(kwargs['destination'])
-            )
+        tmp_file = kwargs['tmp_file']
+        # Write the data that is still in the buffer
+        write_buffer = kwargs.pop('write_buffer', None)
+        if not write_buffer is None and not write_buffer.flush():
+            tmp_file.close()
+            self.__transfer_failed(
+                reply, reply.url(), _("Error saving file"),
+                _("Could not write to {}").format(tmp_file.fileName()),
+                *args, **kwargs)
             return
-
+        tmp_file.close()
+        if not self.__verify_download(reply, *args, **kwargs):
+            return
+        # Move the temp file to its destination, replacing any file with the
+        # same name. The temp file is in the same folder, so this does not
+        # involve copying.
+        try:
+            replace_file(tmp_file.fileName(), kwargs['destination'])
+        except OSError as e:
+            self.__transfer_failed(
+                reply, reply.url(), _("Error saving file"),
+                _("Could not save file to {}: {}").format(
+                    kwargs['destination'], e),
+                *args, **kwargs)
+            return
+        # The file no longer exists under the temporary name
+        tmp_file.setAutoRemove(False)
+        self.__remember_hash(kwargs['destination'], kwargs.pop('hash_verifier',
+                                                               None))
+        kwargs.pop('_download_error_callback', None)
         fcb = kwargs.pop('finishedCallback', None)
         if callable(fcb):
             fcb(reply, *args, **kwargs)
 
+    def __verify_download(self, reply, *args, **kwargs):
+        """ Checks the hash of a downloaded file, if expected hashes were
+        passed to download_file(). If the hash does not match, the error
+        callback of the download is called.
+
+        Returns
+        -------
+        bool
+                False if the hash does not match, True otherwise
+        """
+        verifier = kwargs.pop('hash_verifier', None)
+        if verifier is None or verifier.verify():
+            return True
+
+        message = _("The downloaded data of {} is corrupt ({}). The file has "
+                    "not been saved.").format(
+            os.path.basename(kwargs['destination']),
+            verifier.describe_mismatch())
+        logger.error(message)
+        reply.set_error(QtNetwork.QNetworkReply.UnknownContentError, message)
+        self.error_message.emit(_("Checksum mismatch"), message)
+        errorCallback = kwargs.pop('_download_error_callback', None)
+        if callable(errorCallback):
+            errorCallback(reply, *args, **kwargs)
+        return False
+
+    def __transfer_failed(self, reply, url, title, message, *args, **kwargs):
+        """ Reports a download or upload that failed because of a local
+        problem, such as a file that can not be read or written. Just like for
+        transfers that fail on the network, the errorCallback of the transfer
+        is called, so that callers that wait for it (such as a FolderDownload)
+        learn that it is over. The reply that is passed to the errorCallback
+        reports an UnknownContentError with message as errorString().
+
+        Parameters
+        ----------
+        reply : scheduler.ReplyHandle
+                The reply of the transfer, or None if no request has been sent
+                yet. In that case, a reply is created, and the errorCallback is
+                called asynchronously, just like for a network reply.
+        url : string / QtCore.QUrl
+                The url of the transfer
+        title : string
+                The title of the error message
+        message : string
+                The description of the error
+        """
+        logger.error(message)
+        self.error_message.emit(title, message)
+        progressDialog = kwargs.pop('progressDialog', None)
+        if isinstance(progressDialog, QtWidgets.QWidget):
+            progressDialog.deleteLater()
+        self.__close_file_handles(*args, **kwargs)
+        kwargs.pop('hash_verifier', None)
+        kwargs.pop('_transfer_priority', None)
+        errorCallback = kwargs.pop('_download_error_callback', None) or \
+            kwargs.get('errorCallback', None)
+        self.__pop_request_kwargs(kwargs)
+
+        if not reply is None:
+            reply.set_error(QtNetwork.QNetworkReply.UnknownContentError,
+                            message)
+            if callable(errorCallback):
+                errorCallback(reply, *args, **kwargs)
+            return
+
+        reply = BufferedReply(url, status=None)
+        reply.set_error(QtNetwork.QNetworkReply.UnknownContentError, message)
+
+        # Deliver the error asynchronously, just like a network reply would be
+        def deliver():
+            if callable(errorCallback):
+                errorCallback(reply, *args, **kwargs)
+            reply.deleteLater()
+        QtCore.QTimer.singleShot(0, deliver)
+
+    def __notify_failure(self, reply):
+        """ Shows the error message for a segmented download or chunked
+        upload that failed for good. Its requests do not show messages
+        themselves (see the notify keyword of get()), as failed segments and
+        chunks are retried. """
+        if reply is None or reply.error() in [
+                reply.NoError, reply.OperationCanceledError,
+                reply.AuthenticationRequiredError]:
+            return
+        self.error_message.emit(
+            str(reply.attribute(
+                QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)),
+            reply.errorString())
+
+    def __remember_hash(self, destination, verifier):
+        """ Stores the hash that was computed while a file was downloaded,
+        so the file does not have to be hashed to check if it is identical to
+        the file on the OSF. """
+        if verifier:
+            self.hash_cache.store(destination, verifier.algorithm,
+                                  verifier.digest)
+
+    def __download_skipped(self, url, destination, *args, **kwargs):
+        """ Called by download_file() instead of downloading a file that is
+        identical to the destination. Calls the finishedCallback with a reply
+        that has status 304 (Not Modified). """
+        logger.info("{} is identical to the file on the OSF; skipping "
+                    "download".format(destination))
+        for key in ['progressDialog', 'segments', 'filesize', 'resumable',
+                    'transferRate', 'expectedHashes']:
+            kwargs.pop(key, None)
+        kwargs['destination'] = destination
+        fcb = kwargs.pop('finishedCallback', None)
+        reply = BufferedReply(url, status=304)
+
+        # Deliver the result asynchronously, just like a network reply would be
+        def deliver():
+            self.__pop_request_kwargs(kwargs)
+            if callable(fcb):
+                fcb(reply, *args, **kwargs)
+            reply.deleteLater()
+        QtCore.QTimer.singleShot(0, deliver)
+
     def __upload(self, reply, upload_url, source_file, *args, **kwargs):
         """ Callback for get_logged_in_user() in upload_file(). Does the real
-        uploading. """
+        uploading. Is called directly (with reply set to None) if the OAuth2
+        token is known to be valid. """
+        self.__restore_transfer_kwargs(kwargs)
         # Put checks for the url to be a string or QUrl
         # Check source file
         if isinstance(source_file, basestring):
@@ -988,17 +2661,23 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
             # show a message box, but do not raise an exception, because we don't want this
             # to completely crash our program.
             if not os.path.isfile(os.path.abspath(source_file)):
-                self.error_message.emit(
-                    _("{} is not a valid source file").format(source_file))
+                self.__transfer_failed(
+                    None, upload_url, _("Error reading file"),
+                    _("{} is not a valid source file").format(source_file),
+                    *args, **kwargs)
                 return
-
-            # Open source file for reading
-            source_file = QtCore.QFile(source_file)
         elif not isinstance(source_file, QtCore.QIODevice):
-            self.error_message.emit(
-                _("{} is not a string or QIODevice instance").format(source_file))
+            self.__transfer_failed(
+                None, upload_url, _("Error reading file"),
+                _("{} is not a string or QIODevice instance").format(
+                    source_file),
+                *args, **kwargs)
             return
 
+        transferRate = kwargs.pop('transferRate', None)
+        bandwidth_limit = kwargs.pop('bandwidth_limit', None)
+        if bandwidth_limit:
+            kwargs['_bucket'] = TokenBucket(bandwidth_limit)
         progressDialog = kwargs.pop('progressDialog', None)
         if isinstance(progressDialog, dict):
             try:
@@ -1009,12 +2688,78 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
                 raise KeyError("progressDialog is missing field {}".format(e))
             progress_indicator = self.__create_progress_dialog(text, size)
             kwargs['progressDialog'] = progress_indicator
-            kwargs['uploadProgress'] = self.__transfer_progress
+            kwargs['uploadProgress'] = self.__progress_reporter(
+                progress_indicator, text, kwargs.get('uploadProgress'),
+                transferRate)
+        elif callable(transferRate):
+            kwargs['uploadProgress'] = self.__progress_reporter(
+                progress=kwargs.get('uploadProgress'),
+                transferRate=transferRate)
+
+        kwargs['priority'] = kwargs.pop('_transfer_priority', BULK)
+        chunk_size = kwargs.pop('chunk_size', None)
+        if chunk_size and isinstance(source_file, basestring):
+            self.__upload_chunked(upload_url, source_file, chunk_size,
+                                  *args, **kwargs)
+            return
 
+        if isinstance(source_file, basestring):
+            # Open source file for reading
+            source_file = QtCore.QFile(source_file)
         source_file.open(QtCore.QIODevice.ReadOnly)
         self.put(upload_url, self.__upload_finished, data_to_send=source_file,
                  *args, **kwargs)
 
+    def __upload_chunked(self, upload_url, source_file, chunk_size, *args,
+                         **kwargs):
+        """ Uploads a file in chunks. Called by __upload() if chunk_size is
+        set. """
+        progressDialog = kwargs.get('progressDialog', None)
+        uploadProgress = kwargs.get('uploadProgress', None)
+        errorCallback = kwargs.get('errorCallback', None)
+        abortSignal = kwargs.get('abortSignal', None)
+        priority = kwargs.get('priority')
+        bucket = kwargs.get('_bucket')
+        self.__pop_request_kwargs(kwargs)
+
+        # The state of the upload session is stored under a name that is
+        # derived from the upload url and the source file
+        if isinstance(upload_url, QtCore.QUrl):
+            upload_url = safe_decode(upload_url.toString())
+        key = u'{}\n{}'.format(upload_url, os.path.abspath(source_file))
+        if not os.path.isdir(self.upload_state_dir):
+            os.makedirs(self.upload_state_dir)
+        state_file = os.path.join(
+            self.upload_state_dir,
+            hashlib.sha1(safe_encode(key)).hexdigest() + '.json')
+
+        def finished(reply):
+            upload.deleteLater()
+            progressDialog = kwargs.pop('progressDialog', None)
+            if isinstance(progressDialog, QtWidgets.QWidget):
+                progressDialog.deleteLater()
+            fcb = kwargs.pop('finishedCallback', None)
+            if callable(fcb):
+                fcb(reply, *args, **kwargs)
+
+        def failed(reply):
+            upload.deleteLater()
+            progressDialog = kwargs.pop('progressDialog', None)
+            if isinstance(progressDialog, QtWidgets.QWidget):
+                progressDialog.deleteLater()
+            self.__notify_failure(reply)
+            if callable(errorCallback):
+                errorCallback(reply, *args, **kwargs)
+
+        upload = ChunkedUpload(
+            self, upload_url, source_file, state_file, finished, failed,
+            progress=uploadProgress, progressDialog=progressDialog,
+            chunk_size=chunk_size, priority=priority, bucket=bucket,
+            parent=self)
+        if not abortSignal is None:
+            abortSignal.connect(upload.abort)
+        upload.start()
+
     def __upload_finished(self, reply, *args, **kwargs):
         """ Callback for the reply object of a PUT request, indicating that all
         data has been sent. """
@@ -1040,6 +2785,11 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
         tmp_file = kwargs.pop('tmp_file', None)
         if isinstance(tmp_file, QtCore.QIODevice):
             tmp_file.close()
+        # Keep the data of resumable downloads, so they can continue from
+        # there the next time
+        partial_download = kwargs.pop('partial_download', None)
+        if isinstance(partial_download, PartialDownload):
+            partial_download.keep()
         # File uploads are stored in data_to_send
         data_to_send = kwargs.pop('data_to_send', None)
         if isinstance(data_to_send, QtCore.QIODevice):
@@ -1049,11 +2799,22 @@ class ConnectionManager(QtNetwork.QNetworkAccessManager):
 
     def handle_login(self):
         """ Handles the login event received after login. """
+        # Open the connections that the requests of the user will need, so
+        # that the first of them do not have to wait for a TLS handshake
+        self.prewarm()
         self.get_logged_in_user(self.set_logged_in_user)
+        # Keep the connections to the OSF open while the user is logged in
+        if self.keep_warm_timer.interval() > 0:
+            self.keep_warm_timer.start()
 
     def handle_logout(self):
         """ Handles the logout event received after a logout. """
         self.logged_in_user = {}
+        self.keep_warm_timer.stop()
+        self.memory_cache.clear()
+        # Cached responses contain the data of the user that just logged out
+        if not self.disk_cache is None:
+            self.disk_cache.clear()
 
     def set_logged_in_user(self, user_data):
         """ Callback function, not to be called directly.
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Policies for repeating requests that failed because of a temporary problem.
+
+The ConnectionManager consults a RetryPolicy whenever a request fails. If the
+policy considers the failure transient (the connection was reset, the request
+timed out, or the server responded with 429 Too Many Requests or a 5xx error),
+and the request can safely be repeated, the request is sent again after a
+delay. The delay grows exponentially with each attempt, and is randomized
+(jitter) so that many requests that failed at the same moment do not all
+return at the same moment either. If the server sent a Retry-After header, the
+request is not repeated before the time it specifies.
+"""
+
+# Python3 compatibility
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from QOpenScienceFramework.compat import *
+from QOpenScienceFramework.clientbase import parse_retry_after
+from qtpy import QtNetwork
+
+import logging
+import random
+logger = logging.getLogger()
+
+_Reply = QtNetwork.QNetworkReply
+_Manager = QtNetwork.QNetworkAccessManager
+
+
+class RetryPolicy(object):
+    """ Determines if, and after how long, a failed request is repeated. """
+
+    # HTTP status codes that indicate a temporary problem at the server
+    RETRY_STATUSES = [429, 500, 502, 503, 504]
+    # Network errors that indicate a temporary problem with the connection
+    RETRY_ERRORS = [
+        _Reply.ConnectionRefusedError,
+        _Reply.RemoteHostClosedError,
+        _Reply.TimeoutError,
+        _Reply.TemporaryNetworkFailureError,
+        _Reply.NetworkSessionFailedError,
+        _Reply.ProxyConnectionClosedError,
+        _Reply.ProxyTimeoutError,
+        _Reply.UnknownNetworkError,
+    ]
+    # Operations that have the same effect when they are performed twice.
+    # POST requests are never repeated by default.
+    IDEMPOTENT_OPERATIONS = [
+        _Manager.HeadOperation,
+        _Manager.GetOperation,
+        _Manager.PutOperation,
+        _Manager.DeleteOperation,
+    ]
+
+    def __init__(self, max_retries=3, backoff=1.0, max_delay=60.0,
+                 jitter=True, max_retry_after=300.0, statuses=None,
+                 errors=None, operations=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        max_retries : int (default: 3)
+                The maximum number of times a request is repeated.
+        backoff : float (default: 1.0)
+                The delay in seconds before the first retry. The delay is
+                doubled for each next retry.
+        max_delay : float (default: 60.0)
+                The maximum delay in seconds, not counting Retry-After.
+        jitter : bool (default: True)
+                Randomize each delay between half and the full value.
+        max_retry_after : float (default: 300.0)
+                The maximum number of seconds to honor a Retry-After header
+                for. If the server asks to wait longer, the request is not
+                repeated.
+        statuses : list (default: RetryPolicy.RETRY_STATUSES)
+                The HTTP status codes for which requests are repeated.
+        errors : list (default: RetryPolicy.RETRY_ERRORS)
+                The QNetworkReply errors for which requests are repeated.
+        operations : list (default: RetryPolicy.IDEMPOTENT_OPERATIONS)
+                The QNetworkAccessManager operations that may be repeated.
+        """
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.max_retry_after = max_retry_after
+        self.statuses = self.RETRY_STATUSES if statuses is None else statuses
+        self.errors = self.RETRY_ERRORS if errors is None else errors
+        self.operations = self.IDEMPOTENT_OPERATIONS if operations is None \
+            else operations
+
+    # Private functions
+
+    def __retry_after(self, reply):
+        """ Returns the number of seconds in the Retry-After header of the
+        reply, or None if there is no (valid) header. The header contains
+        either a number of seconds or a date. """
+        if not reply.hasRawHeader(b'Retry-After'):
+            return None
+        return parse_retry_after(
+            safe_decode(reply.rawHeader(b'Retry-After').data()))
+
+    # Public functions
+
+    def should_retry(self, reply, attempt):
+        """ Checks if a failed request should be repeated.
+
+        Parameters
+        ----------
+        reply : QtNetwork.QNetworkReply
+                The reply of the failed request
+        attempt : int
+                The number of times the request has been repeated already
+
+        Returns
+        -------
+        bool
+        """
+        if attempt >= self.max_retries or \
+                not reply.operation() in self.operations:
+            return False
+        status = reply.attribute(
+            QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        if not status in self.statuses and not reply.error() in self.errors:
+            return False
+        retry_after = self.__retry_after(reply)
+        return retry_after is None or retry_after <= self.max_retry_after
+
+    def delay(self, reply, attempt):
+        """ Returns the number of seconds to wait before a request is repeated.
+
+        Parameters
+        ----------
+        reply : QtNetwork.QNetworkReply
+                The reply of the failed request
+        attempt : int
+                The number of times the request has been repeated already
+
+        Returns
+        -------
+        float
+        """
+        retry_after = self.__retry_after(reply)
+        if not retry_after is None:
+            return retry_after
+        delay = min(self.max_delay, self.backoff * 2 ** attempt)
+        if self.jitter:
+            delay = random.uniform(delay / 2, delay)
+        return delay
@@ -0,0 +1,589 @@
+# -*- coding: utf-8 -*-
+"""
+Scheduling of the HTTP requests made by the ConnectionManager.
+
+Every request belongs to a priority class, each of which has its own limit on
+the number of requests that may be underway at the same time. Requests that
+exceed the limit of their class wait in a queue until another request of the
+same class finishes. This prevents, for instance, a recursive crawl of the
+project tree from delaying the image preview that the user just clicked on.
+
+The priority classes are, from highest to lowest priority:
+
+- interactive : requests that result from a direct action of the user
+- tree : listings for projects and folders the user expands in the tree
+- prefetch : listings that are retrieved in the background
+- bulk : file transfers
+
+Next to that, the number of requests to the same host is limited, because Qt
+opens no more than six connections per host; requests beyond that would only
+wait inside Qt, where they can no longer be prioritized or cancelled. One of
+these connections is kept free for interactive requests.
+"""
+
+# Python3 compatibility
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from QOpenScienceFramework.compat import *
+from qtpy import QtCore, QtNetwork
+
+from collections import OrderedDict, deque
+import logging
+logger = logging.getLogger()
+
+INTERACTIVE = 'interactive'
+TREE = 'tree'
+PREFETCH = 'prefetch'
+BULK = 'bulk'
+
+# The priority of the requests of each class within Qt's own per-host queue
+request_priorities = {
+    INTERACTIVE: QtNetwork.QNetworkRequest.HighPriority,
+    TREE: QtNetwork.QNetworkRequest.NormalPriority,
+    PREFETCH: QtNetwork.QNetworkRequest.LowPriority,
+    BULK: QtNetwork.QNetworkRequest.LowPriority,
+}
+
+
+class ReplyHandle(QtCore.QObject):
+    """ Stands in for the QNetworkReply of a scheduled request.
+
+    The handle is returned as soon as a request is scheduled, and remains valid
+    if the request has to wait in the queue, or is redirected to another url.
+    Once the request is sent, all QNetworkReply functions are forwarded to the
+    reply that is currently handling it. Callbacks of the ConnectionManager
+    receive the same handle that was returned when the request was made. """
+
+    # Error codes, so they can be referenced as reply.NoError etc. just like
+    # with a real QNetworkReply
+    NoError = QtNetwork.QNetworkReply.NoError
+    OperationCanceledError = QtNetwork.QNetworkReply.OperationCanceledError
+    AuthenticationRequiredError = \
+        QtNetwork.QNetworkReply.AuthenticationRequiredError
+
+    _reply = None
+    # The number of times the request has been repeated after a transient
+    # failure (see retry.RetryPolicy)
+    retry_count = 0
+
+    def __init__(self, request, operation, scheduler, parent=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        request : QtNetwork.QNetworkRequest
+                The request that is scheduled
+        operation : QtNetwork.QNetworkAccessManager.Operation
+                The HTTP operation of the request
+        scheduler : RequestScheduler
+                The scheduler that is in charge of the request
+        parent : QtCore.QObject (default: None)
+                The parent object of the handle
+        """
+        super(ReplyHandle, self).__init__(parent)
+        self._request = request
+        self._operation = operation
+        self._scheduler = scheduler
+        self._error = self.NoError
+        self._error_string = ''
+
+    def __getattr__(self, name):
+        """ Forwards everything that is not implemented by the handle itself to
+        the QNetworkReply. """
+        if self._reply is None:
+            raise AttributeError("'{}' is not available before the request has "
+                                 "been sent".format(name))
+        return getattr(self._reply, name)
+
+    @property
+    def reply(self):
+        """ The QNetworkReply that currently handles the request, or None if
+        the request has not been sent yet. """
+        return self._reply
+
+    def attach(self, reply):
+        """ Sets the QNetworkReply that handles the request from now on.
+
+        Parameters
+        ----------
+        reply : QtNetwork.QNetworkReply
+                The reply for the request that was just sent
+        """
+        self._reply = reply
+        self._request = reply.request()
+
+    def detach(self):
+        """ Lets go of the reply of a request that failed and is repeated after
+        a delay. The reply is deleted, and until the request is sent again,
+        the handle behaves like that of a request that waits in the queue. """
+        self._reply = None
+
+    def set_error(self, code, message):
+        """ Marks a request that never got sent as failed.
+
+        Parameters
+        ----------
+        code : QtNetwork.QNetworkReply.NetworkError
+                The error code
+        message : str
+                A description of the error
+        """
+        self._reply = None
+        self._error = code
+        self._error_string = message
+
+    # QNetworkReply functions that should also work before the request is
+    # sent, or while it waits to be repeated
+
+    def request(self):
+        return self._request
+
+    def url(self):
+        return self._request.url()
+
+    def operation(self):
+        return self._operation
+
+    def error(self):
+        if self._reply is None:
+            return self._error
+        # A reply that was aborted by its watchdog reports a cancellation
+        if self._reply.property('timedOut'):
+            return QtNetwork.QNetworkReply.TimeoutError
+        return self._reply.error()
+
+    def errorString(self):
+        if self._reply is None:
+            return self._error_string
+        if self._reply.property('timedOut'):
+            return self._reply.property('timedOut')
+        return self._reply.errorString()
+
+    def isFinished(self):
+        if self._reply is None:
+            return self._error != self.NoError
+        return self._reply.isFinished()
+
+    def isRunning(self):
+        return not self.isFinished()
+
+    def attribute(self, code):
+        if self._reply is None:
+            return None
+        return self._reply.attribute(code)
+
+    def hasRawHeader(self, name):
+        if self._reply is None:
+            return False
+        return self._reply.hasRawHeader(name)
+
+    def rawHeader(self, name):
+        if self._reply is None:
+            return QtCore.QByteArray()
+        return self._reply.rawHeader(name)
+
+    def bytesAvailable(self):
+        if self._reply is None:
+            return 0
+        return self._reply.bytesAvailable()
+
+    def readAll(self):
+        if self._reply is None:
+            return QtCore.QByteArray()
+        return self._reply.readAll()
+
+    def abort(self):
+        """ Aborts the request. A request that is still waiting in the queue, or
+        waiting to be repeated, is removed from it. Does nothing if the request
+        has already finished. """
+        if self._scheduler.remove(self):
+            return
+        if self._scheduler.is_active(self._reply):
+            self._reply.abort()
+
+
+class ReplyWatchdog(QtCore.QObject):
+    """ Aborts a reply that takes too long. There are two limits: a deadline for
+    the request as a whole, and an idle timeout for the time during which no
+    data is sent or received. When the request body has been sent completely,
+    the server may need some time to process it before it responds; the
+    processing timeout then takes the place of the idle timeout.
+
+    A reply that times out is marked with the 'timedOut' property, which holds
+    a description of the timeout. The ReplyHandle reports such a reply as
+    failed with a TimeoutError, instead of as cancelled. """
+
+    def __init__(self, reply, timeout=None, idle_timeout=None,
+                 processing_timeout=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        reply : QtNetwork.QNetworkReply
+                The reply to watch. The watchdog is destroyed together with
+                the reply.
+        timeout : float (default: None)
+                The maximum number of seconds the request may take. If None,
+                there is no deadline.
+        idle_timeout : float (default: None)
+                The maximum number of seconds during which no data is sent or
+                received. If None, there is no idle timeout.
+        processing_timeout : float (default: None)
+                The maximum number of seconds to wait for the response after the
+                request body has been sent. If None, the idle timeout is used.
+        """
+        super(ReplyWatchdog, self).__init__(reply)
+        self.reply = reply
+        self.idle_timeout = idle_timeout
+        self.processing_timeout = processing_timeout
+        self.deadline_timer = QtCore.QTimer(self)
+        self.deadline_timer.setSingleShot(True)
+        self.deadline_timer.timeout.connect(
+            lambda: self.__expire("The request did not finish within {:g} "
+                                  "seconds".format(timeout)))
+        self.idle_timer = QtCore.QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.timeout.connect(self.__idle_expired)
+        if timeout:
+            self.deadline_timer.start(int(timeout * 1000))
+        self.__restart_idle_timer(idle_timeout)
+        reply.downloadProgress.connect(self.__download_progress)
+        reply.uploadProgress.connect(self.__upload_progress)
+        reply.finished.connect(self.stop)
+
+    # Private functions
+
+    def __restart_idle_timer(self, interval):
+        if interval:
+            self.idle_timer.start(int(interval * 1000))
+        else:
+            self.idle_timer.stop()
+
+    def __download_progress(self, received, total):
+        self.__restart_idle_timer(self.idle_timeout)
+
+    def __upload_progress(self, sent, total):
+        if sent > 0 and sent == total and self.processing_timeout:
+            self.__restart_idle_timer(
+                max(self.processing_timeout, self.idle_timeout or 0))
+        else:
+            self.__restart_idle_timer(self.idle_timeout)
+
+    def __idle_expired(self):
+        self.__expire("No data was transferred for {:g} seconds".format(
+            self.idle_timer.interval() / 1000))
+
+    def __expire(self, message):
+        if self.reply.isFinished():
+            return
+        logger.warning("{}: {}".format(
+            safe_decode(self.reply.url().toString()), message))
+        self.reply.setProperty('timedOut', message)
+        self.reply.abort()
+
+    # Public functions
+
+    def stop(self):
+        """ Stops both timers. """
+        self.deadline_timer.stop()
+        self.idle_timer.stop()
+
+
+class RequestScheduler(QtCore.QObject):
+    """ Limits the number of simultaneous requests per priority class, and per
+    host. """
+
+    # The default maximum number of requests of each class that may be
+    # underway at the same time.
+    DEFAULT_LIMITS = OrderedDict([
+        (INTERACTIVE, 6),
+        (TREE, 4),
+        (PREFETCH, 2),
+        (BULK, 3),
+    ])
+    # The default maximum number of requests to the same host that may be
+    # underway at the same time. This is the number of connections Qt opens
+    # per host.
+    DEFAULT_HOST_LIMIT = 6
+    # The number of requests per host that is reserved for the interactive
+    # class, so that a user action never waits behind a background crawl of
+    # the tree classes, which together could otherwise use all connections.
+    INTERACTIVE_HOST_RESERVE = 1
+
+    def __init__(self, limits=None, host_limit=None, parent=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        limits : dict (default: None)
+                The maximum number of simultaneous requests for one or more
+                priority classes. Classes that are not specified use the value in
+                RequestScheduler.DEFAULT_LIMITS.
+        host_limit : int (default: None)
+                The maximum number of simultaneous requests to the same host. If
+                None, RequestScheduler.DEFAULT_HOST_LIMIT is used.
+        parent : QtCore.QObject (default: None)
+                The parent object of the scheduler
+        """
+        super(RequestScheduler, self).__init__(parent)
+        self.limits = OrderedDict(self.DEFAULT_LIMITS)
+        self.host_limit = self.DEFAULT_HOST_LIMIT
+        # Requests waiting to be sent per class, as tuples of
+        # (handle, send function, cancel function, host)
+        self._queues = dict((priority, deque()) for priority in self.limits)
+        # The replies of the requests that are underway per class
+        self._active = dict((priority, set()) for priority in self.limits)
+        # The hosts of the requests that are underway, by reply
+        self._hosts = {}
+        # Requests that will be submitted again after a delay, by handle, as
+        # tuples of (timer, priority, send function, cancel function, host)
+        self._delayed = {}
+        self._pump_scheduled = False
+        for priority, limit in (limits or {}).items():
+            self.set_limit(priority, limit)
+        if not host_limit is None:
+            self.set_host_limit(host_limit)
+
+    # Private functions
+
+    def __check_priority(self, priority):
+        if not priority in self.limits:
+            raise ValueError("Unknown priority class '{}'. Should be one of "
+                             "{}".format(priority, list(self.limits.keys())))
+
+    def __send(self, priority, handle, send, host):
+        """ Sends a request and registers its reply as active. """
+        reply = send()
+        handle.attach(reply)
+        self._active[priority].add(reply)
+        self._hosts[reply] = host
+
+    def __host_available(self, host, priority):
+        """ Checks if another request of a class may be sent to a host. The
+        other classes leave INTERACTIVE_HOST_RESERVE requests free for the
+        interactive class, unless the host limit is too low for that. """
+        limit = self.host_limit
+        if priority != INTERACTIVE:
+            limit = max(1, limit - self.INTERACTIVE_HOST_RESERVE)
+        return list(self._hosts.values()).count(host) < limit
+
+    def __schedule_pump(self):
+        """ Sends queued requests in the next iteration of the event loop. This
+        gives a request that is redirected or repeated the opportunity to take
+        the place of the reply that just finished. """
+        if not self._pump_scheduled:
+            self._pump_scheduled = True
+            QtCore.QTimer.singleShot(0, self.__pump)
+
+    def __pump(self):
+        """ Sends queued requests for as far as the limits allow. """
+        self._pump_scheduled = False
+        for priority in self.limits:
+            queue = self._queues[priority]
+            # Requests to a host that is busy do not hold up the requests to
+            # other hosts
+            for entry in list(queue):
+                if len(self._active[priority]) >= self.limits[priority]:
+                    break
+                handle, send, _, host = entry
+                if self.__host_available(host, priority):
+                    queue.remove(entry)
+                    self.__send(priority, handle, send, host)
+
+    # Public functions
+
+    def set_limit(self, priority, limit):
+        """ Sets the maximum number of requests of a class that may be underway
+        at the same time.
+
+        Parameters
+        ----------
+        priority : str
+                The priority class
+        limit : int
+                The maximum number of simultaneous requests (at least 1)
+        """
+        self.__check_priority(priority)
+        self.limits[priority] = max(1, int(limit))
+        self.__schedule_pump()
+
+    def set_host_limit(self, limit):
+        """ Sets the maximum number of requests to the same host that may be
+        underway at the same time. Qt does not open more than six connections
+        per host, so higher values have no effect.
+
+        Parameters
+        ----------
+        limit : int
+                The maximum number of simultaneous requests (at least 1)
+        """
+        self.host_limit = max(1, int(limit))
+        self.__schedule_pump()
+
+    def submit(self, priority, handle, send, cancel, urgent=False, host=None):
+        """ Sends a request, or queues it if the limit of its class has been
+        reached.
+
+        Parameters
+        ----------
+        priority : str
+                The priority class of the request
+        handle : ReplyHandle
+                The handle that represents the request
+        send : callable
+                Function that sends the request and returns its QNetworkReply
+        cancel : callable
+                Function that is called if the request is cancelled while it is
+                still waiting in the queue.
+        urgent : bool (default: False)
+                Place the request at the front of the queue. Used for requests
+                that continue a request that was already underway, such as
+                redirects.
+        host : str (default: None)
+                The host the request is sent to. If None, the host of the
+                handle's request is used.
+        """
+        self.__check_priority(priority)
+        if host is None:
+            host = handle.url().host()
+        if len(self._active[priority]) < self.limits[priority] and \
+                self.__host_available(host, priority):
+            self.__send(priority, handle, send, host)
+        elif urgent:
+            self._queues[priority].appendleft((handle, send, cancel, host))
+        else:
+            self._queues[priority].append((handle, send, cancel, host))
+
+    def submit_later(self, delay, priority, handle, send, cancel, host=None):
+        """ Submits a request after a delay, at the front of the queue. Used to
+        repeat a request that failed.
+
+        Parameters
+        ----------
+        delay : float
+                The number of seconds to wait
+        priority : str
+                The priority class of the request
+        handle : ReplyHandle
+                The handle that represents the request
+        send : callable
+                Function that sends the request and returns its QNetworkReply
+        cancel : callable
+                Function that is called if the request is cancelled while it is
+                waiting.
+        host : str (default: None)
+                The host the request is sent to (see submit())
+        """
+        self.__check_priority(priority)
+        timer = QtCore.QTimer(self)
+        timer.setSingleShot(True)
+        timer.timeout.connect(lambda: self.__submit_delayed(handle))
+        self._delayed[handle] = (timer, priority, send, cancel, host)
+        timer.start(int(delay * 1000))
+
+    def __submit_delayed(self, handle):
+        entry = self._delayed.pop(handle, None)
+        if entry is None:
+            return
+        timer, priority, send, cancel, host = entry
+        timer.deleteLater()
+        self.submit(priority, handle, send, cancel, urgent=True, host=host)
+
+    def finished(self, reply):
+        """ Notifies the scheduler that a request has finished, so the next one
+        in its class can be sent.
+
+        Parameters
+        ----------
+        reply : QtNetwork.QNetworkReply
+                The reply that finished
+        """
+        self._hosts.pop(reply, None)
+        for active in self._active.values():
+            if reply in active:
+                active.discard(reply)
+                self.__schedule_pump()
+                return
+
+    def is_active(self, reply):
+        """ Checks if a reply belongs to a request that is underway.
+
+        Parameters
+        ----------
+        reply : QtNetwork.QNetworkReply
+                The reply to check
+
+        Returns
+        -------
+        bool
+                True if the reply has been sent and has not finished yet
+        """
+        return any(reply in active for active in self._active.values())
+
+    def remove(self, handle):
+        """ Removes a request from the queue, and calls its cancel function.
+
+        Parameters
+        ----------
+        handle : ReplyHandle
+                The handle of the request to remove
+
+        Returns
+        -------
+        bool
+                True if the request was found in the queue, False if not
+        """
+        for queue in self._queues.values():
+            for entry in queue:
+                if entry[0] is handle:
+                    queue.remove(entry)
+                    entry[2]()
+                    return True
+        entry = self._delayed.pop(handle, None)
+        if not entry is None:
+            timer, _, _, cancel, _ = entry
+            timer.stop()
+            timer.deleteLater()
+            cancel()
+            return True
+        return False
+
+    def cancel(self, priority=None):
+        """ Cancels all requests of a priority class: queued requests are removed
+        and requests that are underway are aborted.
+
+        Parameters
+        ----------
+        priority : str (default: None)
+                The class to cancel. If None, the requests of all classes are
+                cancelled.
+        """
+        if priority is None:
+            priorities = list(self.limits.keys())
+        else:
+            self.__check_priority(priority)
+            priorities = [priority]
+
+        for priority in priorities:
+            queue = self._queues[priority]
+            while queue:
+                _, _, cancel, _ = queue.popleft()
+                cancel()
+            for handle, entry in list(self._delayed.items()):
+                if entry[1] == priority:
+                    self.remove(handle)
+            for reply in list(self._active[priority]):
+                reply.abort()
+
+    def queued(self, priority):
+        """ Returns the number of requests of a class that are waiting. """
+        self.__check_priority(priority)
+        return len(self._queues[priority])
+
+    def active(self, priority):
+        """ Returns the number of requests of a class that are underway. """
+        self.__check_priority(priority)
+        return len(self._active[priority])
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Bandwidth limits for transfers.
+
+A TokenBucket allows a certain number of bytes per second, with short bursts.
+The ConnectionManager has buckets for all transfers, for the transfers of
+each priority class, and optionally one for a single transfer. A transfer is
+only allowed to proceed when all of the buckets that apply to it have tokens
+left.
+
+Downloads are limited on the read path: a ThrottledReader only passes the data
+of a reply on when the buckets allow it. The reply meanwhile holds at most a
+small amount of data in memory, after which Qt stops reading from the socket,
+so the sender is slowed down by TCP flow control. Uploads are limited on the
+write path: a ThrottledDevice hands the data of the file to Qt no faster than
+the buckets allow.
+"""
+
+# Python3 compatibility
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from qtpy import QtCore
+
+import logging
+import time
+logger = logging.getLogger()
+
+# The smallest read buffer a throttled reply gets, in bytes
+MIN_READ_BUFFER_SIZE = 16*1024
+# The maximum number of bytes a ThrottledDevice hands over at once
+MAX_CHUNK_SIZE = 64*1024
+
+
+class TokenBucket(object):
+    """ Limits a data stream to an average number of bytes per second. The
+    bucket fills up with tokens at the rate of the limit, up to the burst size.
+    Transferring data takes tokens from the bucket, which may go below zero;
+    the next transfer then has to wait until the bucket is no longer empty. """
+
+    def __init__(self, rate, burst=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        rate : float
+                The maximum average number of bytes per second
+        burst : float (default: None)
+                The maximum number of bytes that may be transferred at once after
+                a pause. If None, this is the number of bytes per second.
+        """
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.tokens = self.burst
+        self._updated = time.time()
+
+    def __refill(self):
+        now = time.time()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def consume(self, size):
+        """ Takes the tokens for an amount of transferred data.
+
+        Parameters
+        ----------
+        size : int
+                The number of bytes that were transferred
+        """
+        self.__refill()
+        self.tokens -= size
+
+    def wait_time(self):
+        """ Returns the number of seconds until data may be transferred. """
+        self.__refill()
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+
+def wait_time(buckets):
+    """ Returns the number of seconds until all buckets allow a transfer. """
+    return max([bucket.wait_time() for bucket in buckets] + [0])
+
+
+def consume(buckets, size):
+    """ Takes the tokens for an amount of data from all buckets. """
+    for bucket in buckets:
+        bucket.consume(size)
+
+
+class ThrottledReader(QtCore.QObject):
+    """ Calls the readyRead callback of a reply no more often than the buckets
+    allow. The data that is available when the reply finishes is passed on
+    right away, so it is never left behind unread. """
+
+    def __init__(self, reply, buckets, callback, read_buffer_size):
+        """ Constructor
+
+        Parameters
+        ----------
+        reply : QtNetwork.QNetworkReply
+                The reply to read from. The reader is destroyed together with
+                the reply.
+        buckets : list
+                The TokenBuckets that apply to the reply
+        callback : callable
+                Function that reads the available data of the reply
+        read_buffer_size : int
+                The maximum size of the reply's read buffer without throttling.
+                It is made smaller if the rate limit is low, so that the data
+                flows more evenly.
+        """
+        super(ThrottledReader, self).__init__(reply)
+        self.reply = reply
+        self.buckets = buckets
+        self.callback = callback
+        lowest_rate = min(bucket.rate for bucket in buckets)
+        reply.setReadBufferSize(int(max(MIN_READ_BUFFER_SIZE,
+                                        min(read_buffer_size, lowest_rate/4))))
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.read)
+        reply.readyRead.connect(self.read)
+        # Connected before the finished callbacks of the manager, so the
+        # remaining data is read before the reply is handled.
+        reply.finished.connect(self.drain)
+
+    def read(self):
+        """ Reads the available data, or waits until the buckets allow it. """
+        if self.timer.isActive():
+            return
+        wait = wait_time(self.buckets)
+        if wait > 0:
+            self.timer.start(int(wait * 1000) + 1)
+            return
+        self.drain()
+
+    def drain(self):
+        """ Reads the available data regardless of the limits. """
+        self.timer.stop()
+        size = self.reply.bytesAvailable()
+        if size <= 0:
+            return
+        self.callback()
+        consume(self.buckets, size)
+
+
+class ThrottledDevice(QtCore.QIODevice):
+    """ Passes the data of another device on no faster than the buckets allow.
+    Used as the data of an upload, which Qt reads as a sequential device: when
+    the buckets are empty, no data is returned until the device signals that
+    more data is available. Because Qt can not determine the size of a
+    sequential device, the Content-Length header of the request needs to be
+    set, as well as QNetworkRequest.DoNotBufferUploadDataAttribute. Otherwise
+    Qt reads the whole device into memory before it sends the request. The
+    end of the data is signalled once the other device has been read
+    completely. """
+
+    def __init__(self, device, buckets, parent=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        device : QtCore.QIODevice
+                The (opened) device with the data to send.
+        buckets : list
+                The TokenBuckets that apply to the upload
+        parent : QtCore.QObject (default: None)
+                The parent object.
+        """
+        super(ThrottledDevice, self).__init__(parent)
+        self.device = device
+        self.buckets = buckets
+        self.start_pos = None if device.isSequential() else device.pos()
+        self.finished = False
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.readyRead)
+        self.open(QtCore.QIODevice.ReadOnly)
+
+    def isSequential(self):
+        return True
+
+    def bytesAvailable(self):
+        return self.device.bytesAvailable() + \
+            super(ThrottledDevice, self).bytesAvailable()
+
+    def atEnd(self):
+        return self.device.atEnd() and \
+            super(ThrottledDevice, self).bytesAvailable() == 0
+
+    def seek(self, pos):
+        """ Qt seeks the data of an upload back to its start if the request
+        has to be sent again. The wrapped device is rewound instead, if it
+        allows that; seeking elsewhere is not supported. """
+        if pos != 0 or self.start_pos is None:
+            return False
+        self.finished = False
+        return self.device.seek(self.start_pos)
+
+    def readData(self, maxlen):
+        if self.device.atEnd():
+            # Tell Qt that the data is complete, so that it finishes the
+            # request
+            if not self.finished:
+                self.finished = True
+                QtCore.QTimer.singleShot(0, self.readChannelFinished)
+            return None
+        wait = wait_time(self.buckets)
+        if wait > 0:
+            if not self.timer.isActive():
+                self.timer.start(int(wait * 1000) + 1)
+            return b''
+        data = self.device.read(min(maxlen, MAX_CHUNK_SIZE))
+        if isinstance(data, QtCore.QByteArray):
+            data = data.data()
+        consume(self.buckets, len(data))
+        return data
+
+    def writeData(self, data):
+        return -1
@@ -0,0 +1,535 @@
+# -*- coding: utf-8 -*-
+"""
+A queue of uploads and downloads that survives restarts of the application.
+
+Every transfer that is added to a TransferQueue is recorded in a journal on
+disk, together with its state (queued, active, paused, finished, failed or
+cancelled). The queue performs a limited number of transfers at the same time,
+in the order of the queue, which can be changed while it runs. When the
+application is started again, transfers that were underway or waiting are
+queued again. Downloads are always resumable (see
+ConnectionManager.download_file), so they continue where they stopped. Uploads
+continue where they stopped if they are added with a chunk_size; otherwise
+they start over.
+
+The queue is a Qt table model, so it can be shown directly in a QTableView::
+
+    queue = TransferQueue(manager, 'transfers.json')
+    queue.add_download(url, '/data/results.csv', filesize=1024)
+    view = QtWidgets.QTableView()
+    view.setModel(queue)
+"""
+
+# Python3 compatibility
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from QOpenScienceFramework.compat import *
+from QOpenScienceFramework.transfers import PartialDownload
+from qtpy import QtCore
+
+import humanize
+import json
+import logging
+import os
+import uuid
+logger = logging.getLogger()
+
+DOWNLOAD = 'download'
+UPLOAD = 'upload'
+
+QUEUED = 'queued'
+ACTIVE = 'active'
+PAUSED = 'paused'
+FINISHED = 'finished'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+def _(s):
+    """ Dummy function later to be replaced for translation. """
+    return s
+
+
+class _AbortEmitter(QtCore.QObject):
+    """ Provides the abortSignal for a single transfer. """
+    abort = QtCore.Signal()
+
+
+class TransferQueue(QtCore.QAbstractTableModel):
+    """ A journaled queue of transfers, which can be shown in a Qt view.
+
+    Each transfer is a dict with the keys 'id', 'direction' ('download' or
+    'upload'), 'url', 'path', 'size', 'transferred', 'status', 'error' and
+    'options' (the extra keyword arguments for download_file() or
+    upload_file()). A copy of it is available with item() and under the
+    Qt.UserRole of each index of the model.
+    """
+
+    # The default number of transfers that are performed at the same time
+    PARALLEL = 3
+    # The version of the format of the journal
+    JOURNAL_VERSION = 1
+
+    COLUMNS = ['name', 'direction', 'size', 'progress', 'status']
+    HEADERS = {
+        'name': _(u"Name"),
+        'direction': _(u"Direction"),
+        'size': _(u"Size"),
+        'progress': _(u"Progress"),
+        'status': _(u"Status"),
+    }
+
+    item_finished = QtCore.Signal(object)
+    """ Signal with (a copy of) a transfer that finished successfully. """
+    item_failed = QtCore.Signal(object)
+    """ Signal with (a copy of) a transfer that failed. """
+
+    def __init__(self, manager, journal_file, parallel=PARALLEL,
+                 autostart=True, parent=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        manager : manager.ConnectionManager
+                The connection manager that performs the transfers.
+        journal_file : str
+                The JSON file in which the queue is recorded. If it exists, the
+                transfers in it are loaded, and the ones that had not finished
+                are queued again.
+        parallel : int (default: TransferQueue.PARALLEL)
+                The maximum number of transfers that are performed at the same
+                time.
+        autostart : bool (default: True)
+                Start performing the queued transfers as soon as control returns
+                to the event loop. If False, start() needs to be called.
+        parent : QtCore.QObject (default: None)
+                The parent object of the queue.
+        """
+        super(TransferQueue, self).__init__(parent)
+        self.manager = manager
+        self.journal_file = journal_file
+        self.parallel = max(1, int(parallel))
+        self.running = False
+        self._items = []
+        # The abort signals of the transfers that are underway, by id
+        self._active = {}
+        self._save_scheduled = False
+        self.__load()
+        if autostart:
+            QtCore.QTimer.singleShot(0, self.start)
+
+    # Private functions
+
+    def __load(self):
+        """ Reads the journal. Transfers that were underway when the
+        application stopped are queued again. """
+        if not os.path.isfile(self.journal_file):
+            return
+        try:
+            with open(self.journal_file) as fp:
+                journal = json.load(fp)
+            items = journal['items']
+        except (IOError, ValueError, KeyError, TypeError):
+            logger.warning("Could not read transfer journal {}".format(
+                self.journal_file))
+            return
+        for item in items:
+            if item.get('status') == ACTIVE:
+                item['status'] = QUEUED
+            self._items.append(item)
+        logger.info("Loaded {} transfers from {}".format(len(self._items),
+                                                        self.journal_file))
+
+    def __schedule_save(self):
+        """ Writes the journal in the next iteration of the event loop, so that
+        several changes at once only cause a single write. """
+        if not self._save_scheduled:
+            self._save_scheduled = True
+            QtCore.QTimer.singleShot(0, self.save)
+
+    def __row(self, item_id):
+        for row, item in enumerate(self._items):
+            if item['id'] == item_id:
+                return row
+        raise KeyError("Unknown transfer {}".format(item_id))
+
+    def __get(self, item_id):
+        return self._items[self.__row(item_id)]
+
+    def __changed(self, item, columns=None):
+        """ Notifies the views that (some of the columns of) a transfer have
+        changed. """
+        try:
+            row = self.__row(item['id'])
+        except KeyError:
+            # The transfer has been removed in the meantime
+            return
+        if columns is None:
+            first, last = 0, len(self.COLUMNS) - 1
+        else:
+            indices = [self.COLUMNS.index(column) for column in columns]
+            first, last = min(indices), max(indices)
+        self.dataChanged.emit(self.index(row, first), self.index(row, last))
+
+    def __set_status(self, item, status, error=None):
+        item['status'] = status
+        item['error'] = error
+        self.__changed(item)
+        self.__schedule_save()
+
+    def __add(self, direction, url, path, size, options):
+        if isinstance(url, QtCore.QUrl):
+            url = safe_decode(url.toString())
+        item = {
+            'id': uuid.uuid4().hex,
+            'direction': direction,
+            'url': url,
+            'path': os.path.abspath(path),
+            'size': size,
+            'transferred': 0,
+            'status': QUEUED,
+            'error': None,
+            'options': options,
+        }
+        row = len(self._items)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self._items.append(item)
+        self.endInsertRows()
+        self.__schedule_save()
+        self.__pump()
+        return item['id']
+
+    def __pump(self):
+        """ Starts the first queued transfers, for as far as the maximum number
+        of simultaneous transfers allows. """
+        if not self.running:
+            return
+        for item in self._items:
+            if len(self._active) >= self.parallel:
+                break
+            if item['status'] == QUEUED:
+                self.__start(item)
+
+    def __start(self, item):
+        item_id = item['id']
+        emitter = _AbortEmitter(self)
+        self._active[item_id] = emitter
+        self.__set_status(item, ACTIVE)
+
+        def progress(transferred, total):
+            item['transferred'] = transferred
+            if total and total > 0:
+                item['size'] = total
+            self.__changed(item, ['size', 'progress'])
+
+        def finished(reply, *args, **kwargs):
+            self.__done(item)
+            item['transferred'] = item['size'] or item['transferred']
+            self.__set_status(item, FINISHED)
+            self.item_finished.emit(dict(item))
+            self.__pump()
+
+        def failed(reply, *args, **kwargs):
+            self.__done(item)
+            if item['status'] == CANCELLED:
+                self.__discard_partial(item)
+            elif item['status'] == ACTIVE:
+                self.__set_status(item, FAILED, reply.errorString())
+                self.item_failed.emit(dict(item))
+            self.__pump()
+
+        kwargs = dict(item['options'])
+        kwargs.update(
+            finishedCallback=finished,
+            errorCallback=failed,
+            abortSignal=emitter.abort
+        )
+        try:
+            if item['direction'] == DOWNLOAD:
+                kwargs['downloadProgress'] = progress
+                kwargs['resumable'] = True
+                if item['size']:
+                    kwargs['filesize'] = item['size']
+                self.manager.download_file(item['url'], item['path'],
+                                           **kwargs)
+            else:
+                kwargs['uploadProgress'] = progress
+                self.manager.upload_file(item['url'], item['path'], **kwargs)
+        except Exception as e:
+            # The transfer was not started, so neither of the callbacks will
+            # be called. Free its slot for the next transfer.
+            logger.error("Could not start the {} of {}: {}".format(
+                item['direction'], item['path'], e))
+            self.__done(item)
+            self.__set_status(item, FAILED, safe_decode(str(e)))
+            self.item_failed.emit(dict(item))
+            QtCore.QTimer.singleShot(0, self.__pump)
+
+    def __done(self, item):
+        emitter = self._active.pop(item['id'], None)
+        if not emitter is None:
+            emitter.deleteLater()
+
+    def __abort(self, item):
+        """ Aborts a transfer that is underway. Its status should have been set
+        beforehand, so the error callback knows the abort was intentional. """
+        emitter = self._active.get(item['id'])
+        if not emitter is None:
+            emitter.abort.emit()
+
+    def __discard_partial(self, item):
+        """ Removes the data that was kept to resume a cancelled download. """
+        if item['direction'] == DOWNLOAD:
+            PartialDownload(item['path'], item['url']).discard()
+
+    # Public functions
+
+    def add_download(self, url, destination, filesize=None, **options):
+        """ Adds a download to the end of the queue.
+
+        Parameters
+        ----------
+        url : str or QtCore.QUrl
+                The url of the file to download.
+        destination : str
+                The path to save the file to.
+        filesize : int (default: None)
+                The size of the file in bytes, if known.
+        **options (optional)
+                Extra keyword arguments for ConnectionManager.download_file(),
+                such as expectedHashes or skip_identical. These are stored in
+                the journal, so they should be JSON serializable.
+
+        Returns
+        -------
+        str
+                The id of the transfer
+        """
+        return self.__add(DOWNLOAD, url, destination, filesize, options)
+
+    def add_upload(self, url, source_file, **options):
+        """ Adds an upload to the end of the queue.
+
+        Parameters
+        ----------
+        url : str or QtCore.QUrl
+                The url to upload the file to.
+        source_file : str
+                The path of the file to upload.
+        **options (optional)
+                Extra keyword arguments for ConnectionManager.upload_file(). Pass
+                chunk_size to make the upload resumable after a restart. These
+                are stored in the journal, so they should be JSON serializable.
+
+        Returns
+        -------
+        str
+                The id of the transfer
+        """
+        try:
+            size = os.path.getsize(source_file)
+        except OSError:
+            size = None
+        return self.__add(UPLOAD, url, source_file, size, options)
+
+    def item(self, item_id):
+        """ Returns a copy of a transfer.
+
+        Parameters
+        ----------
+        item_id : str
+                The id of the transfer
+
+        Returns
+        -------
+        dict
+        """
+        return dict(self.__get(item_id))
+
+    def items(self):
+        """ Returns copies of all transfers, in the order of the queue. """
+        return [dict(item) for item in self._items]
+
+    def start(self):
+        """ Starts performing the queued transfers. """
+        self.running = True
+        self.__pump()
+
+    def stop(self):
+        """ Stops starting new transfers. Transfers that are underway are
+        completed. """
+        self.running = False
+
+    def pause(self, item_id):
+        """ Pauses a transfer. A transfer that is underway is aborted, but its
+        data is kept so it can be resumed.
+
+        Parameters
+        ----------
+        item_id : str
+                The id of the transfer
+        """
+        item = self.__get(item_id)
+        if item['status'] in [QUEUED, ACTIVE]:
+            active = item['status'] == ACTIVE
+            self.__set_status(item, PAUSED)
+            if active:
+                self.__abort(item)
+
+    def resume(self, item_id):
+        """ Queues a paused, failed or cancelled transfer again, at its current
+        position in the queue.
+
+        Parameters
+        ----------
+        item_id : str
+                The id of the transfer
+        """
+        item = self.__get(item_id)
+        if item['status'] in [PAUSED, FAILED, CANCELLED]:
+            self.__set_status(item, QUEUED)
+            self.__pump()
+
+    def pause_all(self):
+        """ Pauses all transfers that are queued or underway. """
+        # The queued transfers are paused first, so they are not started in
+        # place of the transfers that are aborted.
+        for status in [QUEUED, ACTIVE]:
+            for item in list(self._items):
+                if item['status'] == status:
+                    self.pause(item['id'])
+
+    def resume_all(self):
+        """ Queues all paused transfers again. """
+        for item in list(self._items):
+            if item['status'] == PAUSED:
+                self.resume(item['id'])
+
+    def cancel(self, item_id):
+        """ Cancels a transfer. A transfer that is underway is aborted, and the
+        data that was kept to resume it is removed.
+
+        Parameters
+        ----------
+        item_id : str
+                The id of the transfer
+        """
+        item = self.__get(item_id)
+        if item['status'] in [FINISHED, CANCELLED]:
+            return
+        active = item['status'] == ACTIVE
+        self.__set_status(item, CANCELLED)
+        if active:
+            self.__abort(item)
+        else:
+            self.__discard_partial(item)
+
+    def move(self, item_id, row):
+        """ Moves a transfer to another position in the queue. Transfers higher
+        up in the queue are started first.
+
+        Parameters
+        ----------
+        item_id : str
+                The id of the transfer
+        row : int
+                The new position of the transfer
+        """
+        source = self.__row(item_id)
+        row = max(0, min(int(row), len(self._items) - 1))
+        if row == source:
+            return
+        # For moving rows down, Qt expects the position the row is inserted
+        # at before the move is carried out.
+        destination = row + 1 if row > source else row
+        self.beginMoveRows(QtCore.QModelIndex(), source, source,
+                           QtCore.QModelIndex(), destination)
+        self._items.insert(row, self._items.pop(source))
+        self.endMoveRows()
+        self.__schedule_save()
+
+    def remove(self, item_id):
+        """ Removes a transfer that is not underway from the queue.
+
+        Parameters
+        ----------
+        item_id : str
+                The id of the transfer
+        """
+        row = self.__row(item_id)
+        if self._items[row]['status'] == ACTIVE:
+            raise ValueError("Transfer {} is underway; pause or cancel it "
+                             "first".format(item_id))
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        del self._items[row]
+        self.endRemoveRows()
+        self.__schedule_save()
+
+    def clear_finished(self):
+        """ Removes all finished and cancelled transfers from the queue. """
+        for item in list(self._items):
+            if item['status'] in [FINISHED, CANCELLED]:
+                self.remove(item['id'])
+
+    def save(self):
+        """ Writes the journal. """
+        self._save_scheduled = False
+        journal = {'version': self.JOURNAL_VERSION, 'items': self._items}
+        tmp_path = self.journal_file + '.tmp'
+        try:
+            folder = os.path.dirname(os.path.abspath(self.journal_file))
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            with open(tmp_path, 'w') as fp:
+                json.dump(journal, fp)
+            replace_file(tmp_path, self.journal_file)
+        except (IOError, OSError, TypeError, ValueError) as e:
+            logger.warning("Could not write transfer journal {}: {}".format(
+                self.journal_file, e))
+
+    # QAbstractTableModel implementation
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._items)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.COLUMNS)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._items):
+            return None
+        item = self._items[index.row()]
+        if role == QtCore.Qt.UserRole:
+            return dict(item)
+        column = self.COLUMNS[index.column()]
+        if role == QtCore.Qt.ToolTipRole:
+            return item['error'] or item['path']
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if column == 'name':
+            return os.path.basename(item['path'])
+        if column == 'direction':
+            return _(item['direction'])
+        if column == 'size':
+            return humanize.naturalsize(item['size']) if item['size'] else u''
+        if column == 'progress':
+            if not item['size']:
+                return u''
+            return u'{}%'.format(
+                min(100, int(100 * item['transferred'] / item['size'])))
+        if column == 'status':
+            return _(item['status'])
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole or \
+                orientation != QtCore.Qt.Horizontal:
+            return None
+        return self.HEADERS[self.COLUMNS[section]]
@@ -0,0 +1,1867 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers for transferring large files to and from the OSF.
+"""
+
+# Python3 compatibility
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from QOpenScienceFramework.compat import *
+from QOpenScienceFramework.cache import file_version, REDIRECT_STATUSES
+from QOpenScienceFramework.scheduler import BULK, TREE
+import QOpenScienceFramework.connection as osf
+from qtpy import QtCore, QtNetwork, QtWidgets
+
+from collections import OrderedDict, deque
+import hashlib
+import humanize
+import json
+import logging
+import os
+import time
+logger = logging.getLogger()
+
+# The default number of bytes collected by a WriteBuffer before they are
+# written to disk
+WRITE_BUFFER_SIZE = 1024**2
+
+
+
+def retry_delay(manager, reply, attempt):
+    """ Returns the number of seconds to wait before a failed segment or chunk
+    is requested again. The transfers retry these requests themselves rather
+    than through the retry policy of the manager, but use its delays. """
+    if manager.retry_policy is None:
+        return 0
+    return manager.retry_policy.delay(reply, attempt)
+
+
+class WriteBuffer(object):
+    """ Collects the (often small) chunks of data that arrive from the network,
+    and writes them to a file in large blocks. """
+
+    def __init__(self, device, size=WRITE_BUFFER_SIZE, offset=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        device : QtCore.QIODevice
+                The (opened) file to write to
+        size : int (default: WRITE_BUFFER_SIZE)
+                The number of bytes to collect before they are written
+        offset : int (default: None)
+                The position in the file to write the data to. If None, the data
+                is written at the current position of the file.
+        """
+        self.device = device
+        self.size = size
+        self.offset = offset
+        self._chunks = []
+        self._buffered = 0
+
+    def __len__(self):
+        return self._buffered
+
+    def write(self, data):
+        """ Adds data to the buffer, and writes the buffer to the file once it
+        is full.
+
+        Parameters
+        ----------
+        data : QtCore.QByteArray or bytes
+                The data to write
+
+        Returns
+        -------
+        bool
+                False if writing to the file failed, True otherwise
+        """
+        if isinstance(data, QtCore.QByteArray):
+            data = data.data()
+        self._chunks.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.size:
+            return self.flush()
+        return True
+
+    def flush(self):
+        """ Writes the buffered data to the file.
+
+        Returns
+        -------
+        bool
+                False if writing to the file failed, True otherwise
+        """
+        if not self._chunks:
+            return True
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self._buffered = 0
+        if not self.offset is None:
+            self.device.seek(self.offset)
+            self.offset += len(data)
+        return self.device.write(data) == len(data)
+
+    def clear(self):
+        """ Discards the buffered data. """
+        self._chunks = []
+        self._buffered = 0
+
+
+class HashVerifier(object):
+    """ Computes the hash of a file while its data arrives, and compares it
+    with the hash the OSF reports for the file (in extra.hashes of the file's
+    metadata). Only one hash is computed, using the first algorithm in
+    PREFERRED_ALGORITHMS for which an expected value is available. """
+
+    PREFERRED_ALGORITHMS = ['sha256', 'sha512', 'sha1', 'md5']
+
+    def __init__(self, expected_hashes):
+        """ Constructor
+
+        Parameters
+        ----------
+        expected_hashes : dict
+                The expected hex digests by algorithm name, e.g.
+                {'md5': '...', 'sha256': '...'}
+        """
+        self.algorithm = None
+        self.expected = None
+        for algorithm in self.PREFERRED_ALGORITHMS:
+            if expected_hashes.get(algorithm):
+                self.algorithm = algorithm
+                self.expected = expected_hashes[algorithm].lower()
+                break
+        self.reset()
+
+    def __bool__(self):
+        """ False if none of the expected hashes can be checked. """
+        return not self.algorithm is None
+
+    __nonzero__ = __bool__
+
+    def reset(self):
+        """ Starts over with an empty hash. """
+        self._hash = hashlib.new(self.algorithm) if self.algorithm else None
+
+    def update(self, data):
+        """ Adds the next part of the file to the hash.
+
+        Parameters
+        ----------
+        data : QtCore.QByteArray or bytes
+                The data
+        """
+        if self._hash is None:
+            return
+        if isinstance(data, QtCore.QByteArray):
+            data = data.data()
+        self._hash.update(data)
+
+    def update_from_file(self, device, start, end):
+        """ Adds a range of bytes of a file to the hash.
+
+        Parameters
+        ----------
+        device : QtCore.QIODevice
+                The file to read from. Should be opened for reading.
+        start : int
+                The position of the first byte to add
+        end : int
+                The position after the last byte to add
+        """
+        device.seek(start)
+        while start < end:
+            data = device.read(min(WRITE_BUFFER_SIZE, end - start))
+            if not data:
+                break
+            self.update(data)
+            start += len(data)
+
+    @property
+    def digest(self):
+        """ The hex digest of the data so far. """
+        return self._hash.hexdigest() if self._hash else None
+
+    def verify(self):
+        """ Checks if the data has the expected hash.
+
+        Returns
+        -------
+        bool
+                True if the hash matches, or if there is nothing to compare
+        """
+        return self._hash is None or self.digest == self.expected
+
+    def describe_mismatch(self):
+        """ Returns a description of the difference between the expected and
+        the actual hash. """
+        return u"expected {0} {1}, got {0} {2}".format(
+            self.algorithm, self.expected, self.digest)
+
+
+class TransferRate(object):
+    """ Measures the speed of a transfer in bytes per second, averaged over the
+    last few seconds. """
+
+    # The number of seconds to average the rate over
+    WINDOW = 3.0
+
+    def __init__(self):
+        self._samples = deque()
+        self.rate = 0.0
+
+    def update(self, transferred):
+        """ Registers the total number of bytes transferred so far.
+
+        Parameters
+        ----------
+        transferred : int
+                The total number of bytes transferred
+
+        Returns
+        -------
+        float
+                The current transfer rate in bytes per second
+        """
+        now = time.time()
+        self._samples.append((now, transferred))
+        while len(self._samples) > 2 and \
+                now - self._samples[0][0] > self.WINDOW:
+            self._samples.popleft()
+        first_time, first_bytes = self._samples[0]
+        if now > first_time:
+            self.rate = (transferred - first_bytes) / (now - first_time)
+        return self.rate
+
+
+class _HashSignals(QtCore.QObject):
+    """ Reports the result of a _HashJob back to the main thread. """
+    finished = QtCore.Signal(object, object, object, object)
+
+
+class _HashJob(QtCore.QRunnable):
+    """ Hashes a file in a thread of the global QThreadPool. The finished
+    signal is emitted with the path, the algorithm, the signature of the file
+    and the hex digest, which is None if the file can not be read. """
+
+    def __init__(self, path, algorithm, signature, parent):
+        super(_HashJob, self).__init__()
+        self.path = path
+        self.algorithm = algorithm
+        self.signature = signature
+        # The signals live in the thread of parent, so the slots that are
+        # connected to them are called there.
+        self.signals = _HashSignals(parent)
+
+    def run(self):
+        h = hashlib.new(self.algorithm)
+        try:
+            with open(self.path, 'rb') as fp:
+                while True:
+                    data = fp.read(WRITE_BUFFER_SIZE)
+                    if not data:
+                        break
+                    h.update(data)
+            digest = h.hexdigest()
+        except IOError:
+            digest = None
+        self.signals.finished.emit(self.path, self.algorithm, self.signature,
+                                   digest)
+
+
+class LocalHashCache(QtCore.QObject):
+    """ Remembers the hashes of local files, so that a file is only hashed
+    again if its size or modification time has changed. The hashes are kept
+    in a JSON file, so they survive between sessions. Files are hashed in a
+    thread of the global QThreadPool, so that hashing a large file does not
+    block the user interface. """
+
+    # The maximum number of files to remember. The files that were looked up
+    # least recently are forgotten first.
+    MAX_ENTRIES = 100000
+
+    def __init__(self, path, parent=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        path : str
+                The JSON file in which the hashes are stored
+        parent : QtCore.QObject (default: None)
+                The parent object of the cache
+        """
+        super(LocalHashCache, self).__init__(parent)
+        self.path = path
+        self._entries = None
+        self._save_scheduled = False
+        # The callbacks that wait for files that are being hashed, by path
+        # and algorithm
+        self._jobs = {}
+
+    # Private functions
+
+    def __load(self):
+        """ Reads the stored hashes the first time they are needed. """
+        if not self._entries is None:
+            return
+        self._entries = OrderedDict()
+        if not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path) as fp:
+                entries = json.load(fp)
+        except (IOError, ValueError):
+            logger.warning("Could not read {}".format(self.path))
+            return
+        if isinstance(entries, list):
+            for key, entry in entries:
+                self._entries[key] = entry
+
+    def __schedule_save(self):
+        """ Saves the hashes in the next iteration of the event loop, so that
+        hashing many files only writes the cache once. """
+        if not self._save_scheduled:
+            self._save_scheduled = True
+            QtCore.QTimer.singleShot(0, self.save)
+
+    def __stat(self, path):
+        """ Returns the key and the (size, modification time) signature of a
+        file, or None for both if the file does not exist. """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None, None
+        return os.path.abspath(path), [stat.st_size, stat.st_mtime]
+
+    def __hashed(self, key, algorithm, signature, digest):
+        """ Stores the result of a _HashJob, and passes it on to the callbacks
+        that wait for it. """
+        self.sender().deleteLater()
+        callbacks = self._jobs.pop((key, algorithm), [])
+        if digest is None:
+            logger.warning("Could not read {}".format(key))
+        else:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry['signature'] != signature:
+                entry = {'signature': signature, 'hashes': {}}
+            entry['hashes'][algorithm] = digest
+            self._entries[key] = entry
+            self.__schedule_save()
+        for callback in callbacks:
+            callback(digest)
+
+    # Public functions
+
+    def hexdigest(self, path, algorithm, callback):
+        """ Gets the hash of a file, computing it only if the file has changed
+        since it was last hashed.
+
+        Parameters
+        ----------
+        path : str
+                The file to hash
+        algorithm : str
+                The name of the hashlib algorithm, e.g. 'sha256'
+        callback : callable
+                Function to call with the hex digest, or with None if the file
+                does not exist or can not be read. It is always called from the
+                event loop of the main thread, also if the hash is known.
+        """
+        self.__load()
+        key, signature = self.__stat(path)
+        digest = None
+        entry = self._entries.get(key) if not key is None else None
+        if not entry is None and entry['signature'] == signature:
+            # Mark the entry as the most recently used one
+            self._entries[key] = self._entries.pop(key)
+            digest = entry['hashes'].get(algorithm)
+        if key is None or not digest is None:
+            QtCore.QTimer.singleShot(0, lambda: callback(digest))
+            return
+        # Another request for the same file waits for the same job
+        if (key, algorithm) in self._jobs:
+            self._jobs[(key, algorithm)].append(callback)
+            return
+        self._jobs[(key, algorithm)] = [callback]
+        job = _HashJob(key, algorithm, signature, self)
+        job.signals.finished.connect(self.__hashed)
+        QtCore.QThreadPool.globalInstance().start(job)
+
+    def store(self, path, algorithm, digest):
+        """ Remembers the hash of a file that was computed elsewhere, for
+        instance while the file was downloaded.
+
+        Parameters
+        ----------
+        path : str
+                The file the hash belongs to
+        algorithm : str
+                The name of the hashlib algorithm
+        digest : str
+                The hex digest of the file
+        """
+        self.__load()
+        key, signature = self.__stat(path)
+        if key is None:
+            return
+        self._entries.pop(key, None)
+        self._entries[key] = {'signature': signature,
+                              'hashes': {algorithm: digest}}
+        self.__schedule_save()
+
+    def matches(self, path, expected_hashes, callback):
+        """ Checks if a local file has one of the expected hashes.
+
+        Parameters
+        ----------
+        path : str
+                The local file
+        expected_hashes : dict
+                The hex digests by algorithm name, as in HashVerifier
+        callback : callable
+                Function to call with True if the file exists and its hash
+                matches, or with False if not, or if none of the expected
+                hashes can be checked. It is called from the event loop, just
+                like the callback of hexdigest().
+        """
+        verifier = HashVerifier(expected_hashes or {})
+        if not verifier:
+            QtCore.QTimer.singleShot(0, lambda: callback(False))
+            return
+        self.hexdigest(path, verifier.algorithm,
+                       lambda digest: callback(digest == verifier.expected))
+
+    def save(self):
+        """ Writes the hashes to the JSON file. """
+        self._save_scheduled = False
+        if self._entries is None:
+            return
+        while len(self._entries) > self.MAX_ENTRIES:
+            self._entries.popitem(last=False)
+        tmp_path = self.path + '.tmp'
+        try:
+            folder = os.path.dirname(os.path.abspath(self.path))
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            with open(tmp_path, 'w') as fp:
+                json.dump(list(self._entries.items()), fp)
+            replace_file(tmp_path, self.path)
+        except (IOError, OSError):
+            logger.warning("Could not write {}".format(self.path))
+
+
+class SegmentedDownload(QtCore.QObject):
+    """ Downloads a file over several connections at once.
+
+    The file is split into consecutive byte ranges (segments), which are
+    requested in parallel with HTTP Range requests. Each segment is written into
+    the (pre-sized) destination file at its own offset as soon as its data
+    arrives. A segment that fails is requested again from the last byte that
+    was received, up to MAX_RETRIES times. If the server does not support Range
+    requests and responds with the complete file, the other segments are
+    cancelled and that response is used to download the file in one piece.
+
+    Note that the segments are requests of the priority class of the download,
+    so no more segments are transferred at the same time than the limit of that
+    class allows (see scheduler.RequestScheduler).
+    """
+
+    # Files are not split into segments smaller than this size in bytes
+    MIN_SEGMENT_SIZE = 4*1024**2
+    # The number of times a failed segment is requested again
+    MAX_RETRIES = 3
+
+    def __init__(self, manager, url, destination_file, size, segments,
+                 finished, failed, progress=None, progressDialog=None,
+                 priority=BULK, hash_verifier=None, bucket=None, version=None,
+                 parent=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        manager : manager.ConnectionManager
+                The connection manager with which to perform the requests.
+        url : str or QtCore.QUrl
+                The url of the file to download.
+        destination_file : QtCore.QFile
+                The file to write the data to. It is resized to the size of the
+                download and opened for writing if necessary.
+        size : int
+                The size of the file in bytes.
+        segments : int
+                The number of segments to split the file into.
+        finished : callable
+                Function to call with the reply of the last segment once all data
+                has been received.
+        failed : callable
+                Function to call with the reply of the failing segment if the
+                download could not be completed, or has been aborted.
+        progress : callable (default: None)
+                Function to call with the number of bytes received and the
+                total number of bytes, each time data has been received.
+        progressDialog : QtWidgets.QProgressDialog (default: None)
+                Dialog to report the progress to. The download is aborted if
+                the dialog is cancelled.
+        priority : str (default: 'bulk')
+                The priority class of the requests for the segments.
+        hash_verifier : HashVerifier (default: None)
+                Is updated with the data of the file, in the right order. The
+                data of the first unfinished segment is hashed as it arrives.
+                Data of later segments that has arrived before is read back from
+                the file once the segments before it are complete.
+        bucket : throttle.TokenBucket (default: None)
+                Limits the bandwidth of the download as a whole.
+        version : str (default: None)
+                The version of the file, so that the segments can reuse the
+                location the url is redirected to (see cache.RedirectCache).
+        parent : QtCore.QObject (default: None)
+                The parent object.
+        """
+        super(SegmentedDownload, self).__init__(parent)
+        self.manager = manager
+        self.url = url
+        self.destination_file = destination_file
+        self.size = size
+        self.finished_callback = finished
+        self.failed_callback = failed
+        self.progress_callback = progress
+        self.progress_dialog = progressDialog
+        self.priority = priority
+        self.hash_verifier = hash_verifier
+        self.bucket = bucket
+        self.version = version
+
+        # Never create segments that are smaller than MIN_SEGMENT_SIZE
+        segments = max(1, min(int(segments),
+                              -(-size // self.MIN_SEGMENT_SIZE)))
+        segment_size = -(-size // segments)
+        self.segments = []
+        for start in range(0, size, segment_size):
+            self.segments.append({
+                'start': start,
+                'end': min(start + segment_size, size) - 1,
+                'received': 0,
+                'hashed': 0,
+                'retries': 0,
+                'handle': None,
+                'buffer': None,
+                'done': False,
+                'cancelled': False,
+            })
+        # The index of the first segment that has not been hashed completely
+        self._hash_frontier = 0
+        self._closed = False
+
+        if isinstance(progressDialog, QtWidgets.QProgressDialog):
+            progressDialog.canceled.connect(self.abort)
+
+    # Private functions
+
+    def __advance_hash_frontier(self):
+        """ Hashes the data of the segments after a completed segment that
+        has already arrived, until a segment is found that is not complete. """
+        if not self.hash_verifier:
+            return
+        while self._hash_frontier < len(self.segments):
+            segment = self.segments[self._hash_frontier]
+            if segment['hashed'] < segment['received']:
+                segment['buffer'].flush()
+                self.hash_verifier.update_from_file(
+                    self.destination_file,
+                    segment['start'] + segment['hashed'],
+                    segment['start'] + segment['received'])
+                segment['hashed'] = segment['received']
+            if not segment['done']:
+                return
+            self._hash_frontier += 1
+
+    def __length(self, segment):
+        return segment['end'] - segment['start'] + 1
+
+    def __request(self, segment):
+        """ Requests the part of a segment that has not been received yet. """
+        # The download may have been aborted while a retry was waiting
+        if self._closed or segment['cancelled']:
+            return
+        if not segment['buffer'] is None:
+            segment['buffer'].flush()
+        segment['buffer'] = WriteBuffer(
+            self.destination_file,
+            offset=segment['start'] + segment['received'])
+        byte_range = 'bytes={}-{}'.format(
+            segment['start'] + segment['received'], segment['end'])
+        segment['handle'] = self.manager.get(
+            self.url,
+            self.__segment_finished,
+            segment,
+            rawHeaders={'Range': byte_range},
+            readyRead=self.__segment_readyRead,
+            errorCallback=self.__segment_error,
+            priority=self.priority,
+            # Failed segments are retried and reported by this object
+            retryPolicy=None,
+            notify=False,
+            fileVersion=self.version,
+            _bucket=self.bucket
+        )
+
+    def __report_progress(self):
+        received = sum(segment['received'] for segment in self.segments)
+        if isinstance(self.progress_dialog, QtWidgets.QProgressDialog):
+            self.progress_dialog.setValue(received)
+        if callable(self.progress_callback):
+            self.progress_callback(received, self.size)
+
+    def __use_single_stream(self, segment):
+        """ Called if the server responded with the complete file instead of the
+        requested range. Continues the download with only that response. """
+        logger.info("Server does not support Range requests; downloading {} "
+                    "in one piece".format(self.url))
+        for other in self.segments:
+            if other is segment:
+                continue
+            other['cancelled'] = True
+            if not other['done'] and not other['handle'] is None:
+                other['handle'].abort()
+        segment['start'] = 0
+        segment['end'] = self.size - 1
+        segment['received'] = 0
+        segment['hashed'] = 0
+        segment['buffer'] = WriteBuffer(self.destination_file, offset=0)
+        self.segments = [segment]
+        self._hash_frontier = 0
+        if self.hash_verifier:
+            self.hash_verifier.reset()
+
+    def __fail(self, reply):
+        """ Stops all segments and reports that the download failed. """
+        self._closed = True
+        for segment in self.segments:
+            segment['cancelled'] = True
+            if not segment['done'] and not segment['handle'] is None:
+                segment['handle'].abort()
+        self.failed_callback(reply)
+
+    def __segment_readyRead(self, segment, *args, **kwargs):
+        """ Writes the data that has arrived for a segment into the file. """
+        if self._closed or segment['cancelled']:
+            return
+        reply = segment['handle']
+        data = reply.readAll()
+        status = reply.attribute(
+            QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        # Ignore the body of redirect and error responses
+        if status in REDIRECT_STATUSES or (status or 0) >= 400:
+            return
+        if status == 200 and len(self.segments) > 1:
+            self.__use_single_stream(segment)
+        elif status == 200 and segment['start'] + segment['received'] > 0:
+            # A retry of the single remaining segment was answered with the
+            # complete file, so start over from the beginning.
+            segment['start'] = 0
+            segment['received'] = 0
+            segment['hashed'] = 0
+            segment['buffer'] = WriteBuffer(self.destination_file, offset=0)
+            if self.hash_verifier:
+                self.hash_verifier.reset()
+
+        # Do not write past the end of the segment
+        data = data.left(self.__length(segment) - segment['received'])
+        if not segment['buffer'].write(data):
+            logger.error("Could not write to {}".format(
+                self.destination_file.fileName()))
+            self.__fail(reply)
+            return
+        # Data of the first unfinished segment can be hashed right away
+        if self.hash_verifier and \
+                self.segments[self._hash_frontier] is segment and \
+                segment['hashed'] == segment['received']:
+            self.hash_verifier.update(data)
+            segment['hashed'] += len(data)
+        segment['received'] += len(data)
+        self.__report_progress()
+
+    def __segment_finished(self, reply, segment, *args, **kwargs):
+        """ Callback for the reply of a segment. """
+        if self._closed or segment['cancelled']:
+            return
+        if not segment['buffer'].flush():
+            logger.error("Could not write to {}".format(
+                self.destination_file.fileName()))
+            self.__fail(reply)
+            return
+        if segment['received'] < self.__length(segment):
+            # The connection was closed before all data was received
+            self.__segment_error(reply, segment)
+            return
+        segment['done'] = True
+        self.__advance_hash_frontier()
+        if all(s['done'] for s in self.segments):
+            self._closed = True
+            self.finished_callback(reply)
+
+    def __segment_error(self, reply, segment, *args, **kwargs):
+        """ Error callback for the reply of a segment. Requests the segment
+        again, or lets the download fail if that is not possible. """
+        if self._closed or segment['cancelled']:
+            return
+        if reply.error() in [reply.OperationCanceledError,
+                             reply.AuthenticationRequiredError] \
+                or segment['retries'] >= self.MAX_RETRIES:
+            self.__fail(reply)
+            return
+        segment['retries'] += 1
+        delay = retry_delay(self.manager, reply, segment['retries'] - 1)
+        logger.info("Retrying segment {}-{} of {} in {:.1f} s ({}/{})".format(
+            segment['start'], segment['end'], self.url, delay,
+            segment['retries'], self.MAX_RETRIES))
+        QtCore.QTimer.singleShot(int(delay * 1000),
+                                 lambda: self.__request(segment))
+
+    # Public functions
+
+    def start(self):
+        """ Starts the download. """
+        if not self.destination_file.isOpen():
+            self.destination_file.open(QtCore.QIODevice.ReadWrite)
+        if self.hash_verifier:
+            self.hash_verifier.reset()
+        # Reserve the space for the complete file up front
+        self.destination_file.resize(self.size)
+        for segment in self.segments:
+            self.__request(segment)
+
+    def abort(self):
+        """ Aborts the download. """
+        for segment in self.segments:
+            if self._closed:
+                return
+            # The error callback of the aborted segment stops the others
+            if not segment['done'] and not segment['handle'] is None:
+                segment['handle'].abort()
+        if not self._closed:
+            self.__fail(self.segments[-1]['handle'])
+
+    @property
+    def received(self):
+        """ The number of bytes received so far. """
+        return sum(segment['received'] for segment in self.segments)
+
+
+class PartialDownload(object):
+    """ Keeps the data of an unfinished download on disk, so that it can be
+    resumed later, also after the application has been restarted.
+
+    The data is written to <destination>.part. Next to it, <destination>.part.json
+    stores the url of the download, and the ETag or Last-Modified value of the
+    response. When the download is started again, the remaining data is requested
+    with a Range request, with an If-Range header that contains this value. If
+    the file on the server has changed in the meantime, the server responds
+    with the complete file and the download starts over from the beginning.
+    """
+
+    PART_SUFFIX = '.part'
+    STATE_SUFFIX = '.part.json'
+
+    def __init__(self, destination, url, hash_verifier=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        destination : str
+                The path the file should eventually be saved to.
+        url : str or QtCore.QUrl
+                The url of the file to download.
+        hash_verifier : HashVerifier (default: None)
+                Is updated with the data of the file. When a download is
+                resumed, the data that was received earlier is hashed first.
+        """
+        self.destination = destination
+        self.url = safe_decode(url.toString()) \
+            if isinstance(url, QtCore.QUrl) else url
+        self.path = destination + self.PART_SUFFIX
+        self.state_path = destination + self.STATE_SUFFIX
+        self.file = QtCore.QFile(self.path)
+        self.buffer = WriteBuffer(self.file)
+        self.hash_verifier = hash_verifier
+        self.state = self.__load_state()
+        self.offset = self.__resumable_bytes()
+        self.received = self.offset
+        # The size of the complete file, or -1 as long as it is unknown
+        self.total = -1
+        self._reply = None
+
+    # Private functions
+
+    def __load_state(self):
+        if not os.path.isfile(self.state_path):
+            return {}
+        try:
+            with open(self.state_path) as fp:
+                state = json.load(fp)
+        except (IOError, ValueError):
+            logger.warning("Could not read {}".format(self.state_path))
+            return {}
+        if not isinstance(state, dict) or state.get('url') != self.url:
+            return {}
+        return state
+
+    def __resumable_bytes(self):
+        """ The number of bytes that can be kept. This is only possible if the
+        response they came from can be identified. """
+        if not self.state.get('validator') or not self.file.exists():
+            return 0
+        return self.file.size()
+
+    def __save_state(self):
+        try:
+            with open(self.state_path, 'w') as fp:
+                json.dump(self.state, fp)
+        except IOError:
+            logger.warning("Could not write {}".format(self.state_path))
+
+    def __check_response(self, reply):
+        """ Called for the first data of each response. Starts over if the
+        server sent the complete file instead of the remaining part. """
+        status = reply.attribute(
+            QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        if status != 206 and self.received > 0:
+            logger.info("Could not resume download of {}; starting over".format(
+                self.url))
+            self.buffer.clear()
+            self.file.resize(0)
+            self.file.seek(0)
+            self.received = 0
+            if self.hash_verifier:
+                self.hash_verifier.reset()
+
+        # Content-Range is bytes <first>-<last>/<total> for a partial response
+        content_range = safe_decode(
+            reply.rawHeader(b'Content-Range').data())
+        length = reply.header(QtNetwork.QNetworkRequest.ContentLengthHeader)
+        if status == 206 and '/' in content_range and \
+                content_range.split('/')[-1].isdigit():
+            self.total = int(content_range.split('/')[-1])
+        elif not length is None:
+            self.total = self.received + int(length)
+
+        validator = None
+        for header in ['ETag', 'Last-Modified']:
+            if reply.hasRawHeader(safe_encode(header)):
+                validator = safe_decode(
+                    reply.rawHeader(safe_encode(header)).data())
+                break
+        self.state = {'url': self.url, 'validator': validator}
+        self.__save_state()
+
+    # Public functions
+
+    def open(self):
+        """ Opens the part file for writing. Any data that can not be resumed
+        is removed.
+
+        Returns
+        -------
+        bool
+                True if the file could be opened, False if not
+        """
+        if self.offset:
+            logger.info("Resuming download of {} at byte {}".format(
+                self.url, self.offset))
+            if self.hash_verifier:
+                if not self.file.open(QtCore.QIODevice.ReadOnly):
+                    return False
+                self.hash_verifier.update_from_file(self.file, 0, self.offset)
+                self.file.close()
+            return self.file.open(QtCore.QIODevice.Append)
+        return self.file.open(QtCore.QIODevice.WriteOnly)
+
+    def request_headers(self):
+        """ Returns the headers with which the remaining data of the file is
+        requested.
+
+        Returns
+        -------
+        dict
+        """
+        if not self.offset:
+            return {}
+        return {
+            'Range': 'bytes={}-'.format(self.offset),
+            'If-Range': self.state['validator'],
+        }
+
+    def write(self, reply):
+        """ Writes the data that is available on a reply to the part file.
+
+        Parameters
+        ----------
+        reply : QtNetwork.QNetworkReply
+                The reply to read the data from
+
+        Returns
+        -------
+        bool
+                False if writing to the file failed, True otherwise
+        """
+        data = reply.readAll()
+        if not reply is self._reply:
+            self._reply = reply
+            self.__check_response(reply)
+        self.received += len(data)
+        if self.hash_verifier:
+            self.hash_verifier.update(data)
+        return self.buffer.write(data)
+
+    def keep(self):
+        """ Closes the part file, leaving it in place so the download can be
+        resumed later. """
+        self.buffer.flush()
+        self.file.close()
+        self._reply = None
+
+    def complete(self):
+        """ Moves the completed file to its destination.
+
+        Returns
+        -------
+        bool
+                True if the file was saved to its destination, False if not
+        """
+        if not self.buffer.flush():
+            return False
+        self.file.close()
+        self._reply = None
+        try:
+            replace_file(self.path, self.destination)
+        except OSError as e:
+            logger.error("Could not move {} to {}: {}".format(
+                self.path, self.destination, e))
+            return False
+        self.discard()
+        return True
+
+    def discard(self):
+        """ Removes the part file and the information about it. """
+        self.file.close()
+        if QtCore.QFile.exists(self.path):
+            QtCore.QFile.remove(self.path)
+        if os.path.isfile(self.state_path):
+            try:
+                os.remove(self.state_path)
+            except OSError:
+                logger.warning("Could not remove {}".format(self.state_path))
+
+
+class ChunkedUpload(QtCore.QObject):
+    """ Uploads a file in chunks, so that an interruption only requires the
+    current chunk to be sent again.
+
+    The upload follows a resumable upload protocol:
+
+    1. The upload session is started with an empty PUT request to the upload
+       url, with the size of the file in the X-Upload-Content-Length header.
+       The server responds with the url of the session in the Location header.
+    2. Each chunk is sent in a PUT request to the session url, with a
+       Content-Range header (bytes <first>-<last>/<total>). The server responds
+       with 308 and a Range header (bytes=0-<last byte received>) while the
+       upload is incomplete, and with 200 or 201 once the complete file has
+       been received.
+    3. The number of bytes the server has received can be requested with an
+       empty PUT request to the session url with Content-Range bytes */<total>.
+       An empty file has no bytes to send a range of; it is completed with
+       such a request (bytes */0), to which the server responds with 200 or
+       201.
+
+    The session url is stored in a state file, so an interrupted upload can
+    be resumed later, also after the application has been restarted. A failed
+    chunk is retried (after asking the server which bytes it has received) up
+    to MAX_RETRIES times.
+
+    Note that the upload server needs to support this protocol. The stand-in
+    server in the fakeserver module does.
+    """
+
+    # The default size of the chunks in bytes
+    CHUNK_SIZE = 8*1024**2
+    # The number of times a failed chunk is retried
+    MAX_RETRIES = 3
+
+    def __init__(self, manager, url, source_file, state_file, finished, failed,
+                 progress=None, progressDialog=None, chunk_size=None,
+                 priority=BULK, bucket=None, parent=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        manager : manager.ConnectionManager
+                The connection manager with which to perform the requests.
+        url : str or QtCore.QUrl
+                The url to upload the file to.
+        source_file : str
+                The path of the file to upload.
+        state_file : str
+                The path of the file in which the state of the upload session
+                is stored.
+        finished : callable
+                Function to call with the reply of the last chunk once the server
+                has received the complete file.
+        failed : callable
+                Function to call with the reply of the failing request if the
+                upload could not be completed, or has been aborted.
+        progress : callable (default: None)
+                Function to call with the number of bytes sent and the total
+                number of bytes.
+        progressDialog : QtWidgets.QProgressDialog (default: None)
+                Dialog to report the progress to. The upload is aborted if the
+                dialog is cancelled.
+        chunk_size : int (default: ChunkedUpload.CHUNK_SIZE)
+                The size of the chunks in bytes.
+        priority : str (default: 'bulk')
+                The priority class of the requests.
+        bucket : throttle.TokenBucket (default: None)
+                Limits the bandwidth of the upload as a whole.
+        parent : QtCore.QObject (default: None)
+                The parent object.
+        """
+        super(ChunkedUpload, self).__init__(parent)
+        self.manager = manager
+        self.url = safe_decode(url.toString()) \
+            if isinstance(url, QtCore.QUrl) else url
+        self.source_file = QtCore.QFile(source_file)
+        self.source_path = os.path.abspath(source_file)
+        self.state_file = state_file
+        self.finished_callback = finished
+        self.failed_callback = failed
+        self.progress_callback = progress
+        self.progress_dialog = progressDialog
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+        self.priority = priority
+        self.bucket = bucket
+
+        self.size = os.path.getsize(source_file)
+        self.mtime = os.path.getmtime(source_file)
+        self.offset = 0
+        self.retries = 0
+        self.session_url = None
+        self._handle = None
+        self._chunk = None
+        self._closed = False
+
+        if isinstance(progressDialog, QtWidgets.QProgressDialog):
+            progressDialog.canceled.connect(self.abort)
+
+    # Private functions
+
+    def __load_state(self):
+        """ Returns the url of an earlier session for the same file, if the file
+        has not been modified since. """
+        if not os.path.isfile(self.state_file):
+            return None
+        try:
+            with open(self.state_file) as fp:
+                state = json.load(fp)
+        except (IOError, ValueError):
+            logger.warning("Could not read {}".format(self.state_file))
+            return None
+        if state.get('url') != self.url or \
+                state.get('source') != self.source_path or \
+                state.get('size') != self.size or \
+                state.get('mtime') != self.mtime:
+            return None
+        return state.get('session_url')
+
+    def __save_state(self):
+        state = {
+            'url': self.url,
+            'source': self.source_path,
+            'size': self.size,
+            'mtime': self.mtime,
+            'session_url': self.session_url,
+        }
+        try:
+            with open(self.state_file, 'w') as fp:
+                json.dump(state, fp)
+        except IOError:
+            logger.warning("Could not write {}".format(self.state_file))
+
+    def __remove_state(self):
+        if os.path.isfile(self.state_file):
+            try:
+                os.remove(self.state_file)
+            except OSError:
+                logger.warning("Could not remove {}".format(self.state_file))
+
+    def __put(self, url, callback, headers, data=None):
+        self._handle = self.manager.put(
+            url,
+            callback,
+            data_to_send=data,
+            rawHeaders=headers,
+            errorCallback=self.__error,
+            priority=self.priority,
+            # Failed chunks are retried and reported by this object
+            retryPolicy=None,
+            notify=False,
+            _bucket=self.bucket
+        )
+
+    def __report_progress(self):
+        if isinstance(self.progress_dialog, QtWidgets.QProgressDialog):
+            self.progress_dialog.setValue(self.offset)
+        if callable(self.progress_callback):
+            self.progress_callback(self.offset, self.size)
+
+    def __initiate(self):
+        """ Starts a new upload session. """
+        self.offset = 0
+        self.__put(self.url, self.__initiated,
+                   {'X-Upload-Content-Length': str(self.size)})
+
+    def __initiated(self, reply, *args, **kwargs):
+        if self._closed:
+            return
+        if not reply.hasRawHeader(b'Location'):
+            logger.error("The server did not start a resumable upload session "
+                         "for {}".format(self.url))
+            self.__fail(reply)
+            return
+        self.session_url = safe_decode(reply.rawHeader(b'Location').data())
+        self.__save_state()
+        self.__send_chunk()
+
+    def __query_status(self):
+        """ Asks the server how many bytes of the file it has received. """
+        # The upload may have been aborted while a retry was waiting
+        if self._closed:
+            return
+        self.__put(self.session_url, self.__chunk_sent,
+                   {'Content-Range': 'bytes */{}'.format(self.size)})
+
+    def __release_chunk(self):
+        """ Frees the buffer of the chunk that was sent last. """
+        if not self._chunk is None:
+            self._chunk.close()
+            self._chunk.deleteLater()
+            self._chunk = None
+
+    def __send_chunk(self):
+        """ Sends the next chunk of the file. """
+        self.__release_chunk()
+        if self.size == 0:
+            self.__query_status()
+            return
+        if not self.source_file.isOpen() and \
+                not self.source_file.open(QtCore.QIODevice.ReadOnly):
+            logger.error("Could not open {}".format(self.source_path))
+            self.__fail(self._handle)
+            return
+        self.source_file.seek(self.offset)
+        chunk = self._chunk = QtCore.QBuffer(self)
+        chunk.setData(self.source_file.read(self.chunk_size))
+        chunk.open(QtCore.QIODevice.ReadOnly)
+        last = self.offset + chunk.size() - 1
+        self.__put(self.session_url, self.__chunk_sent, {
+            'Content-Range': 'bytes {}-{}/{}'.format(self.offset, last,
+                                                     self.size),
+            'Content-Type': 'application/octet-stream',
+        }, chunk)
+
+    def __chunk_sent(self, reply, *args, **kwargs):
+        """ Callback for chunks and status requests. """
+        if self._closed:
+            return
+        status = reply.attribute(
+            QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        if status in [200, 201]:
+            self.offset = self.size
+            self.__report_progress()
+            self.__close()
+            self.__remove_state()
+            self.finished_callback(reply)
+            return
+        # The server should complete an empty file right away; asking again
+        # would not change that.
+        if status != 308 or self.size == 0:
+            logger.error("Unexpected response to upload chunk: {}".format(
+                status))
+            self.__fail(reply)
+            return
+
+        # The Range header tells up to which byte the server has received the
+        # file. Without it, nothing has been received yet.
+        offset = 0
+        if reply.hasRawHeader(b'Range'):
+            byte_range = safe_decode(reply.rawHeader(b'Range').data())
+            offset = int(byte_range.split('-')[-1]) + 1
+        # Only a chunk that got through resets the retries; a status request
+        # after a failed chunk reports the same offset as before.
+        if offset > self.offset:
+            self.retries = 0
+        self.offset = offset
+        self.__report_progress()
+        self.__send_chunk()
+
+    def __error(self, reply, *args, **kwargs):
+        """ Error callback for all requests of the upload. """
+        if self._closed:
+            return
+        status = reply.attribute(
+            QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        if reply.error() in [reply.OperationCanceledError,
+                             reply.AuthenticationRequiredError]:
+            self.__fail(reply)
+        elif status in [404, 410] and not self.session_url is None:
+            # The session has expired: start over
+            logger.info("Upload session for {} expired; starting over".format(
+                self.url))
+            self.session_url = None
+            self.__remove_state()
+            self.__initiate()
+        elif self.retries < self.MAX_RETRIES and not self.session_url is None:
+            self.retries += 1
+            delay = retry_delay(self.manager, reply, self.retries - 1)
+            logger.info("Retrying upload of {} at byte {} in {:.1f} s "
+                        "({}/{})".format(self.url, self.offset, delay,
+                                         self.retries, self.MAX_RETRIES))
+            QtCore.QTimer.singleShot(int(delay * 1000), self.__query_status)
+        else:
+            self.__fail(reply)
+
+    def __close(self):
+        self._closed = True
+        self.source_file.close()
+        self.__release_chunk()
+
+    def __fail(self, reply):
+        """ Stops the upload, keeping the session so it can be resumed. """
+        self.__close()
+        self.failed_callback(reply)
+
+    # Public functions
+
+    def start(self):
+        """ Starts the upload, or resumes an earlier upload session of the same
+        file. """
+        self.session_url = self.__load_state()
+        if self.session_url is None:
+            self.__initiate()
+        else:
+            logger.info("Resuming upload of {}".format(self.source_path))
+            self.__query_status()
+
+    def abort(self):
+        """ Aborts the upload. The upload session is kept, so that the upload
+        can be resumed later. """
+        if self._closed:
+            return
+        if not self._handle is None:
+            self._handle.abort()
+        if not self._closed:
+            self.__fail(self._handle)
+
+
+class FolderDownload(QtCore.QObject):
+    """ Downloads all files in a folder or project of the OSF, including those
+    in its subfolders, to a local folder with the same structure.
+
+    The listings of the folders are retrieved while the first files are already
+    being downloaded. No more than a fixed number of files are downloaded at the
+    same time; the others wait in a queue until a slot is free. The progress is
+    reported for the download as a whole, in bytes of all files that have been
+    found so far, together with an estimate of the remaining time once all
+    listings have been retrieved.
+
+    A file that fails to download does not stop the others. After all files
+    have been processed, the downloaded, skipped and failed files are available
+    in the attributes of the same name.
+    """
+
+    # The number of items to request per page of a folder listing
+    PAGE_SIZE = 100
+    # The fields of the files in a listing that are needed for the download
+    # (see connection.add_fields())
+    FIELDS = {'files': ['name', 'kind', 'size', 'date_modified', 'extra',
+                        'current_version', 'files']}
+    # The minimum number of seconds between updates of the progress label
+    LABEL_INTERVAL = 0.5
+
+    abort_requested = QtCore.Signal()
+
+    def __init__(self, manager, data, destination, finished, parallel,
+                 progress=None, progressDialog=None, download_kwargs=None,
+                 parent=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        manager : manager.ConnectionManager
+                The connection manager with which to perform the requests.
+        data : dict
+                The 'data' segment of the OSF API response for the folder or
+                project (node) to download.
+        destination : str
+                The local folder that corresponds to the OSF folder. It is
+                created if it does not exist.
+        finished : callable
+                Function to call with this object once all files have been
+                processed, or the download has been aborted.
+        parallel : int
+                The maximum number of files to download at the same time.
+        progress : callable (default: None)
+                Function to call with the number of bytes received and the
+                total number of bytes of the files found so far.
+        progressDialog : QtWidgets.QProgressDialog (default: None)
+                Dialog to report the progress to. The download is aborted if
+                the dialog is cancelled.
+        download_kwargs : dict (default: None)
+                Extra keyword arguments for ConnectionManager.download_file(),
+                such as skip_identical or resumable.
+        parent : QtCore.QObject (default: None)
+                The parent object.
+        """
+        super(FolderDownload, self).__init__(parent)
+        self.manager = manager
+        self.data = data
+        self.destination = destination
+        self.finished_callback = finished
+        self.parallel = max(1, int(parallel))
+        self.progress_callback = progress
+        self.progress_dialog = progressDialog
+        self.download_kwargs = download_kwargs or {}
+
+        # The local paths of the files that were downloaded, that were skipped
+        # because they were identical already, and tuples of (path or url,
+        # error message) for the files and listings that failed.
+        self.downloaded = []
+        self.skipped = []
+        self.failed = []
+
+        # Files waiting to be downloaded, as tuples of (OSF data, local path)
+        self._queue = deque()
+        # The number of bytes received of the files that are underway, by path
+        self._active = {}
+        self._listings = set()
+        self._files_found = 0
+        self._bytes_found = 0
+        self._bytes_done = 0
+        self._rate = TransferRate()
+        self._label_updated = 0
+        self._aborted = False
+        self._closed = False
+        self.eta = None
+
+        # The label of the progress dialog, to which the progress is added
+        self._title = u''
+        if isinstance(progressDialog, QtWidgets.QProgressDialog):
+            self._title = progressDialog.labelText()
+            progressDialog.canceled.connect(self.abort)
+
+    # Private functions
+
+    def __local_name(self, name):
+        """ Checks if an OSF name can be used as the name of a local file. """
+        return name not in ['', '.', '..'] and not '/' in name \
+            and not '\\' in name
+
+    def __list(self, url, folder):
+        """ Requests a (page of a) folder listing. """
+        handle = self.manager.get(
+            url,
+            self.__listed,
+            folder,
+            errorCallback=self.__listing_failed,
+            priority=TREE
+        )
+        if handle:
+            self._listings.add(handle)
+
+    def __list_folder(self, data, folder):
+        """ Creates the local folder for an OSF folder, and requests the listing
+        of its contents. """
+        try:
+            url = data['relationships']['files']['links']['related']['href']
+        except KeyError as e:
+            self.failed.append((folder, "Invalid folder data: {}".format(e)))
+            return
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError as e:
+                self.failed.append((folder, safe_decode(str(e))))
+                return
+        separator = '&' if '?' in url else '?'
+        url += separator + 'page[size]={}'.format(self.PAGE_SIZE)
+        self.__list(osf.add_fields(url, self.FIELDS), folder)
+
+    def __listed(self, reply, folder):
+        """ Callback for a folder listing. Queues the files it contains, and
+        requests the listings of its subfolders. """
+        self._listings.discard(reply)
+        if self._aborted:
+            return
+        try:
+            response = json.loads(safe_decode(reply.readAll().data()))
+            entries = response['data']
+            next_page = response['links'].get('next')
+        except (ValueError, KeyError, TypeError) as e:
+            self.failed.append((safe_decode(reply.url().toString()),
+                                "Invalid listing: {}".format(e)))
+            self.__check_done()
+            return
+
+        for entry in entries:
+            attributes = entry.get('attributes', {})
+            name = attributes.get('name', '')
+            if not self.__local_name(name):
+                logger.warning("Skipping {!r}: not a valid file name".format(
+                    name))
+                continue
+            path = os.path.join(folder, name)
+            if attributes.get('kind') == 'folder':
+                self.__list_folder(entry, path)
+            else:
+                self._queue.append((entry, path))
+                self._files_found += 1
+                self._bytes_found += attributes.get('size') or 0
+
+        if next_page:
+            self.__list(next_page, folder)
+        self.__pump()
+        self.__report_progress()
+        self.__check_done()
+
+    def __listing_failed(self, reply, folder):
+        self._listings.discard(reply)
+        if not self._aborted:
+            self.failed.append((folder, reply.errorString()))
+        self.__check_done()
+
+    def __pump(self):
+        """ Starts downloads from the queue for as far as slots are free. """
+        while self._queue and len(self._active) < self.parallel and \
+                not self._aborted:
+            entry, path = self._queue.popleft()
+            self.__download(entry, path)
+
+    def __download(self, entry, path):
+        attributes = entry['attributes']
+        size = attributes.get('size') or 0
+        self._active[path] = 0
+
+        def progress(received, total):
+            self._active[path] = received
+            self.__report_progress()
+
+        def finished(reply, *args, **kwargs):
+            status = reply.attribute(
+                QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+            if status == 304:
+                self.skipped.append(path)
+            else:
+                self.downloaded.append(path)
+            self.__file_done(path, size)
+
+        def failed(reply, *args, **kwargs):
+            self.failed.append((path, reply.errorString()))
+            self.__file_done(path, size)
+
+        kwargs = dict(self.download_kwargs)
+        kwargs.update(
+            finishedCallback=finished,
+            errorCallback=failed,
+            downloadProgress=progress,
+            abortSignal=self.abort_requested,
+            filesize=size or None,
+            expectedHashes=attributes.get('extra', {}).get('hashes'),
+            fileVersion=file_version(entry)
+        )
+        try:
+            url = entry['links']['download']
+        except KeyError:
+            self.failed.append((path, "No download link"))
+            self.__file_done(path, size)
+            return
+        self.manager.download_file(url, path, **kwargs)
+
+    def __file_done(self, path, size):
+        self._active.pop(path, None)
+        self._bytes_done += size
+        self.__pump()
+        self.__report_progress()
+        self.__check_done()
+
+    def __report_progress(self):
+        received = self._bytes_done + sum(self._active.values())
+        bytes_per_second = self._rate.update(received)
+        if not self._listings and bytes_per_second > 0:
+            self.eta = max(0, self._bytes_found - received) / bytes_per_second
+        else:
+            self.eta = None
+
+        if isinstance(self.progress_dialog, QtWidgets.QProgressDialog):
+            # In KiB, because the dialog only accepts 32-bit values
+            self.progress_dialog.setMaximum(self._bytes_found // 1024)
+            self.progress_dialog.setValue(received // 1024)
+            now = time.time()
+            if now - self._label_updated >= self.LABEL_INTERVAL:
+                self._label_updated = now
+                self.progress_dialog.setLabelText(self.__progress_text(
+                    bytes_per_second))
+        if callable(self.progress_callback):
+            self.progress_callback(received, self._bytes_found)
+
+    def __progress_text(self, bytes_per_second):
+        done = len(self.downloaded) + len(self.skipped) + len(self.failed)
+        text = u"{}\n{}/{} files, {}/s".format(
+            self._title,
+            done, self._files_found, humanize.naturalsize(bytes_per_second))
+        if not self.eta is None:
+            text += u", {} remaining".format(humanize.naturaldelta(self.eta))
+        return text
+
+    def __check_done(self):
+        if self._closed or self._listings or self._queue or self._active:
+            return
+        self._closed = True
+        if isinstance(self.progress_dialog, QtWidgets.QWidget):
+            self.progress_dialog.deleteLater()
+        self.finished_callback(self)
+
+    # Public functions
+
+    def start(self):
+        """ Starts retrieving the listings and downloading the files. """
+        self.__list_folder(self.data, self.destination)
+        self.__check_done()
+
+    def abort(self):
+        """ Aborts the download. Files that have already been downloaded are
+        kept. """
+        if self._closed:
+            return
+        self._aborted = True
+        self._queue.clear()
+        for handle in list(self._listings):
+            handle.abort()
+        self._listings.clear()
+        self.abort_requested.emit()
+        self.__check_done()
+
+
+class FolderUpload(QtCore.QObject):
+    """ Uploads a local folder, with all its files and subfolders, into a folder
+    on the OSF.
+
+    The remote folders are created level by level: as soon as a folder exists
+    on the OSF, all of its subfolders are created at once, and its files are
+    added to the upload queue. Folders and files that already exist are reused
+    and updated, respectively. No more than a fixed number of files are uploaded
+    at the same time.
+
+    The combined progress of all files is emitted with the progress_changed
+    signal, and the result of every file with the file_finished signal. Once
+    all files have been processed, the results are available in the results
+    attribute.
+    """
+
+    # The minimum number of seconds between updates of the progress label
+    LABEL_INTERVAL = 0.5
+
+    progress_changed = QtCore.Signal(object, object)
+    """ Signal with the number of bytes sent, and the total number of bytes. """
+    file_finished = QtCore.Signal(object)
+    """ Signal with the result of a file, as a dict with the keys 'path',
+    'status' ('uploaded' or 'failed') and 'error'. """
+    abort_requested = QtCore.Signal()
+
+    def __init__(self, manager, data, source_folder, finished, parallel,
+                 progressDialog=None, upload_kwargs=None, parent=None):
+        """ Constructor
+
+        Parameters
+        ----------
+        manager : manager.ConnectionManager
+                The connection manager with which to perform the requests.
+        data : dict
+                The data of the OSF folder to upload into, which should contain
+                the 'upload' and 'new_folder' links.
+        source_folder : str
+                The local folder to upload. A folder with the same name is
+                created in the OSF folder.
+        finished : callable
+                Function to call with this object once all files have been
+                processed, or the upload has been aborted.
+        parallel : int
+                The maximum number of files to upload at the same time.
+        progressDialog : QtWidgets.QProgressDialog (default: None)
+                Dialog to report the progress to. The upload is aborted if the
+                dialog is cancelled.
+        upload_kwargs : dict (default: None)
+                Extra keyword arguments for ConnectionManager.upload_file(),
+                such as chunk_size.
+        parent : QtCore.QObject (default: None)
+                The parent object.
+        """
+        super(FolderUpload, self).__init__(parent)
+        self.manager = manager
+        self.data = data
+        self.source_folder = os.path.abspath(source_folder)
+        self.finished_callback = finished
+        self.parallel = max(1, int(parallel))
+        self.progress_dialog = progressDialog
+        self.upload_kwargs = upload_kwargs or {}
+        self.results = []
+
+        # The subfolders and files of each local folder
+        self._tree = {}
+        # Files waiting to be uploaded, as tuples of (local path, upload url)
+        self._queue = deque()
+        # The number of bytes sent of the files that are underway, by path
+        self._active = {}
+        # The handles of the listings and folder creations that are underway
+        self._requests = set()
+        self._files_total = 0
+        self._bytes_total = 0
+        self._bytes_done = 0
+        self._rate = TransferRate()
+        self._label_updated = 0
+        self._aborted = False
+        self._closed = False
+        self.eta = None
+
+        self._title = u''
+        if isinstance(progressDialog, QtWidgets.QProgressDialog):
+            self._title = progressDialog.labelText()
+            progressDialog.canceled.connect(self.abort)
+
+    # Private functions
+
+    def __scan(self):
+        """ Collects the subfolders and files of the source folder. """
+        for folder, subfolders, files in os.walk(self.source_folder):
+            subfolders.sort()
+            self._tree[folder] = (
+                [os.path.join(folder, name) for name in subfolders],
+                [os.path.join(folder, name) for name in sorted(files)])
+            self._files_total += len(files)
+            for name in files:
+                try:
+                    self._bytes_total += os.path.getsize(
+                        os.path.join(folder, name))
+                except OSError:
+                    pass
+
+    def __files_in(self, folder):
+        """ Returns all files in a local folder and its subfolders. """
+        subfolders, files = self._tree.get(folder, ([], []))
+        files = list(files)
+        for subfolder in subfolders:
+            files += self.__files_in(subfolder)
+        return files
+
+    def __encode(self, name):
+        return safe_decode(QtCore.QUrl.toPercentEncoding(name).data())
+
+    def __request(self, method, url, callback, folder, *args):
+        """ Performs a request to list or create the OSF folder for a local
+        folder. """
+        def finished(reply):
+            self._requests.discard(reply)
+            if not self._aborted:
+                callback(reply, folder, *args)
+            self.__check_done()
+
+        def failed(reply):
+            self._requests.discard(reply)
+            self.__folder_failed(folder, reply)
+            self.__check_done()
+
+        handle = method(url, finished, errorCallback=failed, priority=TREE)
+        if handle:
+            self._requests.add(handle)
+
+    def __folder_failed(self, folder, reply):
+        """ Marks all files in a folder that could not be created or listed as
+        failed. """
+        if self._aborted:
+            return
+        error = reply.errorString()
+        logger.warning("Could not create or list {} on the OSF: {}".format(
+            folder, error))
+        for path in self.__files_in(folder):
+            self.__report(path, 'failed', error)
+
+    def __open_folder(self, folder, links, existing=None):
+        """ Called once the OSF folder for a local folder is available. Creates
+        its subfolders, and queues its files for upload.
+
+        Parameters
+        ----------
+        folder : str
+                The local folder
+        links : dict
+                The links of the corresponding OSF folder
+        existing : dict (default: None)
+                The OSF data of the items that are already in the folder, by
+                name. If None, the folder is new.
+        """
+        existing = existing or {}
+        subfolders, files = self._tree.get(folder, ([], []))
+        for subfolder in subfolders:
+            self.__create_folder(subfolder, links, existing)
+        for path in files:
+            name = os.path.basename(path)
+            item = existing.get(name)
+            if not item is None and item['attributes'].get('kind') == 'file':
+                url = item['links']['upload'] + '?kind=file'
+            else:
+                url = links['upload'] + '?kind=file&name={}'.format(
+                    self.__encode(name))
+            self._queue.append((path, url))
+        self.__pump()
+
+    def __create_folder(self, folder, parent_links, existing):
+        """ Creates the OSF folder for a local folder, or lists it if it
+        already exists. """
+        name = os.path.basename(folder)
+        item = existing.get(name)
+        if not item is None and item['attributes'].get('kind') == 'folder':
+            self.__list_folder(folder, item['links'])
+            return
+        url = parent_links['new_folder']
+        url += ('&' if '?' in url else '?') + 'name={}'.format(
+            self.__encode(name))
+        self.__request(self.manager.put, url, self.__folder_created, folder)
+
+    def __folder_created(self, reply, folder):
+        try:
+            links = json.loads(safe_decode(reply.readAll().data()))['data'][
+                'links']
+        except (ValueError, KeyError, TypeError):
+            self.__folder_failed(folder, reply)
+            return
+        self.__open_folder(folder, links)
+
+    def __list_folder(self, folder, links):
+        """ Retrieves the contents of an existing OSF folder. """
+        self.__request(self.manager.get, links['upload'], self.__folder_listed,
+                       folder, links)
+
+    def __folder_listed(self, reply, folder, links):
+        try:
+            entries = json.loads(safe_decode(reply.readAll().data()))['data']
+            existing = dict((entry['attributes']['name'], entry)
+                            for entry in entries)
+        except (ValueError, KeyError, TypeError):
+            self.__folder_failed(folder, reply)
+            return
+        self.__open_folder(folder, links, existing)
+
+    def __pump(self):
+        """ Starts uploads from the queue for as far as slots are free. """
+        while self._queue and len(self._active) < self.parallel and \
+                not self._aborted:
+            path, url = self._queue.popleft()
+            self.__upload(path, url)
+
+    def __upload(self, path, url):
+        self._active[path] = 0
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+
+        def progress(sent, total):
+            self._active[path] = sent
+            self.__report_progress()
+
+        def finished(reply, *args, **kwargs):
+            self.__file_done(path, size, 'uploaded')
+
+        def failed(reply, *args, **kwargs):
+            self.__file_done(path, size, 'failed', reply.errorString())
+
+        kwargs = dict(self.upload_kwargs)
+        kwargs.update(
+            finishedCallback=finished,
+            errorCallback=failed,
+            uploadProgress=progress,
+            abortSignal=self.abort_requested
+        )
+        self.manager.upload_file(url, path, **kwargs)
+
+    def __file_done(self, path, size, status, error=None):
+        self._active.pop(path, None)
+        self._bytes_done += size
+        self.__report(path, status, error)
+        self.__pump()
+        self.__report_progress()
+        self.__check_done()
+
+    def __report(self, path, status, error=None):
+        result = {'path': path, 'status': status, 'error': error}
+        self.results.append(result)
+        self.file_finished.emit(result)
+
+    def __report_progress(self):
+        sent = self._bytes_done + sum(self._active.values())
+        bytes_per_second = self._rate.update(sent)
+        if bytes_per_second > 0:
+            self.eta = max(0, self._bytes_total - sent) / bytes_per_second
+        else:
+            self.eta = None
+
+        if isinstance(self.progress_dialog, QtWidgets.QProgressDialog):
+            # In KiB, because the dialog only accepts 32-bit values
+            self.progress_dialog.setMaximum(self._bytes_total // 1024)
+            self.progress_dialog.setValue(sent // 1024)
+            now = time.time()
+            if now - self._label_updated >= self.LABEL_INTERVAL:
+                self._label_updated = now
+                text = u"{}\n{}/{} files, {}/s".format(
+                    self._title, len(self.results), self._files_total,
+                    humanize.naturalsize(bytes_per_second))
+                if not self.eta is None:
+                    text += u", {} remaining".format(
+                        humanize.naturaldelta(self.eta))
+                self.progress_dialog.setLabelText(text)
+        self.progress_changed.emit(sent, self._bytes_total)
+
+    def __check_done(self):
+        if self._closed or self._requests or self._queue or self._active:
+            return
+        self._closed = True
+        if isinstance(self.progress_dialog, QtWidgets.QWidget):
+            self.progress_dialog.deleteLater()
+        self.finished_callback(self)
+
+    # Public functions
+
+    def start(self):
+        """ Creates the top level folder on the OSF, and starts uploading. """
+        self.__scan()
+        # The source folder is created inside the OSF folder, so it is treated
+        # as the only subfolder of a folder whose contents have to be listed.
+        parent = os.path.dirname(self.source_folder)
+        self._tree[parent] = ([self.source_folder], [])
+        self.__list_folder(parent, self.data['links'])
+        self.__check_done()
+
+    def abort(self):
+        """ Aborts the upload. Files that have been uploaded are kept. """
+        if self._closed:
+            return
+        self._aborted = True
+        for path, url in self._queue:
+            self.__report(path, 'failed', u'Aborted')
+        self._queue.clear()
+        for handle in list(self._requests):
+            handle.abort()
+        self._requests.clear()
+        self.abort_requested.emit()
+        self.__check_done()
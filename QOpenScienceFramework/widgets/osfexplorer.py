@@ -5,10 +5,11 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from QOpenScienceFramework.widgets.projecttree import ProjectTree
+from QOpenScienceFramework.cache import file_version
 from QOpenScienceFramework.util import *
 from QOpenScienceFramework.compat import *
 from QOpenScienceFramework import dirname
-from qtpy import QtGui, QtCore, QtWidgets
+from qtpy import QtGui, QtCore, QtNetwork, QtWidgets
 
 import pprint
 import arrow
@@ -63,7 +64,8 @@ class OSFExplorer(QtWidgets.QWidget):
     abort_preview = QtCore.Signal()
     """ PyQt signal emitted when an image preview is to be aborted. """
 
-    def __init__(self, manager, tree_widget=None, locale='en_us'):
+    def __init__(self, manager, tree_widget=None, locale='en_us',
+                 resumable_downloads=False, skip_identical=False):
         """ Constructor
 
         Can be passed a reference to an already existing ProjectTree if desired,
@@ -78,6 +80,13 @@ class OSFExplorer(QtWidgets.QWidget):
         locale : string (default: en-us)
                 The language in which the time information should be presented.\
                 Should consist of lowercase characters only (e.g. nl_nl)
+        resumable_downloads : bool (default: False)
+                Keep the data of downloads that are interrupted, so that
+                downloading the same file again continues where it stopped (see
+                ConnectionManager.download_file()).
+        skip_identical : bool (default: False)
+                Do not download files of which an identical copy already exists
+                at the chosen location (see ConnectionManager.download_file()).
         """
         # Call parent's constructor
         super(OSFExplorer, self).__init__()
@@ -110,6 +119,8 @@ class OSFExplorer(QtWidgets.QWidget):
 
         # globally accessible items
         self.locale = locale
+        self.resumable_downloads = resumable_downloads
+        self.skip_identical = skip_identical
         # ProjectTree widget. Can be passed as a reference to this object.
         if tree_widget is None:
             # Create a new ProjectTree instance
@@ -289,7 +300,7 @@ class OSFExplorer(QtWidgets.QWidget):
         self.download_button.setIconSize(self.button_icon_size)
         self.download_button.clicked.connect(self._clicked_download_file)
         self.download_button.setToolTip(
-            _(u"Download the currently selected file"))
+            _(u"Download the currently selected file, folder or project"))
         self.download_button.setDisabled(True)
 
         self.upload_icon = QtGui.QIcon.fromTheme(
@@ -406,8 +417,13 @@ class OSFExplorer(QtWidgets.QWidget):
 
         # Actions only allowed on folders
         if kind == "folder":
+            menu.addAction(self.download_icon, _(u"Download folder"),
+                           self._clicked_download_folder)
             upload_action = menu.addAction(self.upload_icon, _(u"Upload file to folder"),
                                            self.__clicked_upload_file)
+            upload_folder_action = menu.addAction(
+                self.upload_icon, _(u"Upload folder to folder"),
+                self.__clicked_upload_folder)
             newfolder_action = menu.addAction(self.new_folder_icon, _(u"Create new folder"),
                                               self.__clicked_new_folder)
             menu.addAction(self.refresh_icon, _(u"Refresh contents"),
@@ -415,6 +431,7 @@ class OSFExplorer(QtWidgets.QWidget):
 
             if not user_has_write_permissions:
                 upload_action.setDisabled(True)
+                upload_folder_action.setDisabled(True)
                 newfolder_action.setDisabled(True)
 
         # Only allow deletion of files and subfolders of repos
@@ -523,7 +540,8 @@ class OSFExplorer(QtWidgets.QWidget):
                             self.__set_image_preview,
                             downloadProgress=self.__prev_dl_progress,
                             errorCallback=self.__img_preview_error,
-                            abortSignal=self.abort_preview
+                            abortSignal=self.abort_preview,
+                            fileVersion=file_version(data)
                         )
 
             else:
@@ -780,7 +798,7 @@ class OSFExplorer(QtWidgets.QWidget):
                 self.new_folder_button.setDisabled(True)
                 self.upload_button.setDisabled(True)
 
-            self.download_button.setDisabled(True)
+            self.download_button.setDisabled(False)
             # Check if the parent node is a project
             # If so the current 'folder' must be a storage provider (e.g. dropbox)
             # which should not be allowed to be deleted.
@@ -792,7 +810,7 @@ class OSFExplorer(QtWidgets.QWidget):
         else:
             self.set_folder_properties(data)
             self.new_folder_button.setDisabled(True)
-            self.download_button.setDisabled(True)
+            self.download_button.setDisabled(False)
             self.upload_button.setDisabled(True)
             self.delete_button.setDisabled(True)
 
@@ -851,6 +869,9 @@ class OSFExplorer(QtWidgets.QWidget):
         selected file to the user specified location. """
         selected_item = self.tree.currentItem()
         data = selected_item.data(0, QtCore.Qt.UserRole)
+        if data['type'] == 'nodes' or data['attributes']['kind'] == 'folder':
+            self._clicked_download_folder()
+            return
         download_url = data['links']['download']
         filename = data['attributes']['name']
 
@@ -881,14 +902,46 @@ class OSFExplorer(QtWidgets.QWidget):
                 }
             else:
                 progress_dialog_data = None
-            # Download the file
+            # Download the file, and check it against the hashes reported by
+            # the OSF (if any)
+            expected_hashes = data['attributes'].get('extra', {}).get('hashes')
             self.manager.download_file(
                 download_url,
                 destination,
                 progressDialog=progress_dialog_data,
-                finishedCallback=self.__download_finished
+                finishedCallback=self.__download_finished,
+                resumable=self.resumable_downloads,
+                expectedHashes=expected_hashes,
+                skip_identical=self.skip_identical,
+                fileVersion=file_version(data)
             )
 
+    def _clicked_download_folder(self):
+        """ Downloads the selected folder or project, with all its contents, to
+        a user specified location. """
+        selected_item = self.tree.currentItem()
+        data = selected_item.data(0, QtCore.Qt.UserRole)
+        name, _kind, _access = self.tree.determine_node_type(data)
+
+        if not hasattr(self, 'last_dl_destination_folder'):
+            self.last_dl_destination_folder = safe_decode(
+                os.path.expanduser(safe_str("~")),
+                enc=sys.getfilesystemencoding())
+
+        folder = QtWidgets.QFileDialog.getExistingDirectory(
+            self, _("Download to folder"), self.last_dl_destination_folder)
+        if not folder:
+            return
+        self.last_dl_destination_folder = folder
+        self.manager.download_folder(
+            data,
+            os.path.join(folder, name),
+            progressDialog={"filename": name},
+            finishedCallback=self.__folder_download_finished,
+            resumable=self.resumable_downloads,
+            skip_identical=self.skip_identical
+        )
+
     def __clicked_delete(self):
         """ Handles a click on the delete button. Deletes the selected file or
         folder. """
@@ -982,6 +1035,56 @@ class OSFExplorer(QtWidgets.QWidget):
                 updateIndex=index_if_present
             )
 
+    def __clicked_upload_folder(self):
+        """ Uploads a user specified local folder, with all its contents, to
+        the currently selected folder. """
+        selected_item = self.tree.currentItem()
+        data = selected_item.data(0, QtCore.Qt.UserRole)
+
+        if not hasattr(self, 'last_open_destination_folder'):
+            self.last_open_destination_folder = safe_decode(
+                os.path.expanduser(safe_str("~")),
+                enc=sys.getfilesystemencoding())
+
+        folder = QtWidgets.QFileDialog.getExistingDirectory(
+            self, _("Select folder for upload"),
+            self.last_open_destination_folder)
+        if not folder:
+            return
+        self.last_open_destination_folder = os.path.dirname(folder)
+        self.manager.upload_folder(
+            data,
+            folder,
+            progressDialog={"filename": os.path.basename(folder)},
+            finishedCallback=self.__folder_upload_finished,
+            selectedTreeItem=selected_item
+        )
+
+    def __folder_upload_finished(self, upload, *args, **kwargs):
+        failed = [result for result in upload.results
+                  if result['status'] == 'failed']
+        uploaded = len(upload.results) - len(failed)
+        if failed:
+            failures = u"\n".join(u"{}: {}".format(result['path'],
+                                                    result['error'])
+                                   for result in failed[:10])
+            if len(failed) > 10:
+                failures += u"\n..."
+            self.manager.warning_message.emit(
+                'Upload incomplete', '{} files uploaded, {} failed:\n{}'
+                .format(uploaded, len(failed), failures))
+        else:
+            self.manager.success_message.emit(
+                'Upload finished', '{} files uploaded'.format(uploaded))
+
+        # Show the new contents of the folder
+        selectedTreeItem = kwargs.get('selectedTreeItem')
+        try:
+            self.tree.refresh_children_of_node(selectedTreeItem)
+        except (RuntimeError, TypeError):
+            # The item was deleted in the meantime
+            self.__upload_refresh_tree(*args, **kwargs)
+
     def __clicked_new_folder(self):
         """ Creates a new folder in the selected folder on OSF """
         selected_item = self.tree.currentItem()
@@ -1013,9 +1116,31 @@ class OSFExplorer(QtWidgets.QWidget):
         )
 
     def __download_finished(self, reply, *args, **kwargs):
+        if reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute) \
+                == 304:
+            self.manager.info_message.emit(
+                'Download skipped', 'The file at the chosen location is '
+                'already identical to the file on the OSF')
+            return
         self.manager.success_message.emit(
             'Download finished', 'Your download completed successfully')
 
+    def __folder_download_finished(self, download, *args, **kwargs):
+        if download.failed:
+            failures = u"\n".join(u"{}: {}".format(path, error)
+                                   for path, error in download.failed[:10])
+            if len(download.failed) > 10:
+                failures += u"\n..."
+            self.manager.warning_message.emit(
+                'Download incomplete',
+                '{} files downloaded, {} already up to date, {} failed:\n{}'
+                .format(len(download.downloaded), len(download.skipped),
+                        len(download.failed), failures))
+            return
+        self.manager.success_message.emit(
+            'Download finished', '{} files downloaded, {} already up to '
+            'date'.format(len(download.downloaded), len(download.skipped)))
+
     def _upload_finished(self, reply, *args, **kwargs):
         """ Callback for reply() object after an upload is finished """
         # See if upload action was triggered by interaction on a tree item
@@ -1077,10 +1202,10 @@ class OSFExplorer(QtWidgets.QWidget):
                     info_url = info_url[:-1]
 
             # Refresh info for the new file as the returned representation
-            # is incomplete
+            # is incomplete. Request the same fields as the tree does.
 
             self.manager.get(
-                info_url,
+                osf.add_fields(info_url, self.tree.FIELDS),
                 self.__upload_refresh_item,
                 selectedTreeItem,
                 *args, **kwargs
@@ -6,7 +6,8 @@ from __future__ import unicode_literals
 from QOpenScienceFramework import dirname
 from QOpenScienceFramework.util import check_if_opensesame_file
 from QOpenScienceFramework.compat import *
-from qtpy import QtGui, QtCore, QtWidgets, QtNetwork
+from QOpenScienceFramework.scheduler import TREE, PREFETCH
+from qtpy import QtGui, QtCore, QtWidgets
 
 import pprint
 import humanize
@@ -41,6 +42,23 @@ class ProjectTree(QtWidgets.QTreeWidget):
     # Maximum of items to return per request (e.g. files in a folder). OSF
     # automatically paginates its results
     ITEMS_PER_PAGE = 50
+    # The attributes and relationships of nodes and files that are requested
+    # from the OSF (JSON:API sparse fieldsets). These are the ones that are
+    # shown in the tree and the OSFExplorer, or that are needed to retrieve
+    # the contents of a node or folder. The complete objects are several KB
+    # each.
+    NODE_FIELDS = ['title', 'category', 'public', 'date_created',
+                   'date_modified', 'current_user_permissions', 'files',
+                   'children', 'linked_nodes']
+    FILE_FIELDS = ['name', 'kind', 'size', 'date_created', 'date_modified',
+                   'guid', 'extra', 'current_version', 'files']
+    FIELDS = {'nodes': NODE_FIELDS, 'files': FILE_FIELDS}
+    # The relationships that are embedded in listings of nodes (JSON:API
+    # embeds), so that the storage providers, components and linked nodes of
+    # a node are known without a request per relationship when it is expanded.
+    # Relationships that the API can not embed are still requested separately.
+    EMBEDS = ['files', 'children', 'linked_nodes']
+    USE_EMBEDS = True
 
     def __init__(self, manager, use_theme=None, theme_path='./resources/iconthemes'):
         """ Constructor.
@@ -146,7 +164,38 @@ class ProjectTree(QtWidgets.QTreeWidget):
         nodeStatus = item.data(1, QtCore.Qt.UserRole)
         if (data['type'] == 'nodes' or data['attributes']['kind'] == 'folder') \
                 and not nodeStatus['fetched']:
-            self.refresh_children_of_node(item)
+            if nodeStatus.get('embeds'):
+                # The contents of the node came along with its listing
+                self.populate_from_embeds(item)
+            else:
+                self.refresh_children_of_node(item)
+
+    def __embed_url(self, url, embeds):
+        """ Returns the url of a node (listing) with the sparse fieldsets and,
+        if enabled, the embeds of the relationships in embeds. """
+        url = osf.add_fields(url, self.FIELDS)
+        if self.USE_EMBEDS:
+            url = osf.add_embeds(url, embeds)
+        return url
+
+    def __populate_node(self, reply, node, recursive=False):
+        """ Callback for the retrieval of a single node with its relationships
+        embedded. Adds the contents of the node to the tree. """
+        osf_response = json.loads(safe_decode(reply.readAll().data()))
+        nodeStatus = self.get_node_data(node, 1)
+        if not nodeStatus is None:
+            nodeStatus['embeds'] = osf_response.get('data', {}).get('embeds')
+            node.setData(1, QtCore.Qt.UserRole, nodeStatus)
+            # As with the listing of the files of a node, the linked nodes and
+            # components are left to populate_tree when retrieving recursively
+            relationships = ['files'] if recursive else self.EMBEDS
+            self.populate_from_embeds(node, relationships, recursive)
+        self.__cleanup_reply(reply, node)
+
+    def __request_priority(self, recursive):
+        """ Listings that are retrieved recursively are not (yet) visible to
+        the user, and should not hold up the ones that are. """
+        return PREFETCH if recursive else TREE
 
     def __cleanup_reply(self, reply, *args, **kwargs):
         """ Callback for when an error occured while populating the tree, or when
@@ -461,6 +510,24 @@ class ProjectTree(QtWidgets.QTreeWidget):
                           ' deleted', e)
             return
 
+        # Retrieve a node together with its storage providers, components and
+        # linked nodes in a single request
+        node_url = node_data.get('links', {}).get('self')
+        if node_data['type'] == 'nodes' and self.USE_EMBEDS and node_url:
+            node.takeChildren()
+            req = self.manager.get(
+                self.__embed_url(node_url, self.EMBEDS),
+                self.__populate_node,
+                node,
+                errorCallback=self.__cleanup_reply,
+                recursive=recursive,
+                priority=self.__request_priority(recursive)
+            )
+            if req:
+                self.active_requests.append(req)
+                self.set_loading_icon(node)
+            return
+
         try:
             content_url = node_data['relationships']['files']['links']['related']['href']
         except KeyError as e:
@@ -473,11 +540,12 @@ class ProjectTree(QtWidgets.QTreeWidget):
 
         # Retrieve the new listing of children from the OSF
         req = self.manager.get(
-            content_url,
+            osf.add_fields(content_url, self.FIELDS),
             self.populate_tree,
             node,
             errorCallback=self.__cleanup_reply,
-            recursive=recursive
+            recursive=recursive,
+            priority=self.__request_priority(recursive)
         )
 
         # If something went wrong, req should be None
@@ -498,7 +566,7 @@ class ProjectTree(QtWidgets.QTreeWidget):
         try:
             related_url = node_data['relationships']['linked_nodes']['links']['related']['href']
             self.fetch_from_endpoint(
-                related_url, parent=node, recursive=recursive)
+                related_url, parent=node, recursive=recursive, embed=True)
         except KeyError as e:
             logger.warning('Unable to fetch related items: {}'.format(e))
             return
@@ -511,18 +579,24 @@ class ProjectTree(QtWidgets.QTreeWidget):
         try:
             children_url = node_data['relationships']['children']['links']['related']['href']
             self.fetch_from_endpoint(
-                children_url, parent=node, recursive=recursive)
+                children_url, parent=node, recursive=recursive, embed=True)
         except KeyError as e:
             logger.warning('Unable to fetch children of node: {}'.format(e))
             return
 
-    def fetch_from_endpoint(self, endpoint, parent=None, recursive=False):
+    def fetch_from_endpoint(self, endpoint, parent=None, recursive=False,
+                            embed=False):
+        if embed:
+            url = self.__embed_url(endpoint, self.EMBEDS)
+        else:
+            url = osf.add_fields(endpoint, self.FIELDS)
         req = self.manager.get(
-            endpoint,
+            url,
             self.populate_tree,
             parent,
             errorCallback=self.__cleanup_reply,
-            recursive=recursive
+            recursive=recursive,
+            priority=self.__request_priority(recursive)
         )
         if req:
             self.active_requests.append(req)
@@ -557,7 +631,8 @@ class ProjectTree(QtWidgets.QTreeWidget):
             # If not, query the osf for the user data, and pass get_repo_contents
             # as the callback to which the received data should be sent.
             self.manager.get_logged_in_user(
-                self.process_repo_contents, errorCallback=self.__cleanup_reply)
+                self.process_repo_contents, errorCallback=self.__cleanup_reply,
+                priority=TREE)
 
     def determine_node_type(self, data):
         """ Determines the type of the node given its data.
@@ -610,6 +685,9 @@ class ProjectTree(QtWidgets.QTreeWidget):
         """
 
         name, kind, access = self.determine_node_type(data)
+        # Relationships that were embedded in the listing are kept with the
+        # status of the item, until it is expanded
+        embeds = data.pop('embeds', None)
 
         values = [name, kind]
         if "size" in data["attributes"] and data["attributes"]["size"]:
@@ -658,7 +736,8 @@ class ProjectTree(QtWidgets.QTreeWidget):
         item.setData(1, QtCore.Qt.UserRole, {
             'refreshing': False,
             'fetched': False,
-            'icon': icon
+            'icon': icon,
+            'embeds': embeds
         })
 
         return item, kind
@@ -687,6 +766,26 @@ class ProjectTree(QtWidgets.QTreeWidget):
                 The list of tree items that have just been generated """
 
         osf_response = json.loads(safe_decode(reply.readAll().data()))
+        self.add_listing(osf_response, parent, recursive)
+        # Remove current reply from list of active requests (assuming it finished)
+        self.__cleanup_reply(reply)
+
+    def add_listing(self, osf_response, parent=None, recursive=False):
+        """ Adds the items of a listing of the OSF to the tree. The listing is
+        either the response to a request, or a relationship that was embedded
+        in the data of a node.
+
+        Parameters
+        ----------
+        osf_response : dict
+                The listing, with the items under the 'data' key.
+        parent : QtWidgets.QTreeWidgetItem (default: None)
+                The parent item to which the items should be attached.
+                If not specified the invisibleRootItem() is used as a parent.
+        recursive : bool (default: False)
+                Also retrieve the contents of the projects and folders in the
+                listing.
+        """
         nodeStatus = None
 
         if parent is None:
@@ -714,10 +813,13 @@ class ProjectTree(QtWidgets.QTreeWidget):
                 # another event deleted treeWidgetItems. Not much that can be
                 # done here, so do some cleanup and quit
                 warnings.warn(str(e))
-                self.__cleanup_reply(reply)
                 return
 
-            if kind in ["project", "folder"] and recursive:
+            if kind in ["project", "folder"] and recursive and \
+                    self.get_node_data(item, 1).get('embeds'):
+                self.populate_from_embeds(
+                    item, ['files', 'linked_nodes'], recursive)
+            elif kind in ["project", "folder"] and recursive:
                 try:
                     next_entrypoint = entry['relationships']['files']['links']['related']['href']
                 except KeyError as e:
@@ -737,14 +839,19 @@ class ProjectTree(QtWidgets.QTreeWidget):
         # If the results are paginated, see if there is another page that needs
         # to be processed
         try:
-            next_page_url = osf_response['links']['next']
+            next_page_url = osf_response.get('links', {}).get('next')
         except AttributeError as e:
             raise osf.OSFInvalidResponse("Invalid OSF data format for next page of "
                                          "results. Missing attribute: {}".format(e))
 
         if not next_page_url is None:
+            # The next page of a listing of nodes that was embedded does not
+            # have the embeds of the first one
+            embed = any(entry['type'] == 'nodes'
+                        for entry in osf_response['data'])
             self.fetch_from_endpoint(
-                next_page_url, parent=parent, recursive=recursive)
+                next_page_url, parent=parent, recursive=recursive,
+                embed=embed)
         elif not nodeStatus is None:
             # Reset icon of the refreshed TreeWidgetItem (in case it was set to a loading icon)
             self.reset_icon(parent)
@@ -754,8 +861,56 @@ class ProjectTree(QtWidgets.QTreeWidget):
         if not nodeStatus is None:
             parent.setData(1, QtCore.Qt.UserRole, nodeStatus)
 
-        # Remove current reply from list of active requests (assuming it finished)
-        self.__cleanup_reply(reply)
+    def populate_from_embeds(self, node, relationships=None, recursive=False):
+        """ Adds the contents of a node to the tree from the relationships that
+        were embedded in its data, saving a request for each of them. The
+        relationships that were not embedded, for instance because the API
+        could not embed them, are requested separately.
+
+        Parameters
+        ----------
+        node : QtWidgets.QTreeWidgetItem
+                The tree item of the node.
+        relationships : list (default: ProjectTree.EMBEDS)
+                The relationships of the node to add the contents of.
+        recursive : bool (default: False)
+                Also retrieve the contents of the projects and folders that are
+                added.
+        """
+        if relationships is None:
+            relationships = self.EMBEDS
+        node_data = self.get_node_data(node)
+        nodeStatus = self.get_node_data(node, 1)
+        if node_data is None or nodeStatus is None:
+            return
+        # The embeds are used only once; a later refresh retrieves the node anew
+        embeds = nodeStatus.pop('embeds', None) or {}
+        nodeStatus['refreshing'] = True
+        node.setData(1, QtCore.Qt.UserRole, nodeStatus)
+
+        missing = []
+        for relationship in relationships:
+            embed = embeds.get(relationship)
+            # An embed that failed contains 'errors' instead of 'data'
+            if isinstance(embed, dict) and isinstance(embed.get('data'), list):
+                self.add_listing(embed, node, recursive)
+            else:
+                missing.append(relationship)
+
+        for relationship in missing:
+            try:
+                url = node_data['relationships'][relationship]['links']['related']['href']
+            except KeyError as e:
+                logger.warning('Unable to fetch {} of node: {}'.format(
+                    relationship, e))
+                continue
+            url += "{}page[size]={}".format('&' if '?' in url else '?',
+                                            self.ITEMS_PER_PAGE)
+            req = self.fetch_from_endpoint(url, parent=node, recursive=recursive,
+                                           embed=relationship != 'files')
+            # If something went wrong, req should be None
+            if req:
+                self.set_loading_icon(node)
 
     def set_loading_icon(self, item):
         if type(item) != QtWidgets.QTreeWidgetItem:
@@ -791,8 +946,9 @@ class ProjectTree(QtWidgets.QTreeWidget):
         """ Processes contents for the logged in user. Starts by listing
         the projects and then recurses through all their repositories, folders and files. """
         # If this function is called as a callback, the supplied data will be a
-        # QByteArray. Convert to a dictionary for easier usage
-        if isinstance(logged_in_user, QtNetwork.QNetworkReply):
+        # reply object (a QNetworkReply, or a BufferedReply if the data came
+        # from the manager's cache). Convert to a dictionary for easier usage
+        if not isinstance(logged_in_user, dict):
             logged_in_user = json.loads(
                 safe_decode(logged_in_user.readAll().data()))
 
@@ -811,12 +967,16 @@ class ProjectTree(QtWidgets.QTreeWidget):
         # Explicitly state to only show projects, otherwise all associated nodes will be shown in
         # the root of the tree.
         user_nodes_api_call += "&filter[category][eq]=project"
+        # Only retrieve the fields that are shown in the tree, and include the
+        # storage providers, components and linked nodes of each project
+        user_nodes_api_call = self.__embed_url(user_nodes_api_call, self.EMBEDS)
 
         # Start populating the tree
         req = self.manager.get(
             user_nodes_api_call,
             self.populate_tree,
             errorCallback=self.__cleanup_reply,
+            priority=TREE
         )
         # If something went wrong, req should be None
         if req:
@@ -27,8 +27,14 @@ setup(
 		'python-fileinspector',
 		'requests-oauthlib>=0.6',
 		'qtawesome>=0.5.7',
-		'python-dotenv'
+		'python-dotenv',
+		# The thread pool of QOpenScienceFramework.bulk
+		'futures; python_version < "3"',
 	],
+	extras_require={
+		# The headless asyncio client (QOpenScienceFramework.asyncclient)
+		'async': ['aiohttp>=3.3'],
+	},
 	include_package_data=True,
 	packages = ['QOpenScienceFramework'],
 )
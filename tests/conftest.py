@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures for the tests, which run against the stand-in server in
+QOpenScienceFramework.fakeserver. The Qt tests use the offscreen platform, so
+they do not need a display.
+"""
+
+import os
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import pytest
+
+import QOpenScienceFramework.connection as osf
+from QOpenScienceFramework.fakeserver import FakeServer
+
+TOKEN = 'secret'
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """ A running FakeServer that requires TOKEN, with the connection module
+    pointed at it and a session that carries the token. """
+    monkeypatch.setitem(osf.settings, 'client_id', 'test-client')
+    monkeypatch.setitem(osf.settings, 'redirect_uri', 'http://localhost/')
+    monkeypatch.setattr(osf, 'session', None)
+    with FakeServer(token=TOKEN) as fake:
+        osf.create_session()
+        osf.session.token = {
+            'access_token': TOKEN,
+            'token_type': 'Bearer',
+            'expires_at': time.time() + 3600,
+        }
+        yield fake
+
+
+@pytest.fixture
+def project(server):
+    """ A project with a file in its root and one in a folder. """
+    fake = server.osf
+    node = fake.add_project('Project')
+    fake.add_file(node, 'root.txt', b'root file')
+    folder = fake.add_folder(node, 'data')
+    fake.add_file(node, 'values.csv', b'1,2,3\n' * 1000, folder)
+    return node
+
+
+@pytest.fixture
+def ranges(monkeypatch):
+    """ Records the Range header of every download from the server. """
+    from QOpenScienceFramework.fakeserver import FakeRequestHandler
+
+    send_data = FakeRequestHandler._FakeRequestHandler__send_data
+    requested = []
+
+    def record(handler, *args, **kwargs):
+        requested.append(handler.headers.get('Range'))
+        return send_data(handler, *args, **kwargs)
+    monkeypatch.setattr(FakeRequestHandler,
+                        '_FakeRequestHandler__send_data', record)
+    return requested
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    from qtpy import QtWidgets
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def notifier(qapp):
+    """ Collects the messages of the ConnectionManager, instead of showing
+    them in dialogs. """
+    from qtpy import QtCore
+
+    class Notifier(QtCore.QObject):
+        def __init__(self):
+            super(Notifier, self).__init__()
+            self.messages = []
+
+        def info(self, title, message):
+            self.messages.append(('info', title, message))
+
+        def error(self, title, message):
+            self.messages.append(('error', title, message))
+
+        def success(self, title, message):
+            self.messages.append(('success', title, message))
+
+        def warning(self, title, message):
+            self.messages.append(('warning', title, message))
+
+    return Notifier()
+
+
+@pytest.fixture
+def manager(server, notifier, tmp_path):
+    """ A ConnectionManager that uses the server. """
+    from QOpenScienceFramework.manager import ConnectionManager
+    from QOpenScienceFramework.retry import RetryPolicy
+    manager = ConnectionManager(
+        notifier=notifier,
+        retry_policy=RetryPolicy(backoff=0.01),
+        tokenfile=str(tmp_path / 'token.json'),
+        prewarm_connections=0,
+        upload_state_dir=str(tmp_path / 'uploads'),
+        hash_cache_file=str(tmp_path / 'hashes.json'))
+    yield manager
+    manager.browser.deleteLater()
+    manager.deleteLater()
+
+
+@pytest.fixture
+def wait(qapp):
+    """ Returns a function that runs the Qt event loop until a condition is
+    met, or the timeout (in seconds) has passed. It returns the value of the
+    condition. """
+    from qtpy import QtCore
+
+    def wait(condition, timeout=10):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            qapp.processEvents(QtCore.QEventLoop.AllEvents, 50)
+        return condition()
+    return wait
+
+
+@pytest.fixture
+def results():
+    """ Records the outcome of the requests that report to its callbacks, as
+    (status, body) for finished requests and (status, error) for failed ones.
+    The replies themselves are deleted once the callbacks return. """
+    from qtpy import QtNetwork
+
+    def status(reply):
+        return reply.attribute(
+            QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+
+    class Results(object):
+        def __init__(self):
+            self.finished = []
+            self.failed = []
+
+        def done(self):
+            return len(self.finished) + len(self.failed)
+
+        def on_finished(self, reply, *args, **kwargs):
+            self.finished.append((status(reply), bytes(reply.readAll())))
+
+        def on_failed(self, reply, *args, **kwargs):
+            if reply is None:
+                self.failed.append((None, None))
+            else:
+                self.failed.append((status(reply), reply.error()))
+    return Results()
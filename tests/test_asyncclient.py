@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+""" The headless asyncio client in QOpenScienceFramework.asyncclient. """
+
+import asyncio
+import os
+
+import pytest
+
+import QOpenScienceFramework.connection as osf
+from QOpenScienceFramework.clientbase import OSFRequestError
+
+aiohttp = pytest.importorskip('aiohttp')
+from QOpenScienceFramework.asyncclient import OSFClient
+
+
+def write_files(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = str(tmp_path / 'file{}.bin'.format(i))
+        with open(path, 'wb') as fp:
+            fp.write(os.urandom(1000 + i))
+        paths.append(path)
+    return paths
+
+
+def read(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+def test_async_client(server, project, tmp_path):
+    listing = osf.api_call('repo_files', project, 'osfstorage')
+    upload_url = server.osf.waterbutler_url(server.osf.nodes[project]['root'])
+    sources = write_files(tmp_path, 5)
+    destination = str(tmp_path / 'downloaded')
+
+    async def run():
+        async with OSFClient(concurrency=4, backoff=0.01) as client:
+            projects = await client.get_user_projects()
+            walked = await client.walk(listing)
+            server.fail_next(1, status=503, match='^/v2/')
+            user = await client.get_logged_in_user()
+            await client.upload_many([(upload_url, source)
+                                      for source in sources])
+            paths = await client.download_folder(listing, destination)
+            with pytest.raises(OSFRequestError):
+                await client.get_json(server.url('/v2/nodes/missing/'))
+        return projects, walked, user, paths
+
+    projects, walked, user, paths = asyncio.run(run())
+    assert [node['id'] for node in projects] == [project]
+    assert sorted(path for path, _ in walked) == \
+        ['data/values.csv', 'root.txt']
+    assert user['data']['id'] == 'fakeuser'
+    assert len(paths) == 2 + len(sources)
+    for source in sources:
+        assert read(os.path.join(destination, os.path.basename(source))) == \
+            read(source)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+""" The thread-pooled bulk client in QOpenScienceFramework.bulk. """
+
+import os
+
+import pytest
+
+import QOpenScienceFramework.connection as osf
+from QOpenScienceFramework.bulk import BulkClient
+from QOpenScienceFramework.clientbase import OSFRequestError
+
+
+def write_files(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = str(tmp_path / 'file{}.bin'.format(i))
+        with open(path, 'wb') as fp:
+            fp.write(os.urandom(1000 + i))
+        paths.append(path)
+    return paths
+
+
+def read(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+def test_bulk_client(server, project, tmp_path):
+    listing = osf.api_call('repo_files', project, 'osfstorage')
+    upload_url = server.osf.waterbutler_url(server.osf.nodes[project]['root'])
+    sources = write_files(tmp_path, 5)
+    destination = str(tmp_path / 'downloaded')
+    with BulkClient(workers=4, backoff=0.01) as client:
+        assert [node['id'] for node in client.get_user_projects()] == \
+            [project]
+        assert sorted(path for path, _ in client.list_tree(listing)) == \
+            ['data/values.csv', 'root.txt']
+
+        # A failing request is repeated
+        server.fail_next(1, status=503, match='^/v2/')
+        assert client.get_logged_in_user()['data']['id'] == 'fakeuser'
+
+        client.map_upload([(upload_url, source) for source in sources])
+        paths = client.download_folder(listing, destination)
+
+    assert sorted(paths) == sorted(
+        ['data/values.csv', 'root.txt'] +
+        [os.path.basename(source) for source in sources])
+    assert read(os.path.join(destination, 'data', 'values.csv')) == \
+        b'1,2,3\n' * 1000
+    for source in sources:
+        assert read(os.path.join(destination, os.path.basename(source))) == \
+            read(source)
+
+
+def test_bulk_client_error(server, project, tmp_path):
+    with BulkClient(workers=2) as client:
+        with pytest.raises(OSFRequestError) as error:
+            client.get_json(server.url('/v2/nodes/missing/'))
+    assert error.value.status == 404
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+""" The in-memory caches and the tags they are invalidated with. """
+
+from QOpenScienceFramework.cache import MemoryCache, url_tags
+
+API = 'https://api.osf.io/v2/'
+FILES = 'https://files.osf.io/v1/resources/'
+
+
+def test_url_tags_of_api_urls():
+    assert url_tags(API + 'users/me/nodes/') == set()
+    assert url_tags(API + 'nodes/abc12/') == set(['abc12'])
+    assert url_tags(API + 'nodes/abc12/children/') == set(['abc12'])
+    assert url_tags(API + 'nodes/abc12/files/') == set(['abc12'])
+    assert url_tags(API + 'nodes/abc12/files/osfstorage/') == set(['abc12'])
+    assert url_tags(API + 'nodes/abc12/files/osfstorage/5af0/') == \
+        set(['abc12', '5af0'])
+    assert url_tags(API + 'files/5af0/') == set(['5af0'])
+
+
+def test_url_tags_of_waterbutler_urls():
+    assert url_tags(FILES + 'abc12/providers/osfstorage/') == set(['abc12'])
+    assert url_tags(FILES + 'abc12/providers/osfstorage/5af0?kind=file') == \
+        set(['abc12', '5af0'])
+
+
+def test_write_to_one_node_keeps_entries_of_other_nodes():
+    cache = MemoryCache(60, 10)
+    cache.put('first', b'1', url_tags(API + 'nodes/abc12/files/osfstorage/'))
+    cache.put('second', b'2', url_tags(API + 'nodes/def34/files/osfstorage/'))
+    cache.invalidate(url_tags(FILES + 'abc12/providers/osfstorage/?name=a'))
+    assert cache.get('first') is None
+    assert cache.get('second') == b'2'
+
+
+def meta_data(url, headers, save_to_disk=True):
+    from qtpy import QtCore, QtNetwork
+    meta = QtNetwork.QNetworkCacheMetaData()
+    meta.setUrl(QtCore.QUrl(url))
+    meta.setRawHeaders([(QtCore.QByteArray(name.encode()),
+                         QtCore.QByteArray(value.encode()))
+                        for name, value in headers])
+    meta.setSaveToDisk(save_to_disk)
+    return meta
+
+
+def test_disk_cache_stores_api_responses_with_validator(qapp, tmp_path):
+    from QOpenScienceFramework.cache import APIDiskCache
+    cache = APIDiskCache(str(tmp_path), 1024 * 1024)
+    device = cache.prepare(meta_data(API + 'nodes/abc12/',
+                                     [('ETag', '"1"')]))
+    assert not device is None
+    assert cache.prepare(meta_data(API + 'nodes/abc12/', [])) is None
+    assert cache.prepare(meta_data(FILES + 'abc12/providers/osfstorage/1',
+                                   [('ETag', '"1"')])) is None
+
+
+def test_disk_cache_respects_save_to_disk(qapp, tmp_path):
+    from QOpenScienceFramework.cache import APIDiskCache
+    cache = APIDiskCache(str(tmp_path), 1024 * 1024)
+    # Qt does not save responses marked with no-store or no-cache
+    for value in ['no-store', 'no-cache']:
+        meta = meta_data(API + 'users/me/', [('ETag', '"1"'),
+                                             ('Cache-Control', value)],
+                         save_to_disk=False)
+        assert cache.prepare(meta) is None
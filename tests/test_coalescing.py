@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+""" Sharing the result of a GET request with identical requests. """
+
+from QOpenScienceFramework.scheduler import INTERACTIVE, PREFETCH, TREE
+
+
+def test_identical_requests_are_sent_once(manager, server, results, wait):
+    server.add_document('/document', {'value': 1})
+    first = manager.get(server.url('/document'), results.on_finished,
+                        priority=TREE)
+    second = manager.get(server.url('/document'), results.on_finished,
+                         priority=PREFETCH)
+    assert not first is second
+    assert wait(lambda: results.done() == 2)
+    assert [body for _, body in results.finished] == [b'{"value": 1}'] * 2
+    assert server.requests.count(('GET', '/document')) == 1
+
+
+def test_request_does_not_join_lower_priority_class(manager, server, results,
+                                                    wait):
+    server.add_document('/document', {'value': 1})
+    server.add_document('/other', {'value': 2})
+    # The prefetch class is full, so its request waits in the queue
+    manager.scheduler.set_limit(PREFETCH, 1)
+    server.latency = 0.5
+    manager.get(server.url('/other'), results.on_finished, priority=PREFETCH)
+    manager.get(server.url('/document'), results.on_finished,
+                priority=PREFETCH)
+    assert manager.scheduler.queued(PREFETCH) == 1
+
+    manager.get(server.url('/document'), results.on_finished,
+                priority=INTERACTIVE)
+    # The interactive request is sent right away
+    assert manager.scheduler.active(INTERACTIVE) == 1
+    assert wait(lambda: results.done() == 3)
+    assert server.requests.count(('GET', '/document')) == 2
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+""" The url helpers of QOpenScienceFramework.connection. """
+
+import QOpenScienceFramework.connection as osf
+
+
+def test_add_fields():
+    url = osf.add_fields('https://api.osf.io/v2/nodes/abc12/files/',
+                         {'nodes': ['title', 'files'], 'files': ['name']})
+    assert url == 'https://api.osf.io/v2/nodes/abc12/files/' \
+        '?fields[files]=name&fields[nodes]=title,files'
+
+
+def test_add_fields_to_url_with_query():
+    url = osf.add_fields('https://api.osf.io/v2/users/me/nodes/?page[size]=50',
+                         {'nodes': ['title']})
+    assert url == 'https://api.osf.io/v2/users/me/nodes/' \
+        '?page[size]=50&fields[nodes]=title'
+
+
+def test_add_fields_keeps_existing_fields():
+    # The link to the next page repeats the (encoded) fields of the first one
+    next_page = 'https://api.osf.io/v2/users/me/nodes/' \
+        '?fields%5Bnodes%5D=title&page=2'
+    url = osf.add_fields(next_page, {'nodes': ['title', 'category'],
+                                     'files': ['name']})
+    assert url == next_page + '&fields[files]=name'
+
+
+def test_api_call_with_fields():
+    assert osf.api_call('project_repos', 'abc12') == \
+        osf.api_base_url + 'nodes/abc12/files/'
+    assert osf.api_call('project_repos', 'abc12',
+                        fields={'files': ['name', 'kind']}) == \
+        osf.api_base_url + 'nodes/abc12/files/?fields[files]=name,kind'
+
+
+def test_add_embeds():
+    url = osf.add_embeds('https://api.osf.io/v2/nodes/abc12/?page[size]=50',
+                         ['files', 'children'])
+    assert url == 'https://api.osf.io/v2/nodes/abc12/' \
+        '?page[size]=50&embed=files&embed=children'
+
+
+def test_add_embeds_keeps_existing_embeds():
+    url = osf.add_embeds('https://api.osf.io/v2/nodes/abc12/?embed=files',
+                         ['files', 'linked_nodes'])
+    assert url == 'https://api.osf.io/v2/nodes/abc12/' \
+        '?embed=files&embed=linked_nodes'
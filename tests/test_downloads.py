@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+""" Downloads of files: in segments, resumed, verified and skipped. """
+
+import os
+
+from QOpenScienceFramework.transfers import SegmentedDownload
+
+
+def add_file(server, size):
+    data = os.urandom(size)
+    project = server.osf.add_project('Project')
+    entry_id = server.osf.add_file(project, 'data.bin', data)
+    return entry_id, server.osf.waterbutler_url(entry_id), data
+
+
+def read(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+def test_segments_are_reassembled(manager, server, results, wait, tmp_path,
+                                  ranges, monkeypatch):
+    monkeypatch.setattr(SegmentedDownload, 'MIN_SEGMENT_SIZE', 10000)
+    entry_id, url, data = add_file(server, 100003)
+    destination = str(tmp_path / 'data.bin')
+    manager.download_file(url, destination, segments=4, filesize=len(data),
+                          expectedHashes=server.osf.hashes(entry_id),
+                          finishedCallback=results.on_finished,
+                          errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert not results.failed
+    assert read(destination) == data
+    assert sorted(ranges) == sorted(['bytes=0-25000', 'bytes=25001-50001',
+                                     'bytes=50002-75002',
+                                     'bytes=75003-100002'])
+    # The temporary file has been renamed to the destination
+    assert not [name for name in os.listdir(str(tmp_path))
+                if name.startswith('.data.bin')]
+
+
+def test_failed_segment_is_retried(manager, server, notifier, results, wait,
+                                   tmp_path, ranges, monkeypatch):
+    monkeypatch.setattr(SegmentedDownload, 'MIN_SEGMENT_SIZE', 10000)
+    entry_id, url, data = add_file(server, 40000)
+    destination = str(tmp_path / 'data.bin')
+    server.fail_next(1, status=503, match='^/v1/')
+    manager.download_file(url, destination, segments=2, filesize=len(data),
+                          finishedCallback=results.on_finished,
+                          errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert not results.failed
+    assert read(destination) == data
+    # Two segments, one of which was requested twice
+    assert len([path for _, path in server.requests
+                if path.startswith('/v1/')]) == 3
+    assert sorted(ranges) == ['bytes=0-19999', 'bytes=20000-39999']
+    assert not notifier.messages
+
+
+def interrupt_download(manager, server, url, destination, results, wait):
+    """ Starts a resumable download and aborts it once data has arrived.
+    Returns the number of bytes that were kept. """
+    from qtpy import QtCore
+
+    class Aborter(QtCore.QObject):
+        abort = QtCore.Signal()
+
+    aborter = Aborter()
+    received = []
+    server.bandwidth = 50000
+    manager.download_file(url, destination, resumable=True,
+                          downloadProgress=lambda done, total:
+                          received.append(done),
+                          abortSignal=aborter.abort,
+                          finishedCallback=results.on_finished,
+                          errorCallback=results.on_failed)
+    assert wait(lambda: received)
+    aborter.abort.emit()
+    assert wait(results.done)
+    assert results.failed
+    server.bandwidth = None
+    return os.path.getsize(destination + '.part')
+
+
+def test_interrupted_download_is_resumed(manager, server, results, wait,
+                                         tmp_path, ranges):
+    entry_id, url, data = add_file(server, 200000)
+    destination = str(tmp_path / 'data.bin')
+    kept = interrupt_download(manager, server, url, destination, results,
+                              wait)
+    assert 0 < kept < len(data)
+    assert not os.path.exists(destination)
+
+    manager.download_file(url, destination, resumable=True,
+                          expectedHashes=server.osf.hashes(entry_id),
+                          finishedCallback=results.on_finished,
+                          errorCallback=results.on_failed)
+    assert wait(lambda: results.done() == 2)
+    assert len(results.finished) == 1
+    assert read(destination) == data
+    assert ranges == [None, 'bytes={}-'.format(kept)]
+    assert not os.path.exists(destination + '.part')
+    assert not os.path.exists(destination + '.part.json')
+
+
+def test_download_of_changed_file_starts_over(manager, server, results, wait,
+                                              tmp_path, ranges):
+    entry_id, url, data = add_file(server, 200000)
+    destination = str(tmp_path / 'data.bin')
+    interrupt_download(manager, server, url, destination, results, wait)
+
+    changed = os.urandom(150000)
+    server.osf.write(entry_id, changed)
+    manager.download_file(url, destination, resumable=True,
+                          finishedCallback=results.on_finished,
+                          errorCallback=results.on_failed)
+    assert wait(lambda: results.done() == 2)
+    assert len(results.finished) == 1
+    # The range was asked for, but the server sent the new version in full
+    assert ranges[-1].startswith('bytes=')
+    assert read(destination) == changed
+
+
+def test_mismatched_hash_fails_download(manager, server, notifier, results,
+                                        wait, tmp_path):
+    from qtpy import QtNetwork
+
+    entry_id, url, data = add_file(server, 50000)
+    destination = str(tmp_path / 'data.bin')
+    manager.download_file(url, destination,
+                          expectedHashes={'md5': '0' * 32},
+                          finishedCallback=results.on_finished,
+                          errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert [error for _, error in results.failed] == \
+        [QtNetwork.QNetworkReply.UnknownContentError]
+    assert not os.path.exists(destination)
+    assert [title for _, title, _ in notifier.messages] == \
+        ['Checksum mismatch']
+
+
+def test_mismatched_hash_removes_partial_download(manager, server, results,
+                                                  wait, tmp_path):
+    entry_id, url, data = add_file(server, 50000)
+    destination = str(tmp_path / 'data.bin')
+    manager.download_file(url, destination, resumable=True,
+                          expectedHashes={'sha256': '0' * 64},
+                          finishedCallback=results.on_finished,
+                          errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert results.failed
+    assert not os.path.exists(destination)
+    # The corrupt data can not be used to resume the download either
+    assert not os.path.exists(destination + '.part')
+    assert not os.path.exists(destination + '.part.json')
+
+
+def test_identical_file_is_skipped(manager, server, results, wait,
+                                   tmp_path):
+    entry_id, url, data = add_file(server, 50000)
+    destination = str(tmp_path / 'data.bin')
+    with open(destination, 'wb') as fp:
+        fp.write(data)
+    server.clear_requests()
+    manager.download_file(url, destination, skip_identical=True,
+                          expectedHashes=server.osf.hashes(entry_id),
+                          finishedCallback=results.on_finished,
+                          errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert results.finished == [(304, b'')]
+    assert not [path for _, path in server.requests
+                if path.startswith('/v1/')]
+
+
+def test_different_file_is_not_skipped(manager, server, results, wait,
+                                       tmp_path):
+    entry_id, url, data = add_file(server, 50000)
+    destination = str(tmp_path / 'data.bin')
+    with open(destination, 'wb') as fp:
+        fp.write(data[:-1] + b'x')
+    manager.download_file(url, destination, skip_identical=True,
+                          expectedHashes=server.osf.hashes(entry_id),
+                          finishedCallback=results.on_finished,
+                          errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert results.finished and results.finished[0][0] == 200
+    assert read(destination) == data
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+""" The stand-in server itself. """
+
+import os
+
+import pytest
+
+import QOpenScienceFramework.connection as osf
+from QOpenScienceFramework.fakeserver import FakeServer, INSECURE_TRANSPORT
+
+
+def test_context_manager_restores_settings(monkeypatch):
+    monkeypatch.delenv(INSECURE_TRANSPORT, raising=False)
+    api_base_url = osf.api_base_url
+    with FakeServer() as server:
+        assert osf.api_base_url == server.settings()['api_base_url']
+        assert os.environ[INSECURE_TRANSPORT] == '1'
+    assert osf.api_base_url == api_base_url
+    assert not INSECURE_TRANSPORT in os.environ
+
+
+def test_context_manager_restores_settings_after_error(monkeypatch):
+    monkeypatch.setenv(INSECURE_TRANSPORT, '0')
+    with pytest.raises(RuntimeError):
+        with FakeServer():
+            raise RuntimeError()
+    assert os.environ[INSECURE_TRANSPORT] == '0'
+
+
+def test_restore_settings_without_previous_settings(monkeypatch):
+    monkeypatch.delenv(INSECURE_TRANSPORT, raising=False)
+    server = FakeServer()
+    previous = server.apply_settings()
+    try:
+        server.restore_settings(None)
+        assert not INSECURE_TRANSPORT in os.environ
+    finally:
+        server.restore_settings(previous)
+        server.stop()
+
+
+def test_api_listing(server):
+    project = server.osf.add_project('Project')
+    response = osf.session.get(server.url('/v2/users/me/nodes/'))
+    assert response.status_code == 200
+    assert [node['id'] for node in response.json()['data']] == [project]
+
+
+def test_token_is_required(server):
+    import requests
+    response = requests.get(server.url('/v2/users/me/'))
+    assert response.status_code == 401
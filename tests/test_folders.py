@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+""" Downloads and uploads of complete folders. """
+
+import os
+
+from qtpy import QtNetwork
+
+
+def test_download_folder_to_invalid_destination(manager, notifier, results,
+                                                wait, tmp_path):
+    destination = str(tmp_path / 'missing' / 'folder')
+    download = manager.download_folder({}, destination,
+                                       finishedCallback=results.on_finished,
+                                       errorCallback=results.on_failed)
+    assert download is None
+    assert wait(results.done)
+    assert results.failed == [
+        (None, QtNetwork.QNetworkReply.UnknownContentError)]
+    assert notifier.messages == [
+        ('error', 'Invalid destination',
+         '{} is not a valid destination'.format(destination))]
+
+
+def test_upload_invalid_source_folder(manager, notifier, results, wait,
+                                      tmp_path):
+    source = str(tmp_path / 'missing')
+    upload = manager.upload_folder({}, source,
+                                   finishedCallback=results.on_finished,
+                                   errorCallback=results.on_failed)
+    assert upload is None
+    assert wait(results.done)
+    assert results.failed == [
+        (None, QtNetwork.QNetworkReply.UnknownContentError)]
+    assert notifier.messages == [
+        ('error', 'Invalid source folder',
+         '{} is not a valid source folder'.format(source))]
+
+
+def read(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+def test_download_project(manager, server, project, wait, tmp_path):
+    destination = str(tmp_path / 'Project')
+    finished = []
+    download = manager.download_folder(server.osf.node_json(project),
+                                       destination,
+                                       finishedCallback=finished.append)
+    assert download
+    assert wait(lambda: finished)
+    assert finished == [download]
+    assert not download.failed
+    assert sorted(download.downloaded) == sorted([
+        os.path.join(destination, 'osfstorage', 'root.txt'),
+        os.path.join(destination, 'osfstorage', 'data', 'values.csv')])
+    assert read(os.path.join(destination, 'osfstorage', 'root.txt')) == \
+        b'root file'
+    assert read(os.path.join(destination, 'osfstorage', 'data',
+                             'values.csv')) == b'1,2,3\n' * 1000
+
+
+def test_download_folder_skips_identical_files(manager, server, project, wait,
+                                               tmp_path):
+    destination = str(tmp_path / 'Project')
+    finished = []
+    manager.download_folder(server.osf.node_json(project), destination,
+                            finishedCallback=finished.append)
+    assert wait(lambda: finished)
+
+    manager.download_folder(server.osf.node_json(project), destination,
+                            skip_identical=True,
+                            finishedCallback=finished.append)
+    assert wait(lambda: len(finished) == 2)
+    assert not finished[1].downloaded
+    assert len(finished[1].skipped) == 2
+
+
+def test_upload_folder(manager, server, project, wait, tmp_path):
+    source = tmp_path / 'results'
+    (source / 'raw').mkdir(parents=True)
+    (source / 'summary.txt').write_bytes(b'summary')
+    (source / 'raw' / 'data.bin').write_bytes(b'\x00\x01' * 5000)
+    finished = []
+    upload = manager.upload_folder(server.osf.provider_json(project),
+                                   str(source),
+                                   finishedCallback=finished.append)
+    assert upload
+    assert wait(lambda: finished)
+    assert finished == [upload]
+    assert sorted((result['path'], result['status'])
+                  for result in upload.results) == [
+        (str(source / 'raw' / 'data.bin'), 'uploaded'),
+        (str(source / 'summary.txt'), 'uploaded')]
+    fake = server.osf
+    assert fake.file_data(fake.find(project, '/results/summary.txt')) == \
+        b'summary'
+    assert fake.file_data(fake.find(project, '/results/raw/data.bin')) == \
+        b'\x00\x01' * 5000
+
+
+def test_upload_folder_updates_existing_files(manager, server, project, wait,
+                                              tmp_path):
+    source = tmp_path / 'data'
+    source.mkdir()
+    (source / 'values.csv').write_bytes(b'4,5,6\n')
+    finished = []
+    manager.upload_folder(server.osf.provider_json(project), str(source),
+                          finishedCallback=finished.append)
+    assert wait(lambda: finished)
+    assert [result['status'] for result in finished[0].results] == \
+        ['uploaded']
+    fake = server.osf
+    # The existing folder and file are reused
+    assert len(fake.entries[fake.find(project, '/')]['children']) == 2
+    assert fake.file_data(fake.find(project, '/data/values.csv')) == \
+        b'4,5,6\n'
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+""" The parts of the package that do not need a working Qt GUI stack. """
+
+import subprocess
+import sys
+
+# Makes QtWebEngine (and QtWebKit, which the login window falls back on) fail
+# to load, as it does on servers that lack the X libraries it links to
+BROKEN_WEBENGINE = """
+import sys
+
+class BrokenWebEngine(object):
+    def find_spec(self, name, path=None, target=None):
+        if 'QtWebEngine' in name or 'QtWebKit' in name:
+            raise ImportError('libXdamage.so.1: cannot open shared object file')
+
+sys.modules.pop('qtpy.QtWebKit', None)
+sys.meta_path.insert(0, BrokenWebEngine())
+"""
+
+
+def run(code):
+    return subprocess.run([sys.executable, '-c', BROKEN_WEBENGINE + code],
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+
+def test_clients_without_webengine():
+    result = run('import QOpenScienceFramework.connection\n'
+                 'import QOpenScienceFramework.bulk\n')
+    assert result.returncode == 0, result.stdout
+
+
+def test_manager_reports_missing_webengine():
+    result = run('import QOpenScienceFramework.manager\n')
+    assert result.returncode != 0
+    assert b'libXdamage' in result.stdout
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+""" Opening connections to the OSF before they are needed. """
+
+from qtpy import QtCore
+
+
+def test_connections_are_opened_on_login(server, notifier, qapp, tmp_path):
+    from QOpenScienceFramework.manager import ConnectionManager
+    manager = ConnectionManager(
+        notifier=notifier,
+        tokenfile=str(tmp_path / 'token.json'),
+        prewarm_hosts=[server.base_url],
+        prewarm_connections=2,
+        upload_state_dir=str(tmp_path / 'uploads'),
+        hash_cache_file=str(tmp_path / 'hashes.json'))
+    qapp.processEvents(QtCore.QEventLoop.AllEvents, 50)
+    # Nothing is opened for a user who has not logged in (yet)
+    assert not manager.connection_stats
+
+    manager.handle_login()
+    assert manager.connection_stats['127.0.0.1']['prewarmed'] == 2
+    assert manager.keep_warm_timer.isActive()
+    manager.handle_logout()
+    assert not manager.keep_warm_timer.isActive()
+    manager.browser.deleteLater()
+    manager.deleteLater()
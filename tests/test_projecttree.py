@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+""" Building the ProjectTree from the listings of the OSF. """
+
+import pytest
+from qtpy import QtCore
+
+
+@pytest.fixture
+def tree(manager, monkeypatch):
+    from qtpy import QtGui
+    from QOpenScienceFramework.widgets import projecttree
+    # The icons do not matter here, and the FontAwesome 4 names that the tree
+    # uses are not available in recent versions of qtawesome
+    monkeypatch.setattr(projecttree.qta, 'icon',
+                        lambda *args, **kwargs: QtGui.QIcon())
+    tree = projecttree.ProjectTree(manager)
+    yield tree
+    tree.deleteLater()
+
+
+def refresh(tree, wait):
+    finished = []
+    tree.refreshFinished.connect(lambda: finished.append(True))
+    tree.refresh_contents()
+    assert wait(lambda: finished)
+
+
+def children(item):
+    return [item.child(i) for i in range(item.childCount())]
+
+
+def api_requests(server):
+    return [path for _, path in server.requests if path.startswith('/v2/')]
+
+
+def test_tree_requests_sparse_fieldsets(tree, server, project, wait,
+                                        monkeypatch):
+    from QOpenScienceFramework.widgets.projecttree import ProjectTree
+    monkeypatch.setattr(ProjectTree, 'USE_EMBEDS', False)
+    refresh(tree, wait)
+    assert [item.text(0) for item in
+            children(tree.invisibleRootItem())] == ['Project']
+    project_item = tree.topLevelItem(0)
+    data = project_item.data(0, QtCore.Qt.UserRole)
+    # Only the requested attributes are returned
+    assert not 'description' in data['attributes']
+    assert data['attributes']['title'] == 'Project'
+
+    server.clear_requests()
+    tree.expandItem(project_item)
+    assert wait(lambda: project_item.childCount() == 1)
+    listings = [path for path in api_requests(server)
+                if '/files/' in path]
+    assert listings and all('fields[files]=' in path for path in listings)
+
+
+def test_node_is_populated_from_embeds(tree, server, project, wait):
+    fake = server.osf
+    component = fake.add_project('Component', category='data',
+                                 parent=project)
+    fake.link_nodes(project, fake.add_project('Linked'))
+    refresh(tree, wait)
+    project_item = [item for item in children(tree.invisibleRootItem())
+                    if item.text(0) == 'Project'][0]
+    assert all('embed=files' in path for path in api_requests(server)
+               if '/nodes/' in path)
+
+    # The storage provider, the component and the linked node came along
+    # with the listing of the projects
+    server.clear_requests()
+    tree.expandItem(project_item)
+    assert sorted(item.text(0) for item in children(project_item)) == \
+        ['Component', 'Linked', 'osfstorage']
+    assert not api_requests(server)
+    assert project_item.data(1, QtCore.Qt.UserRole)['fetched']
+
+    # Embeds are not nested, so the component is retrieved together with its
+    # relationships in a single request
+    component_item = [item for item in children(project_item)
+                      if item.text(0) == 'Component'][0]
+    tree.expandItem(component_item)
+    assert wait(lambda: [item.text(0) for item in children(component_item)]
+                == ['osfstorage'])
+    assert [path.split('?')[0] for path in api_requests(server)] == \
+        ['/v2/nodes/{}/'.format(component)]
+
+
+def test_missing_embeds_are_requested(tree, server, project, wait):
+    refresh(tree, wait)
+    project_item = tree.topLevelItem(0)
+    status = project_item.data(1, QtCore.Qt.UserRole)
+    # An embed that the API could not provide
+    status['embeds']['files'] = {'errors': [{'detail': 'Not available'}]}
+    project_item.setData(1, QtCore.Qt.UserRole, status)
+
+    server.clear_requests()
+    tree.populate_from_embeds(project_item)
+    assert wait(lambda: [item.text(0) for item in children(project_item)]
+                == ['osfstorage'])
+    listings = api_requests(server)
+    assert len(listings) == 1 and '/files/' in listings[0]
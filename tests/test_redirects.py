@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+""" Redirects, the redirect cache, and coalesced GET requests. """
+
+from QOpenScienceFramework.manager import ConnectionManager
+
+
+def test_redirect_is_followed(manager, server, results, wait):
+    server.httpd.files['/target.txt'] = b'contents'
+    server.add_redirect('/start', '/target.txt')
+    manager.get(server.url('/start'), results.on_finished,
+                errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert results.finished == [(200, b'contents')]
+
+
+def test_redirect_loop_stops_at_limit(manager, server, notifier, results,
+                                      wait):
+    server.add_redirect('/loop', '/loop')
+    manager.get(server.url('/loop'), results.on_finished,
+                errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert not results.finished
+    assert len(results.failed) == 1
+    # The original request plus MAX_REDIRECTS redirects
+    assert len(server.requests) == ConnectionManager.MAX_REDIRECTS + 1
+    assert any('Too Many redirects' in message
+               for _, _, message in notifier.messages)
+
+
+def test_redirect_loop_stops_at_limit_for_delete(manager, server, results,
+                                                 wait):
+    server.add_redirect('/loop', '/loop')
+    manager.delete(server.url('/loop'), results.on_finished,
+                   errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert len(results.failed) == 1
+    assert len(server.requests) == ConnectionManager.MAX_REDIRECTS + 1
+
+
+def test_redirect_cache(manager, server, results, wait):
+    server.redirect_downloads = True
+    project = server.osf.add_project('Project')
+    entry_id = server.osf.add_file(project, 'data.bin', b'x' * 5000)
+    url = server.osf.waterbutler_url(entry_id)
+
+    manager.get(url, results.on_finished, fileVersion='1')
+    assert wait(results.done)
+    assert [path.split('/')[1] for _, path in server.requests] == \
+        ['v1', 'storage']
+
+    server.clear_requests()
+    manager.get(url, results.on_finished, fileVersion='1')
+    assert wait(lambda: results.done() == 2)
+    # The second download goes to the storage url directly
+    assert [path.split('/')[1] for _, path in server.requests] == \
+        ['storage']
+    assert results.finished == [(200, b'x' * 5000)] * 2
+
+
+def test_coalesced_callers_survive_redirect(manager, server, results, wait):
+    server.httpd.files['/target.txt'] = b'contents'
+    server.add_redirect('/start', '/target.txt')
+    for _ in range(3):
+        manager.get(server.url('/start'), results.on_finished,
+                    errorCallback=results.on_failed)
+    assert wait(lambda: results.done() == 3)
+    assert results.finished == [(200, b'contents')] * 3
+    # Only a single request is made for the callers together
+    assert len(server.requests) == 2
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+""" The limits of the RequestScheduler. """
+
+from QOpenScienceFramework.scheduler import RequestScheduler, INTERACTIVE, \
+    TREE, PREFETCH
+
+
+class Handle(object):
+    """ Stands in for the ReplyHandle of a request. """
+
+    def attach(self, reply):
+        self.reply = reply
+
+
+def submit(scheduler, priority, sent):
+    def send():
+        reply = object()
+        sent.append((priority, reply))
+        return reply
+    scheduler.submit(priority, Handle(), send, lambda: None,
+                     host='api.osf.io')
+
+
+def test_background_classes_leave_a_slot_for_interactive(qapp):
+    scheduler = RequestScheduler()
+    sent = []
+    for _ in range(10):
+        submit(scheduler, TREE, sent)
+        submit(scheduler, PREFETCH, sent)
+    assert len(sent) == RequestScheduler.DEFAULT_HOST_LIMIT - \
+        RequestScheduler.INTERACTIVE_HOST_RESERVE
+    submit(scheduler, INTERACTIVE, sent)
+    assert sent[-1][0] == INTERACTIVE
+    assert len(sent) == RequestScheduler.DEFAULT_HOST_LIMIT
+
+
+def test_reserve_needs_more_than_one_connection(qapp):
+    scheduler = RequestScheduler(host_limit=1)
+    sent = []
+    submit(scheduler, TREE, sent)
+    submit(scheduler, INTERACTIVE, sent)
+    assert [priority for priority, _ in sent] == [TREE]
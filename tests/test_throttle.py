@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+""" Bandwidth limits of uploads and downloads. """
+
+import os
+import time
+
+
+def write_file(tmp_path, name, size):
+    path = str(tmp_path / name)
+    data = os.urandom(size)
+    with open(path, 'wb') as fp:
+        fp.write(data)
+    return path, data
+
+
+def test_throttled_upload(manager, server, results, wait, tmp_path):
+    source, data = write_file(tmp_path, 'data.bin', 40000)
+    started = time.time()
+    manager.upload_file(server.url('/files/data.bin'), source,
+                        bandwidth_limit=20000,
+                        finishedCallback=results.on_finished,
+                        errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert not results.failed
+    assert server.files['/files/data.bin'] == data
+    # The first second's worth of data may be sent at once
+    assert time.time() - started >= 0.5
+    assert len([method for method, _ in server.requests
+                if method == 'PUT']) == 1
+
+
+def test_throttled_chunked_upload(manager, server, results, wait, tmp_path):
+    source, data = write_file(tmp_path, 'data.bin', 40000)
+    manager.upload_file(server.url('/files/data.bin'), source,
+                        bandwidth_limit=20000, chunk_size=15000,
+                        finishedCallback=results.on_finished,
+                        errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert not results.failed
+    assert server.files['/files/data.bin'] == data
+
+
+def test_throttled_download(manager, server, results, wait, tmp_path):
+    data = os.urandom(200000)
+    server.httpd.files['/files/data.bin'] = data
+    destination = str(tmp_path / 'data.bin')
+    # Qt passes the size of the read buffer, which the throttling relies on,
+    # to its network thread only after the request has been sent. The local
+    # server would have sent all data by then, so it is made a little slower.
+    server.bandwidth = 400000
+    started = time.time()
+    manager.download_file(server.url('/files/data.bin'), destination,
+                          bandwidth_limit=50000,
+                          finishedCallback=results.on_finished,
+                          errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert not results.failed
+    with open(destination, 'rb') as fp:
+        assert fp.read() == data
+    # The first second's worth of data may be received at once
+    assert time.time() - started >= 1.5
+
+
+def test_throttled_upload_is_retried(manager, server, results, wait,
+                                     tmp_path):
+    source, data = write_file(tmp_path, 'data.bin', 30000)
+    server.fail_next(1, status=503, retry_after=0, match='^/files/')
+    manager.upload_file(server.url('/files/data.bin'), source,
+                        bandwidth_limit=50000,
+                        finishedCallback=results.on_finished,
+                        errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert not results.failed
+    assert server.files['/files/data.bin'] == data
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+""" The deadlines and idle timeouts of the ReplyWatchdog. """
+
+import os
+
+from qtpy import QtNetwork
+
+
+def test_idle_timeout(manager, server, notifier, results, wait):
+    server.files['/slow'] = b'data'
+    server.latency = 1.0
+    manager.get(server.url('/slow'), results.on_finished,
+                errorCallback=results.on_failed, idleTimeout=0.2,
+                retryPolicy=None)
+    assert wait(results.done)
+    assert results.failed == [
+        (None, QtNetwork.QNetworkReply.TimeoutError)]
+    # The error message describes the timeout
+    assert [message for _, _, message in notifier.messages] == \
+        ['No data was transferred for 0.2 seconds']
+
+
+def test_deadline_applies_despite_progress(manager, server, results, wait):
+    server.files['/large'] = os.urandom(200000)
+    server.bandwidth = 50000
+    manager.get(server.url('/large'), results.on_finished,
+                errorCallback=results.on_failed, timeout=0.5,
+                idleTimeout=0.3, retryPolicy=None)
+    assert wait(results.done)
+    assert [error for _, error in results.failed] == \
+        [QtNetwork.QNetworkReply.TimeoutError]
+
+
+def test_streamed_download_has_no_deadline(manager, server, results, wait,
+                                           tmp_path):
+    data = os.urandom(100000)
+    server.files['/data.bin'] = data
+    server.bandwidth = 100000
+    manager.request_timeout = 0.3
+    destination = str(tmp_path / 'data.bin')
+    manager.download_file(server.url('/data.bin'), destination,
+                          finishedCallback=results.on_finished,
+                          errorCallback=results.on_failed, retryPolicy=None)
+    assert wait(results.done)
+    assert not results.failed
+    with open(destination, 'rb') as fp:
+        assert fp.read() == data
+
+
+def test_only_api_requests_have_a_deadline(manager, server, results, wait):
+    server.files['/preview'] = os.urandom(100000)
+    server.bandwidth = 100000
+    manager.request_timeout = 0.3
+    manager.get(server.url('/preview'), results.on_finished,
+                errorCallback=results.on_failed, retryPolicy=None)
+    assert wait(results.done)
+    assert not results.failed
+
+    server.latency = 0.6
+    manager.get(server.url('/v2/users/me/'), results.on_finished,
+                errorCallback=results.on_failed, retryPolicy=None)
+    assert wait(lambda: results.done() == 2)
+    assert [error for _, error in results.failed] == \
+        [QtNetwork.QNetworkReply.TimeoutError]
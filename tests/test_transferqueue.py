@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+""" The journaled queue of transfers in QOpenScienceFramework.transferqueue. """
+
+import json
+import os
+
+from QOpenScienceFramework.transferqueue import TransferQueue, ACTIVE, \
+    FINISHED, PAUSED, QUEUED
+
+
+def add_file(server, size):
+    data = os.urandom(size)
+    project = server.osf.add_project('Project')
+    entry_id = server.osf.add_file(project, 'data.bin', data)
+    return server.osf.waterbutler_url(entry_id), data
+
+
+def read(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+def read_journal(path):
+    with open(path) as fp:
+        return json.load(fp)['items']
+
+
+def test_queued_transfers_are_completed(manager, server, wait, tmp_path):
+    url, data = add_file(server, 50000)
+    source = str(tmp_path / 'source.bin')
+    with open(source, 'wb') as fp:
+        fp.write(data)
+    journal = str(tmp_path / 'journal.json')
+    destination = str(tmp_path / 'data.bin')
+
+    queue = TransferQueue(manager, journal)
+    finished = []
+    queue.item_finished.connect(finished.append)
+    download = queue.add_download(url, destination, filesize=len(data))
+    upload = queue.add_upload(server.url('/files/data.bin'), source)
+    assert queue.rowCount() == 2
+    assert wait(lambda: len(finished) == 2)
+
+    assert read(destination) == data
+    assert server.files['/files/data.bin'] == data
+    assert queue.item(download)['status'] == FINISHED
+    assert queue.item(upload)['transferred'] == len(data)
+    # The finished state is recorded in the journal
+    assert wait(lambda: [item['status'] for item in read_journal(journal)]
+                == [FINISHED, FINISHED])
+
+
+def test_paused_download_is_resumed(manager, server, wait, tmp_path,
+                                    ranges):
+    url, data = add_file(server, 200000)
+    destination = str(tmp_path / 'data.bin')
+    server.bandwidth = 50000
+
+    queue = TransferQueue(manager, str(tmp_path / 'journal.json'))
+    finished = []
+    queue.item_finished.connect(finished.append)
+    item_id = queue.add_download(url, destination, filesize=len(data))
+    assert wait(lambda: queue.item(item_id)['transferred'] > 0)
+    queue.pause(item_id)
+    assert queue.item(item_id)['status'] == PAUSED
+    # The data received so far is kept
+    received = os.path.getsize(destination + '.part')
+    assert 0 < received < len(data)
+
+    server.bandwidth = None
+    queue.resume(item_id)
+    assert wait(lambda: finished)
+    assert read(destination) == data
+    assert not os.path.exists(destination + '.part')
+    # Only the remaining data was requested
+    assert ranges == [None, 'bytes={}-'.format(received)]
+
+
+def test_queue_is_restored_from_journal(manager, server, wait, tmp_path,
+                                        ranges, monkeypatch):
+    url, data = add_file(server, 200000)
+    journal = str(tmp_path / 'journal.json')
+    destination = str(tmp_path / 'data.bin')
+    waiting = str(tmp_path / 'waiting.bin')
+    server.bandwidth = 50000
+
+    queue = TransferQueue(manager, journal, parallel=1)
+    item_id = queue.add_download(url, destination, filesize=len(data))
+    paused_id = queue.add_download(url, waiting, filesize=len(data))
+    queue.pause(paused_id)
+    assert wait(lambda: queue.item(item_id)['transferred'] > 0)
+    # The application stops while the download is underway, after the
+    # journal was last written
+    queue.save()
+    monkeypatch.setattr(queue, 'save', lambda: None)
+    queue.stop()
+    queue.pause(item_id)
+    assert [item['status'] for item in read_journal(journal)] == \
+        [ACTIVE, PAUSED]
+    received = os.path.getsize(destination + '.part')
+
+    server.bandwidth = None
+    restored = TransferQueue(manager, journal, parallel=1)
+    assert [item['id'] for item in restored.items()] == [item_id, paused_id]
+    # The download that was underway is queued again; the paused one is not
+    assert restored.item(item_id)['status'] == QUEUED
+    assert restored.item(paused_id)['status'] == PAUSED
+    assert wait(lambda: restored.item(item_id)['status'] == FINISHED)
+    assert read(destination) == data
+    assert ranges[-1] == 'bytes={}-'.format(received)
+    assert restored.item(paused_id)['status'] == PAUSED
+    assert not os.path.exists(waiting)
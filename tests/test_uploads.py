@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+""" Uploads of files, in a single request and in chunks. """
+
+import os
+
+
+def write_file(tmp_path, name, size):
+    path = str(tmp_path / name)
+    data = os.urandom(size)
+    with open(path, 'wb') as fp:
+        fp.write(data)
+    return path, data
+
+
+def test_upload(manager, server, results, wait, tmp_path):
+    source, data = write_file(tmp_path, 'data.bin', 20000)
+    manager.upload_file(server.url('/files/data.bin'), source,
+                        finishedCallback=results.on_finished,
+                        errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert results.finished and results.finished[0][0] == 201
+    assert server.files['/files/data.bin'] == data
+
+
+def test_chunked_upload_of_several_chunks(manager, server, results, wait,
+                                          tmp_path):
+    source, data = write_file(tmp_path, 'data.bin', 100000)
+    manager.upload_file(server.url('/files/data.bin'), source,
+                        chunk_size=30000,
+                        finishedCallback=results.on_finished,
+                        errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert not results.failed
+    assert server.files['/files/data.bin'] == data
+    # Each of the four chunks is sent once
+    assert len([path for _, path in server.requests
+                if path.startswith('/upload-sessions/')]) == 4
+
+
+def test_interrupted_chunked_upload_is_resumed(manager, server, results,
+                                               wait, tmp_path):
+    from QOpenScienceFramework.transfers import ChunkedUpload
+
+    source, data = write_file(tmp_path, 'data.bin', 100000)
+    url = server.url('/files/data.bin')
+    # The first chunk and the status requests after it fail, after which the
+    # upload gives up
+    server.fail_next(ChunkedUpload.MAX_RETRIES + 1, status=400,
+                     match='^/upload-sessions/')
+    manager.upload_file(url, source, chunk_size=30000,
+                        finishedCallback=results.on_finished,
+                        errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert results.failed
+    assert not '/files/data.bin' in server.files
+
+    server.clear_requests()
+    manager.upload_file(url, source, chunk_size=30000,
+                        finishedCallback=results.on_finished,
+                        errorCallback=results.on_failed)
+    assert wait(lambda: results.done() == 2)
+    assert len(results.finished) == 1
+    assert server.files['/files/data.bin'] == data
+    # The existing session is continued rather than a new one started
+    assert not ('PUT', '/files/data.bin') in server.requests
+
+
+def test_failing_chunk_is_retried_a_limited_number_of_times(
+        manager, server, notifier, results, wait, tmp_path, monkeypatch):
+    from QOpenScienceFramework.fakeserver import FakeRequestHandler
+    from QOpenScienceFramework.transfers import ChunkedUpload
+
+    # Chunks are refused, but status requests are answered
+    put_chunk = FakeRequestHandler._FakeRequestHandler__put_chunk
+    chunks = []
+
+    def refuse_chunks(handler, session_id):
+        if handler.headers.get('Content-Range', '').startswith('bytes */'):
+            return put_chunk(handler, session_id)
+        chunks.append(handler.headers.get('Content-Range'))
+        handler.rfile.read(int(handler.headers.get('Content-Length') or 0))
+        handler.send_response(503)
+        handler.send_header('Content-Length', '0')
+        handler.end_headers()
+    monkeypatch.setattr(FakeRequestHandler,
+                        '_FakeRequestHandler__put_chunk', refuse_chunks)
+
+    source, data = write_file(tmp_path, 'data.bin', 50000)
+    manager.upload_file(server.url('/files/data.bin'), source,
+                        chunk_size=30000,
+                        finishedCallback=results.on_finished,
+                        errorCallback=results.on_failed)
+    assert wait(results.done)
+    assert len(results.failed) == 1
+    # The manager does not retry the chunks on top of the upload itself, and
+    # only the failure of the upload as a whole is reported
+    assert len(chunks) == ChunkedUpload.MAX_RETRIES + 1
+    assert len([kind for kind, _, _ in notifier.messages
+                if kind == 'error']) == 1